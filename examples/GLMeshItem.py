@@ -43,8 +43,8 @@ data = np.abs(np.fromfunction(psi, (50,50,100)))
 
 #data = np.fromfunction(lambda i,j,k: np.sin(0.2*((i-25)**2+(j-15)**2+k**2)**0.5), (50,50,50)); 
 print "Generating isosurface.."
-faces = pg.isosurface(data, data.max()/4.)
-m = gl.GLMeshItem(faces)
+verts, faces = pg.isosurface(data, data.max()/4.)
+m = gl.GLMeshItem(faces, verts)
 w.addItem(m)
 m.translate(-25, -25, -50)
     
@@ -57,8 +57,8 @@ m.translate(-25, -25, -50)
 #tr.translate(-2.5, -2.5, 0)
 #data = np.ones((2,2,2))
 #data[0, 1, 0] = 0
-#faces = pg.isosurface(data, 0.5)
-#m = gl.GLMeshItem(faces)
+#verts, faces = pg.isosurface(data, 0.5)
+#m = gl.GLMeshItem(faces, verts)
 #w.addItem(m)
 #m.setTransform(tr)
 
@@ -5,6 +5,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from pyqtgraph.Qt import QtCore, QtGui
 import pyqtgraph.opengl as gl
+import numpy as np
 
 app = QtGui.QApplication([])
 w = gl.GLViewWidget()
@@ -14,18 +15,23 @@ w.show()
 g = gl.GLGridItem()
 w.addItem(g)
 
-pts = [
-    {'pos': (1,0,0), 'size':0.5, 'color':(1.0, 0.0, 0.0, 0.5)}, 
-    {'pos': (0,1,0), 'size':0.2, 'color':(0.0, 0.0, 1.0, 0.5)}, 
-    {'pos': (0,0,1), 'size':2./3., 'color':(0.0, 1.0, 0.0, 0.5)},
-]
+pos = np.empty((53, 3))
+size = np.empty((53))
+color = np.empty((53, 4))
+pos[0] = (1,0,0); size[0] = 0.5;   color[0] = (1.0, 0.0, 0.0, 0.5)
+pos[1] = (0,1,0); size[1] = 0.2;   color[1] = (0.0, 0.0, 1.0, 0.5)
+pos[2] = (0,0,1); size[2] = 2./3.; color[2] = (0.0, 1.0, 0.0, 0.5)
+
 z = 0.5
 d = 6.0
-for i in range(50):
-    pts.append({'pos': (0,0,z), 'size':2./d, 'color':(0.0, 1.0, 0.0, 0.5)})
+for i in range(3,53):
+    pos[i] = (0,0,z)
+    size[i] = 2./d
+    color[i] = (0.0, 1.0, 0.0, 0.5)
     z *= 0.5
     d *= 2.0
-sp = gl.GLScatterPlotItem(pts)
+    
+sp = gl.GLScatterPlotItem(pos=pos, size=size, color=color)
 w.addItem(sp)
 
 ## Start Qt event loop unless running in interactive mode.
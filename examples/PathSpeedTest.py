@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compares the time needed to build a QPainterPath from arrays of x/y values using
+pyqtgraph.arrayToQPath and using the method previously found in
+PlotCurveItem.generatePath. No window is displayed; results are printed.
+
+Usage:  python PathSpeedTest.py [maxPoints]
+"""
+## Add path to library (just for examples; you do not need this)
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from pyqtgraph.Qt import QtGui, QtCore
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.ptime import time
+import struct
+
+app = QtGui.QApplication([])
+
+def oldGeneratePath(x, y):
+    ## method used by PlotCurveItem.generatePath before arrayToQPath was added
+    path = QtGui.QPainterPath()
+    n = x.shape[0]
+    arr = np.empty(n+2, dtype=[('x', '>f8'), ('y', '>f8'), ('c', '>i4')])
+    arr.data[12:20] = struct.pack('>ii', n, 0)
+    arr[1:-1]['x'] = x
+    arr[1:-1]['y'] = y
+    arr[1:-1]['c'] = 1
+    lastInd = 20*(n+1)
+    arr.data[lastInd:lastInd+4] = struct.pack('>i', 0)
+    buf = QtCore.QByteArray(arr.data[12:lastInd+4])
+    ds = QtCore.QDataStream(buf)
+    ds >> path
+    return path
+
+def measure(fn, *args, **kargs):
+    ## return the best of several runs (in ms)
+    times = []
+    for i in range(5):
+        start = time()
+        fn(*args, **kargs)
+        times.append(time() - start)
+    return min(times) * 1000.
+
+if len(sys.argv) > 1:
+    maxPoints = int(float(sys.argv[1]))
+else:
+    maxPoints = 10**7
+
+print "%10s  %12s  %12s  %12s  %12s" % ("points", "old (ms)", "all (ms)", "pairs (ms)", "finite (ms)")
+n = 10**4
+while n <= maxPoints:
+    x = np.linspace(0, 1, n)
+    y = np.random.normal(size=n)
+    y[::1000] = np.nan
+
+    tOld = measure(oldGeneratePath, x, y)
+    tAll = measure(pg.arrayToQPath, x, y, connect='all')
+    tPairs = measure(pg.arrayToQPath, x, y, connect='pairs')
+    tFinite = measure(pg.arrayToQPath, x, y, connect='finite')
+    print "%10d  %12.2f  %12.2f  %12.2f  %12.2f" % (n, tOld, tAll, tPairs, tFinite)
+    n *= 10
@@ -14,8 +14,14 @@ app = QtGui.QApplication([])
 #mw = QtGui.QMainWindow()
 #mw.resize(800,800)
 
+## number of points may be given on the command line; default is 10^5
+if len(sys.argv) > 1:
+    n = int(sys.argv[1])
+else:
+    n = 100000
+
 p = pg.plot()
-p.setRange(QtCore.QRectF(0, -10, 5000, 20)) 
+p.setRange(QtCore.QRectF(-5, -5, 10, 10)) 
 p.setLabel('bottom', 'Index', units='B')
 
 #curve.setFillBrush((0, 0, 100, 100))
@@ -24,15 +30,15 @@ p.setLabel('bottom', 'Index', units='B')
 #lr = pg.LinearRegionItem([100, 4900])
 #p.addItem(lr)
 
-data = np.random.normal(size=(50,5000))
+data = np.random.normal(size=(10,n))
+curve = pg.ScatterPlotItem(pen='w', brush='b', size=10, pxMode=True, identical=True)
+p.addItem(curve)
 ptr = 0
 lastTime = time()
 fps = None
 def update():
     global curve, data, ptr, p, lastTime, fps
-    p.clear()
-    curve = pg.ScatterPlotItem(x=data[ptr%10], y=data[(ptr+1)%10], pen='w', brush='b', size=10, pxMode=True, identical=True)
-    p.addItem(curve)
+    curve.setData(x=data[ptr%10], y=data[(ptr+1)%10])
     ptr += 1
     now = time()
     dt = now - lastTime
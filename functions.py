@@ -19,14 +19,11 @@ Colors = {
 SI_PREFIXES = u'yzafpnµm kMGTPEZY'
 SI_PREFIXES_ASCII = 'yzafpnum kMGTPEZY'
 
-USE_WEAVE = True
-
 
 from Qt import QtGui, QtCore
 import numpy as np
 import scipy.ndimage
 import decimal, re
-import scipy.weave
 import debug
 
 def siScale(x, minVal=1e-25, allowUnicode=True):
@@ -360,6 +357,11 @@ def affineSlice(data, shape, origin, vectors, axes, **kargs):
         
         | len(shape) == len(vectors) 
         | len(origin) == len(axes) == len(vectors[0])
+        
+    If the vectors are the unit vectors along *axes* and the origin lies on integer 
+    coordinates, no interpolation is necessary and the slice is taken directly from 
+    the data. In that case the returned array is a view of *data* when the slice lies
+    entirely inside the data (so it must be copied before being modified).
     """
     
     # sanity check
@@ -371,7 +373,7 @@ def affineSlice(data, shape, origin, vectors, axes, **kargs):
         if len(v) != len(axes):
             raise Exception("each vector must be same length as axes.")
         
-    shape = map(np.ceil, shape)
+    shape = [int(np.ceil(x)) for x in shape]
 
     ## transpose data so slice axes come first
     trAx = range(data.ndim)
@@ -382,9 +384,31 @@ def affineSlice(data, shape, origin, vectors, axes, **kargs):
     #print "tr1:", tr1
     ## dims are now [(slice axes), (other axes)]
     
+    tr = range(len(shape) + data.ndim - len(axes))
+    trb = []
+    for i in range(min(axes)):
+        ind = tr1.index(i) + (len(shape)-len(axes))
+        tr.remove(ind)
+        trb.append(ind)
+    tr2 = tuple(trb+tr)
+    
+    bounds = alignedSliceBounds(shape, vectors, origin)
+    if bounds is not None and 'output' not in kargs:
+        ## axis-aligned slice on integer coordinates; no interpolation needed
+        sl = tuple([slice(max(a, 0), min(b, n)) for (a, b), n in zip(bounds, data.shape)])
+        if all([sl[i].start == bounds[i][0] and sl[i].stop == bounds[i][1] for i in range(len(bounds))]):
+            return data[sl].transpose(tr2)
+        if kargs.get('mode', 'constant') == 'constant':
+            ## partly outside the data; samples outside are set to cval
+            output = np.empty(tuple(b-a for a,b in bounds) + data.shape[len(axes):], dtype=data.dtype)
+            output[:] = kargs.get('cval', 0)
+            if all([s.stop > s.start for s in sl]):
+                outSl = tuple([slice(s.start-a, s.stop-a) for s, (a, b) in zip(sl, bounds)])
+                output[outSl] = data[sl]
+            return output.transpose(tr2)
 
     ## make sure vectors are arrays
-    vectors = np.array(vectors)
+    vectors = np.array(vectors, dtype=float)
     origin = np.array(origin)
     origin.shape = (len(axes),) + (1,)*len(shape)
     
@@ -395,30 +419,314 @@ def affineSlice(data, shape, origin, vectors, axes, **kargs):
     x += origin
     #print "X values:"
     #print x
-    ## iterate manually over unused axes since map_coordinates won't do it for us
-    extraShape = data.shape[len(axes):]
-    output = np.empty(tuple(shape) + extraShape, dtype=data.dtype)
-    for inds in np.ndindex(*extraShape):
-        ind = (Ellipsis,) + inds
-        #print data[ind].shape, x.shape, output[ind].shape, output.shape
-        output[ind] = scipy.ndimage.map_coordinates(data[ind], x, **kargs)
     
-    tr = range(output.ndim)
-    trb = []
-    for i in range(min(axes)):
-        ind = tr1.index(i) + (len(shape)-len(axes))
-        tr.remove(ind)
-        trb.append(ind)
-    tr2 = tuple(trb+tr)
+    extraShape = data.shape[len(axes):]
+    if len(extraShape) > 0 and kargs.get('order', 3) == 1 and set(kargs.keys()) <= set(['order', 'mode', 'cval']) and kargs.get('mode', 'constant') == 'constant':
+        ## linear interpolation of all unused axes at once. The unused axes are moved 
+        ## back to the front, which is usually their order in memory.
+        nExtra = len(extraShape)
+        output = interpolateLinear(data.transpose(range(len(axes), data.ndim) + range(len(axes))), x, cval=kargs.get('cval', 0.0))
+        output = output.transpose(range(nExtra, output.ndim) + range(nExtra))
+    else:
+        ## iterate manually over unused axes since map_coordinates won't do it for us
+        output = np.empty(tuple(shape) + extraShape, dtype=data.dtype)
+        for inds in np.ndindex(*extraShape):
+            ind = (Ellipsis,) + inds
+            #print data[ind].shape, x.shape, output[ind].shape, output.shape
+            output[ind] = scipy.ndimage.map_coordinates(data[ind], x, **kargs)
 
     ## Untranspose array before returning
     return output.transpose(tr2)
 
 
+def interpolateLinear(data, x, cval=0.0):
+    """
+    Linearly interpolate *data* at the locations *x*, an array of shape (N, ...) giving 
+    coordinates along the last N axes of *data*. Any preceding axes of *data* are 
+    carried through, so the result has shape data.shape[:-N] + x.shape[1:] and the same 
+    dtype as *data*. Locations outside the data are given the value *cval*.
+    
+    This gives the same result as calling scipy.ndimage.map_coordinates(order=1) once 
+    for every index of the preceding axes, but the interpolation weights are computed 
+    only once and all preceding axes are handled with a few array operations.
+    """
+    nAxes = x.shape[0]
+    shape = data.shape[data.ndim-nAxes:]
+    x0 = np.floor(x).astype(int)
+    frac = x - x0
+    valid = np.ones(x.shape[1:], dtype=bool)
+    for i in range(nAxes):
+        valid &= (x[i] >= 0) & (x[i] <= shape[i]-1)
+    
+    lead = (slice(None),) * (data.ndim - nAxes)
+    result = np.zeros(data.shape[:data.ndim-nAxes] + x.shape[1:])
+    ## add the contribution of each corner of the cell around every location
+    for corner in np.ndindex(*(2,)*nAxes):
+        inds = []
+        weight = np.ones(x.shape[1:])
+        for i in range(nAxes):
+            inds.append(np.clip(x0[i] + corner[i], 0, shape[i]-1))
+            if corner[i] == 0:
+                weight *= 1 - frac[i]
+            else:
+                weight *= frac[i]
+        result += data[lead + tuple(inds)] * weight
+    result[lead + (~valid,)] = cval
+    
+    if data.dtype.kind in 'ui':
+        result = np.round(result)
+    return result.astype(data.dtype)
+
+
+def alignedSliceBounds(shape, vectors, origin):
+    """
+    If the slice described by *shape*, *vectors*, and *origin* (see :func:`affineSlice`) 
+    is aligned to the array axes and starts on integer coordinates, return a list of 
+    (start, stop) indexes along each slice axis. Otherwise, return None.
+    Indexes may lie outside the array.
+    """
+    vectors = np.array(vectors, dtype=float)
+    origin = np.array(origin, dtype=float)
+    if vectors.shape != (len(origin), len(origin)):
+        return None
+    if np.abs(vectors - np.eye(len(origin))).max() > 1e-6 or np.abs(origin - np.round(origin)).max() > 1e-6:
+        return None
+    bounds = []
+    for i in range(len(origin)):
+        start = int(np.round(origin[i]))
+        bounds.append((start, start + int(np.ceil(shape[i]))))
+    return bounds
+
 
+def transformCoordinates(tr, x, y):
+    """
+    Map arrays of *x* and *y* coordinates through the QTransform *tr*.
+    This is equivalent to calling tr.map() on every point, but is vectorized.
+    Returns a tuple (x, y) of float arrays.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x2 = tr.m11() * x + tr.m21() * y + tr.dx()
+    y2 = tr.m12() * x + tr.m22() * y + tr.dy()
+    if not tr.isAffine():
+        w = tr.m13() * x + tr.m23() * y + tr.m33()
+        x2 /= w
+        y2 /= w
+    return x2, y2
+
+
+def downsampleCurve(x, y, ds, method='peak'):
+    """
+    Reduce the number of samples in the curve given by 1D arrays *x* and *y*, combining
+    each block of *ds* consecutive samples. The *method* may be:
+    
+    ==========  ===================================================================
+    'peak'      Each block is replaced by two points holding its minimum and maximum
+                y values, so that spikes are preserved. (default)
+    'mean'      Each block is replaced by its mean x and y values.
+    'subsample' Only the first sample of each block is kept. This is fastest, but 
+                aliases away features narrower than the block.
+    ==========  ===================================================================
+    
+    Returns a tuple (x, y).
+    """
+    ds = int(ds)
+    if ds <= 1 or len(x) == 0:
+        return x, y
+    if method == 'subsample':
+        return x[::ds], y[::ds]
+        
+    n = len(x) // ds      ## number of complete blocks
+    nb = (len(x)+ds-1) // ds  ## number of blocks including the partial block at the end
+    end = n * ds
+    if method == 'mean':
+        x1 = np.empty(nb)
+        y1 = np.empty(nb)
+        x1[:n] = x[:end].reshape(n, ds).mean(axis=1)
+        y1[:n] = y[:end].reshape(n, ds).mean(axis=1)
+        if nb > n:
+            x1[n] = x[end:].mean()
+            y1[n] = y[end:].mean()
+        return x1, y1
+    elif method == 'peak':
+        x1 = np.empty((nb, 2), dtype=x.dtype)
+        y1 = np.empty((nb, 2), dtype=y.dtype)
+        x1[:] = x[::ds, np.newaxis]
+        blocks = y[:end].reshape(n, ds)
+        y1[:n, 0] = blocks.min(axis=1)
+        y1[:n, 1] = blocks.max(axis=1)
+        if nb > n:
+            y1[n, 0] = y[end:].min()
+            y1[n, 1] = y[end:].max()
+        return x1.reshape(nb*2), y1.reshape(nb*2)
+    else:
+        raise Exception("Downsampling method must be 'peak', 'mean', or 'subsample' (got %s)" % str(method))
 
 
-def makeARGB(data, lut=None, levels=None, useRGBA=False): 
+def clipCurve(x, y, xmin, xmax, xSorted=None):
+    """
+    Return the part of the curve given by 1D arrays *x* and *y* for which xmin <= x <= xmax,
+    plus one sample on either side so that line segments crossing the boundaries are kept.
+    
+    If the x values are sorted, the boundaries are found by binary search and the
+    returned arrays are views of the originals. Otherwise, a mask is used to select
+    the samples. *xSorted* may be given to avoid checking whether x is sorted.
+    
+    Returns a tuple (x, y).
+    """
+    if len(x) == 0:
+        return x, y
+    if xSorted is None:
+        xSorted = isSorted(x)
+    if xSorted:
+        i0 = max(np.searchsorted(x, xmin, side='left') - 1, 0)
+        i1 = min(np.searchsorted(x, xmax, side='right') + 1, len(x))
+        return x[i0:i1], y[i0:i1]
+    else:
+        inside = (x >= xmin) & (x <= xmax)
+        mask = inside.copy()
+        mask[1:] |= inside[:-1]
+        mask[:-1] |= inside[1:]
+        return x[mask], y[mask]
+        
+def isSorted(x):
+    """Return True if the values in the 1D array *x* are in non-decreasing order."""
+    return len(x) < 2 or bool(np.all(x[1:] >= x[:-1]))
+
+
+def mergeBounds(bounds, added, dropped=None):
+    """
+    Update the cached (min, max) *bounds* of a data set after the values in the array
+    *added* have been appended to it and (optionally) the values in *dropped* have 
+    been removed. Returns None if *bounds* is None or one of the extreme values was 
+    removed; in that case the bounds must be recomputed from the complete data.
+    """
+    if bounds is None:
+        return None
+    if dropped is not None and len(dropped) > 0 and (dropped.min() <= bounds[0] or dropped.max() >= bounds[1]):
+        return None
+    if len(added) == 0:
+        return bounds
+    return (min(bounds[0], added.min()), max(bounds[1], added.max()))
+
+
+def percentileBounds(data, frac):
+    """
+    Return the (low, high) values that enclose the central fraction *frac* (0 < frac <= 1)
+    of the values in the 1D array *data*. This gives the same result as 
+    scipy.stats.scoreatpercentile() at the (50 - frac*50) and (50 + frac*50) percentiles,
+    but both values are found with a single call to np.partition, which runs in linear
+    time instead of sorting the data twice.
+    """
+    data = np.asarray(data).ravel()
+    n = len(data)
+    
+    ## fractional positions of the percentiles within the sorted data
+    pos = np.array([0.5 - frac*0.5, 0.5 + frac*0.5]) * (n - 1)
+    lo = np.floor(pos).astype(int)
+    hi = np.ceil(pos).astype(int)
+    kth = np.unique(np.concatenate([lo, hi]))
+    if hasattr(np, 'partition'):
+        part = np.partition(data, kth)
+    else:
+        part = np.sort(data)  ## np.partition requires numpy >= 1.8
+    
+    ## interpolate between neighboring values, as scoreatpercentile does
+    ## (where no interpolation is needed, the value is used directly so that inf is kept)
+    f = pos - lo
+    vals = part[lo].astype(float)
+    interp = lo != hi
+    vals[interp] += (part[hi[interp]] - part[lo[interp]]) * f[interp]
+    return (vals[0], vals[1])
+
+
+_pathBuffer = None  ## reused by arrayToQPath while the number of points does not change
+
+def arrayToQPath(x, y, connect='all'):
+    """
+    Convert arrays of x and y values into a QPainterPath. This is much faster than 
+    adding the points to the path one at a time.
+    
+    ==============  ==================================================================
+    **Arguments:**
+    x, y            1D arrays of equal length
+    connect         Determines which points are joined by line segments:
+                    
+                    * 'all' -- each point is connected to the next (default)
+                    * 'pairs' -- points are connected in pairs (0 to 1, 2 to 3, ...),
+                      giving a set of disjoint line segments
+                    * 'finite' -- only consecutive points that both have finite x and
+                      y values are connected, so NaN or inf values leave gaps
+                    * ndarray -- boolean array with one value per point; connect[i]
+                      determines whether point i is connected to point i+1
+    ==============  ==================================================================
+    """
+    global _pathBuffer
+    prof = debug.Profiler('functions.arrayToQPath', disabled=True)
+    path = QtGui.QPainterPath()
+    n = x.shape[0]
+    if n == 0:
+        return path
+    
+    ## The vertices are written in the binary format read by QDataStream >> QPainterPath, 
+    ## so that all of them can be loaded at once. Format is (all values big endian):
+    ##    numElements(i4)
+    ##    type(i4)  x(f8)  y(f8)     <-- type 0 (MoveTo) starts a new subpath,
+    ##    type(i4)  x(f8)  y(f8)     <--      1 (LineTo) connects to the previous vertex
+    ##    ...
+    ##    fillRule(i4)
+    ## The buffer is kept between calls to avoid reallocating it for every frame of an animation.
+    size = 20*n + 8
+    if _pathBuffer is None or _pathBuffer.shape[0] != size:
+        _pathBuffer = np.empty(size, dtype=np.ubyte)
+    buf = _pathBuffer
+    buf[:4] = np.array([n], dtype='>i4').view(np.ubyte)
+    buf[-4:] = np.array([1], dtype='>i4').view(np.ubyte)  ## Qt.WindingFill
+    arr = np.ndarray(shape=(n,), dtype=[('c', '>i4'), ('x', '>f8'), ('y', '>f8')], buffer=buf, offset=4)
+    prof.mark('allocate')
+    
+    arr['x'] = x
+    arr['y'] = y
+    c = arr['c']
+    c[0] = 0
+    if isinstance(connect, np.ndarray):
+        c[1:] = connect[:-1]
+    elif connect == 'all':
+        c[1:] = 1
+    elif connect == 'pairs':
+        c[0::2] = 0
+        c[1::2] = 1
+    elif connect == 'finite':
+        finite = np.isfinite(x) & np.isfinite(y)
+        c[1:] = finite[1:] & finite[:-1]
+        if not finite.all():
+            if not finite.any():
+                return path
+            ## move non-finite points onto the last finite point so they do not affect the path's bounds
+            ind = np.where(finite, np.arange(n), np.argmax(finite))
+            np.maximum.accumulate(ind, out=ind)
+            arr['x'] = x[ind]
+            arr['y'] = y[ind]
+    else:
+        raise Exception("connect argument must be 'all', 'pairs', 'finite', or ndarray (got %s)" % str(connect))
+    prof.mark('fill array')
+    
+    ## Refer to the buffer directly rather than copying it, if the Qt bindings allow.
+    try:
+        data = QtCore.QByteArray.fromRawData(buf.data)
+    except (TypeError, AttributeError):
+        data = QtCore.QByteArray(buf.tostring())
+    prof.mark('create buffer')
+    ds = QtCore.QDataStream(data)
+    ds >> path
+    prof.mark('load')
+    prof.finish()
+    return path
+
+
+
+
+def makeARGB(data, lut=None, levels=None, useRGBA=False, output=None, table=None): 
     """
     Convert a 2D or 3D array into an ARGB array suitable for building QImages
     Will optionally do scaling and/or table lookups to determine final colors.
@@ -444,7 +752,19 @@ def makeARGB(data, lut=None, levels=None, useRGBA=False):
                 lookup table.   rescaled = (data-min) * len(lut) / (max-min)
         useRGBA - If True, the data is returned in RGBA order. The default is 
                   False, which returns in BGRA order for use with QImage.
+        output - Optional ubyte array of shape data.shape[:2]+(4,) to write the result into.
+                 Passing the array returned by a previous call avoids allocating a new
+                 array for every frame. The array may be C-contiguous or the transpose 
+                 of a C-contiguous (y, x, 4) array; the latter is the layout QImage uses,
+                 so makeQImage can wrap it without copying.
+        table - Optional (table, alpha) tuple returned by makeARGBTable for data.dtype.
+                If given, lut and levels are ignored and each pixel is converted with a
+                single lookup into the table. Callers that display many frames with the
+                same levels and lookup table can build the table once and reuse it.
                 
+    For 2D data, each pixel is converted with a single lookup into a table of 32-bit colors.
+    For 8- and 16-bit integer data, the levels are folded into this table (it holds one 
+    entry per possible data value), so no per-pixel arithmetic is done at all.
     """    
     prof = debug.Profiler('functions.makeARGB', disabled=True)
     
@@ -485,136 +805,181 @@ def makeARGB(data, lut=None, levels=None, useRGBA=False):
     else:
         lutLength = 256
 
-    ## weave requires contiguous arrays
-    global USE_WEAVE
-    if (levels is not None or lut is not None) and USE_WEAVE:
-        data = np.ascontiguousarray(data)
-
-    ## Apply levels if given
-    if levels is not None:
-        
-        try:  ## use weave to speed up scaling
-            if not USE_WEAVE:
-                raise Exception('Weave is disabled; falling back to slower version.')
-            if levels.ndim == 1:
-                scale = float(lutLength) / (levels[1]-levels[0])
-                offset = float(levels[0])
-                data = rescaleData(data, scale, offset)
-            else:
-                if data.ndim == 2:
-                    newData = np.empty(data.shape+(levels.shape[0],), dtype=np.uint32)
-                    for i in xrange(levels.shape[0]):
-                        scale = float(lutLength / (levels[i,1]-levels[i,0]))
-                        offset = float(levels[i,0])
-                        newData[...,i] = rescaleData(data, scale, offset)
-                elif data.ndim == 3:
-                    newData = np.empty(data.shape, dtype=np.uint32)
-                    for i in xrange(data.shape[2]):
-                        scale = float(lutLength / (levels[i,1]-levels[i,0]))
-                        offset = float(levels[i,0])
-                        #print scale, offset, data.shape, newData.shape, levels.shape
-                        newData[...,i] = rescaleData(data[...,i], scale, offset)
-                data = newData
-        except:
-            if USE_WEAVE:
-                debug.printExc("Error; disabling weave.")
-                USE_WEAVE = False
-            
-            if levels.ndim == 1:
-                if data.ndim == 2:
-                    levels = levels[np.newaxis, np.newaxis, :]
-                else:
-                    levels = levels[np.newaxis, np.newaxis, np.newaxis, :]
-            else:
-                levels = levels[np.newaxis, np.newaxis, ...]
-                if data.ndim == 2:
-                    data = data[..., np.newaxis]
-            data = ((data-levels[...,0]) * lutLength) / (levels[...,1]-levels[...,0])
-        
-    prof.mark('2')
-
-
-    ## apply LUT if given
-    if lut is not None and data.ndim == 2:
-        
-        if data.dtype.kind not in ('i', 'u'):
-            data = data.astype(int)
-            
-        data = np.clip(data, 0, lutLength-1)
-        try:
-            if not USE_WEAVE:
-                raise Exception('Weave is disabled; falling back to slower version.')
-            
-            newData = np.empty((data.size,) + lut.shape[1:], dtype=np.uint8)
-            flat = data.reshape(data.size)
-            size = data.size
-            ncol = lut.shape[1]
-            newStride = newData.strides[0]
-            newColStride = newData.strides[1]
-            lutStride = lut.strides[0]
-            lutColStride = lut.strides[1]
-            flatStride = flat.strides[0] / flat.dtype.itemsize
-            
-            #print "newData:", newData.shape, newData.dtype
-            #print "flat:", flat.shape, flat.dtype, flat.min(), flat.max()
-            #print "lut:", lut.shape, lut.dtype
-            #print "size:", size, "ncols:", ncol
-            #print "strides:", newStride, newColStride, lutStride, lutColStride, flatStride
-            
-            code = """
-            
-            for( int i=0; i<size; i++ ) {
-                for( int j=0; j<ncol; j++ ) {
-                    newData[i*newStride + j*newColStride] = lut[flat[i*flatStride]*lutStride + j*lutColStride];
-                }
-            }
-            """
-            scipy.weave.inline(code, ['flat', 'lut', 'newData', 'size', 'ncol', 'newStride', 'lutStride', 'flatStride', 'newColStride', 'lutColStride'])
-            data = newData.reshape(data.shape + lut.shape[1:])
-        except:
-            if USE_WEAVE:
-                debug.printExc("Error; disabling weave.")
-                USE_WEAVE = False
-            data = lut[data]
-    else:
-        if data.dtype is not np.ubyte:
-            data = np.clip(data, 0, 255).astype(np.ubyte)
-
-    prof.mark('3')
-
-
-    ## copy data into ARGB ordered array
-    imgData = np.empty(data.shape[:2]+(4,), dtype=np.ubyte)
-    if data.ndim == 2:
-        data = data[..., np.newaxis]
-
-    prof.mark('4')
-
     if useRGBA:
         order = [0,1,2,3] ## array comes out RGBA
     else:
         order = [2,1,0,3] ## for some reason, the colors line up as BGR in the final image.
         
-    if data.shape[2] == 1:
-        for i in xrange(3):
-            imgData[..., order[i]] = data[..., 0]    
+    ## reuse the output array if possible
+    shape = data.shape[:2] + (4,)
+    if output is not None and output.shape == shape and output.dtype == np.ubyte and (output.flags['C_CONTIGUOUS'] or output.transpose(1,0,2).flags['C_CONTIGUOUS']):
+        imgData = output
     else:
-        for i in xrange(0, data.shape[2]):
-            imgData[..., order[i]] = data[..., i]    
+        imgData = np.empty(shape, dtype=np.ubyte)
+    
+    prof.mark('2')
+
+    if data.ndim == 2 and table is not None:
+        table, alpha = table
+        applyColorTable(table, data.view(tableIndexType(data.dtype)), imgData)
+        prof.mark('4')
         
-    prof.mark('5')
+    elif data.ndim == 2 and (levels is None or levels.ndim == 1):
+        if tableIndexType(data.dtype) is not None:
+            ## the table maps data values directly to colors
+            table, alpha = makeARGBTable(data.dtype, lut, levels, useRGBA)
+            index = data.view(tableIndexType(data.dtype))
+        else:
+            ## Build a table of 32-bit colors: the lut, or greyscale if there is no lut
+            if lut is None:
+                colors = np.arange(256, dtype=np.ubyte)
+            else:
+                colors = lut
+            alpha = colors.ndim == 2 and colors.shape[1] == 4
+            table = colorTable(colors, order)
+            index = levelsToIndex(data, levels, lutLength)
+        prof.mark('3')
         
-    if data.shape[2] == 4:
-        alpha = True
+        applyColorTable(table, index, imgData)
+        prof.mark('4')
+            
     else:
-        alpha = False
-        imgData[..., 3] = 255
+        ## 3D data or per-channel levels: convert each channel separately
+        if data.ndim == 3:
+            nChannels = data.shape[2]
+        else:
+            nChannels = levels.shape[0]
+        alpha = nChannels == 4
         
-    prof.mark('6')
+        scaled = None
+        for i in xrange(nChannels):
+            if data.ndim == 3:
+                chan = data[..., i]
+            else:
+                chan = data
+            if levels is not None:
+                if levels.ndim == 2:
+                    lev = levels[i]
+                else:
+                    lev = levels
+                if scaled is None:
+                    scaled = np.empty(data.shape[:2], dtype=np.result_type(chan.dtype, np.float32))
+                scaled[...] = chan  ## subtract in floating point so integer data can not wrap around
+                scaled -= lev[0]
+                np.multiply(scaled, levelsScale(lev, lutLength), out=scaled)
+                chan = scaled
+            if chan.dtype != np.ubyte:
+                if chan is scaled:
+                    chan = np.clip(chan, 0, 255, out=scaled)
+                else:
+                    chan = np.clip(chan, 0, 255)
+            imgData[..., order[i]] = chan
+        if not alpha:
+            imgData[..., 3] = 255
+        prof.mark('4')
         
     prof.finish()
     return imgData, alpha
     
+    
+def tableIndexType(dtype):
+    """
+    Return the unsigned integer type used to index the table built by makeARGBTable 
+    for data of the given *dtype*, or None if the dtype can not be converted through
+    such a table (only native 8- and 16-bit integer types can).
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'ui' and dtype.itemsize <= 2 and dtype.isnative:
+        return np.dtype('uint%d' % (dtype.itemsize * 8))
+    return None
+
+def makeARGBTable(dtype, lut=None, levels=None, useRGBA=False):
+    """
+    Build a table of 32-bit colors with one entry for every possible value of 
+    the 8- or 16-bit integer *dtype*. The levels and lookup table are applied exactly 
+    as in makeARGB, so converting an image through the table gives the same result.
+    
+    Returns a tuple (table, alpha) that may be passed to makeARGB as its *table* argument.
+    The table is indexed by the image data viewed as tableIndexType(dtype).
+    """
+    itype = tableIndexType(dtype)
+    if itype is None:
+        raise Exception("Can not build a color table for data of type %s" % str(np.dtype(dtype)))
+    if levels is not None:
+        levels = np.array(levels)
+        if levels.shape != (2,):
+            raise Exception("Levels must have shape (2,) to build a color table")
+    
+    if lut is None:
+        colors = np.arange(256, dtype=np.ubyte)
+    else:
+        colors = lut
+    alpha = colors.ndim == 2 and colors.shape[1] == 4
+    if useRGBA:
+        order = [0,1,2,3]
+    else:
+        order = [2,1,0,3]
+    
+    ## compute the lut index for every possible data value
+    values = np.arange(2**(8*itype.itemsize), dtype=itype).view(dtype)
+    table = colorTable(colors, order).take(levelsToIndex(values, levels, colors.shape[0]), mode='clip')
+    return table, alpha
+    
+def applyColorTable(table, index, imgData, blockSize=64):
+    """
+    Write table[index] into *imgData*, a ubyte array of shape index.shape+(4,) that is
+    either C-contiguous or the transpose of a C-contiguous array. The lookup is done
+    a few rows at a time so that only small temporary arrays are allocated.
+    """
+    if imgData.flags['C_CONTIGUOUS']:
+        out = imgData.view(np.uint32).reshape(index.shape)
+    else:
+        out = imgData.transpose(1, 0, 2).view(np.uint32).reshape(index.shape[::-1])
+        index = index.T
+    for i in xrange(0, out.shape[0], blockSize):
+        np.take(table, index[i:i+blockSize], out=out[i:i+blockSize], mode='clip')
+    
+def levelsScale(levels, n):
+    """Return the factor that maps the range given by *levels* onto *n* values."""
+    if levels[1] == levels[0]:
+        return 1.0
+    return float(n) / (levels[1] - levels[0])
+    
+def levelsToIndex(data, levels, n):
+    """
+    Rescale *data* so that the range given by *levels* covers the indexes [0, n) of 
+    a lookup table, and return the result as an integer array of clipped indexes.
+    If *levels* is None, the data is only clipped.
+    """
+    if levels is None:
+        if data.dtype.kind in 'ui':
+            return data  ## indexes are clipped by take()
+        ind = np.clip(data, 0, n-1)
+    else:
+        ind = np.empty(data.shape, dtype=np.result_type(data.dtype, np.float32))
+        ind[...] = data  ## subtract in floating point so integer data can not wrap around
+        ind -= levels[0]
+        np.multiply(ind, levelsScale(levels, n), out=ind)
+        np.clip(ind, 0, n-1, out=ind)
+    return ind.astype(np.intp)
+    
+def colorTable(lut, order):
+    """
+    Convert the lookup table *lut* (ubyte array of shape (N,), (N,3) or (N,4)) 
+    into an array of N 32-bit colors whose bytes are in the given *order*.
+    Entries with no alpha value are opaque.
+    """
+    table = np.empty((lut.shape[0], 4), dtype=np.ubyte)
+    if lut.ndim == 1:
+        for i in xrange(3):
+            table[:, order[i]] = lut
+    else:
+        for i in xrange(lut.shape[1]):
+            table[:, order[i]] = lut[:, i]
+    if lut.ndim == 1 or lut.shape[1] == 3:
+        table[:, order[3]] = 255
+    return table.view(np.uint32).reshape(lut.shape[0])
+    
 
 def makeQImage(imgData, alpha):
     """Turn an ARGB array into QImage"""
@@ -627,11 +992,10 @@ def makeQImage(imgData, alpha):
         imgFormat = QtGui.QImage.Format_RGB32
         
     imgData = imgData.transpose((1, 0, 2))  ## QImage expects the row/column order to be opposite
-    try:
-        buf = imgData.data
-    except AttributeError:
+    if not imgData.flags['C_CONTIGUOUS']:
+        ## copy unless the array was already laid out for QImage (see makeARGB)
         imgData = np.ascontiguousarray(imgData)
-        buf = imgData.data
+    buf = imgData.data
         
     prof.mark('1')
     qimage = QtGui.QImage(buf, imgData.shape[1], imgData.shape[0], imgFormat)
@@ -641,21 +1005,16 @@ def makeQImage(imgData, alpha):
     return qimage
 
 
-def rescaleData(data, scale, offset):
-    newData = np.empty((data.size,), dtype=np.int)
-    flat = data.reshape(data.size)
-    size = data.size
-    
-    code = """
-    double sc = (double)scale;
-    double off = (double)offset;
-    for( int i=0; i<size; i++ ) {
-        newData[i] = (int)(((double)flat[i] - off) * sc);
-    }
+def rescaleData(data, scale, offset, dtype=int):
+    """
+    Return (data-offset) * scale, converted to *dtype* (values are truncated toward
+    zero for integer types).
     """
-    scipy.weave.inline(code, ['flat', 'newData', 'size', 'offset', 'scale'], compiler='gcc')
-    data = newData.reshape(data.shape)
-    return data
+    newData = np.empty(data.shape, dtype=np.result_type(data.dtype, np.float32))
+    newData[...] = data
+    newData -= offset
+    np.multiply(newData, scale, out=newData)
+    return newData.astype(dtype)
     
 
 #def isosurface(data, level):
@@ -745,98 +1104,188 @@ def rescaleData(data, scale, offset):
     #return facets
     
 
-def isocurve(data, level):
+def isocurve(data, level, connected=False, path=False):
     """
     Generate isocurve from 2D data using marching squares algorithm.
     
-    *data*   2D numpy array of scalar values
-    *level*  The level at which to generate an isosurface
-    
-    This function is SLOW; plenty of room for optimization here.
+    ============= =========================================================
+    Arguments
+    data          2D numpy array of scalar values
+    level         The level at which to generate an isosurface
+    connected     If False, return a single long list of point pairs
+                  If True, return multiple long lists of connected point 
+                  locations (better for drawing continuous lines). 
+                  Closed curves end with their first point.
+    path          If True, return a QPainterPath rather than a list of 
+                  vertex coordinates. This forces connected=True.
+    ============= =========================================================
+    
+    All of the work is done with array operations. Each segment is oriented so that
+    values below *level* lie to its left.
     """    
     
-    sideTable = [
-    [],
-    [0,1],
-    [1,2],
-    [0,2],
-    [0,3],
-    [1,3],
-    [0,1,2,3],
-    [2,3],
-    [2,3],
+    ## Edges crossed by the isocurve for each of the 16 possible cell indexes,
+    ## listed in pairs (one pair per line segment; -1 means no segment). Each pair 
+    ## is ordered such that the values below the level lie to the left of the segment.
+    sideTable = np.array([
+    [-1,-1,-1,-1],
+    [1,0,-1,-1],
+    [2,1,-1,-1],
+    [2,0,-1,-1],
+    [0,3,-1,-1],
+    [1,3,-1,-1],
     [0,1,2,3],
-    [1,3],
-    [0,3],
-    [0,2],
-    [1,2],
-    [0,1],
-    []
-    ]
-    
-    edgeKey=[
+    [2,3,-1,-1],
+    [3,2,-1,-1],
+    [1,0,3,2],
+    [3,1,-1,-1],
+    [3,0,-1,-1],
+    [0,2,-1,-1],
+    [1,2,-1,-1],
+    [0,1,-1,-1],
+    [-1,-1,-1,-1]
+    ], dtype=np.int8)
+    
+    ## corners at either end of each cell edge
+    edgeKey = np.array([
     [(0,1),(0,0)],
     [(0,0), (1,0)],
     [(1,0), (1,1)],
     [(1,1), (0,1)]
-    ]
-    
+    ], dtype=int)
     
-    lines = []
+    data = np.asarray(data)
+    if path:
+        connected = True
     
     ## mark everything below the isosurface level
     mask = data < level
     
     ### make four sub-fields and compute indexes for grid cells
     index = np.zeros([x-1 for x in data.shape], dtype=np.ubyte)
-    fields = np.empty((2,2), dtype=object)
     slices = [slice(0,-1), slice(1,None)]
     for i in [0,1]:
         for j in [0,1]:
-            fields[i,j] = mask[slices[i], slices[j]]
-            #vertIndex = i - 2*j*i + 3*j + 4*k  ## this is just to match Bourk's vertex numbering scheme
             vertIndex = i+2*j
-            #print i,j,k," : ", fields[i,j,k], 2**vertIndex
-            index += fields[i,j] * 2**vertIndex
-            #print index
-    #print index
-    
-    ## add lines
-    for i in xrange(index.shape[0]):                 # data x-axis
-        for j in xrange(index.shape[1]):             # data y-axis     
-            sides = sideTable[index[i,j]]
-            for l in range(0, len(sides), 2):     ## faces for this grid cell
-                edges = sides[l:l+2]
-                pts = []
-                for m in [0,1]:      # points in this face
-                    p1 = edgeKey[edges[m]][0] # p1, p2 are points at either side of an edge
-                    p2 = edgeKey[edges[m]][1]
-                    v1 = data[i+p1[0], j+p1[1]] # v1 and v2 are the values at p1 and p2
-                    v2 = data[i+p2[0], j+p2[1]]
-                    f = (level-v1) / (v2-v1)
-                    fi = 1.0 - f
-                    p = (    ## interpolate between corners
-                        p1[0]*fi + p2[0]*f + i + 0.5, 
-                        p1[1]*fi + p2[1]*f + j + 0.5
-                        )
-                    pts.append(p)
-                lines.append(pts)
+            index += mask[slices[i], slices[j]].astype(np.ubyte) * 2**vertIndex
+    
+    ## find all line segments; each cell has zero, one, or two (saddle cells) segments.
+    ## Segments are sorted by cell (in row-major order), then by position within the cell.
+    index = index.ravel()
+    active = np.argwhere((index != 0) & (index != 15))[:,0]
+    edges = sideTable[index[active]]
+    cells = []
+    sides = []
+    for l in [0, 2]:
+        c = np.argwhere(edges[:, l] >= 0)[:,0]
+        cells.append(active[c])
+        sides.append(edges[c, l:l+2])
+    cells = np.concatenate(cells)
+    sides = np.concatenate(sides)
+    order = np.argsort(cells, kind='mergesort')
+    cells = cells[order]
+    sides = sides[order].astype(int)
+    ci = cells // (data.shape[1]-1)
+    cj = cells % (data.shape[1]-1)
+    nSegs = len(cells)
 
-    return lines ## a list of pairs of points
-    
-    
-def isosurface(data, level):
+    ## interpolate the location where each segment crosses each of its two edges
+    pts = np.empty((2, nSegs, 2), dtype=float)   ## (segment end, segment, x/y)
+    for m in [0,1]:
+        p1 = edgeKey[sides[:,m], 0]  # p1, p2 are points at either side of an edge
+        p2 = edgeKey[sides[:,m], 1]
+        v1 = data[ci+p1[:,0], cj+p1[:,1]].astype(float)  # v1 and v2 are the values at p1 and p2
+        v2 = data[ci+p2[:,0], cj+p2[:,1]].astype(float)
+        f = (level-v1) / (v2-v1)
+        fi = 1.0 - f
+        pts[m,:,0] = p1[:,0]*fi + p2[:,0]*f + ci + 0.5   ## interpolate between corners
+        pts[m,:,1] = p1[:,1]*fi + p2[:,1]*f + cj + 0.5
+    
+    if not connected:
+        return [[tuple(p1), tuple(p2)] for p1, p2 in zip(pts[0].tolist(), pts[1].tolist())]  ## a list of pairs of points
+    
+    ## Give each grid edge a unique ID. Edges along axis 0 are numbered first, 
+    ## followed by edges along axis 1.
+    nx, ny = data.shape
+    nAxis0 = (nx-1) * ny
+    edgeIds = np.empty((2, nSegs), dtype=int)
+    for m in [0,1]:
+        e = sides[:,m]
+        ei = ci + (e == 2)
+        ej = cj + (e == 3)
+        edgeIds[m] = np.where(e % 2 == 1, ei*ny + ej, nAxis0 + ei*(ny-1) + ej)
+    
+    ## Since all segments are oriented the same way around the region below the level,
+    ## every segment ends on the edge where the next segment in its line begins.
+    ## succ[i] is the segment following segment i (or i itself, at the end of a line).
+    segs = np.arange(nSegs)
+    order = np.argsort(edgeIds[0])
+    succ = order[np.searchsorted(edgeIds[0], edgeIds[1], sorter=order).clip(0, max(nSegs-1, 0))]
+    succ = np.where(edgeIds[0][succ] == edgeIds[1], succ, segs)
+    isEnd = succ == segs
+    
+    ## Follow the succ links by pointer jumping (each pass doubles the distance 
+    ## covered, so log2(nSegs) passes reach every segment of the longest line).
+    ## Closed curves never reach an end; they are opened just before their 
+    ## lowest-numbered segment.
+    nPasses = int(np.ceil(np.log2(max(nSegs, 2)))) + 1
+    jump = succ.copy()
+    low = segs.copy()
+    for i in xrange(nPasses):
+        low = np.minimum(low, low[jump])
+        jump = jump[jump]
+    closed = ~isEnd[jump]
+    cut = closed & (succ == low)
+    succ[cut] = segs[cut]
+    isEnd |= cut
+    
+    ## rank each segment by its distance from the end of its line
+    jump = succ.copy()
+    dist = (~isEnd).astype(int)
+    for i in xrange(nPasses):
+        dist += dist[jump]
+        jump = jump[jump]
+    order = np.lexsort((-dist, jump))  ## group segments by line, in order along the line
+    
+    ## each line is made of the start point of its first segment followed by the 
+    ## end points of all its segments
+    first = np.argwhere(np.diff(jump[order]) != 0)[:,0] + 1
+    first = np.concatenate([[0], first]).astype(int) if nSegs > 0 else first
+    x = np.insert(pts[1,order,0], first, pts[0,order[first],0])
+    y = np.insert(pts[1,order,1], first, pts[0,order[first],1])
+    lineEnds = first[1:] + np.arange(1, len(first))
+    
+    if path:
+        connect = np.ones(len(x), dtype=bool)
+        connect[lineEnds-1] = False
+        return arrayToQPath(x, y, connect=connect)
+    
+    xy = zip(x.tolist(), y.tolist())
+    bounds = [0] + lineEnds.tolist() + [len(xy)]
+    return [xy[bounds[k]:bounds[k+1]] for k in xrange(len(first))]  ## a list of lines, each a list of points
+    
+    
+def isosurface(data, level, normals=False):
     """
     Generate isosurface from volumetric data using marching cubes algorithm.
     See Paul Bourke, "Polygonising a Scalar Field"  
     (http://local.wasp.uwa.edu.au/~pbourke/geometry/polygonise/)
     
-    *data*   3D numpy array of scalar values
-    *level*  The level at which to generate an isosurface
-    
-    Returns a list of faces; each face is a list of three vertexes and each vertex is a tuple of three floats.
-    
-    This function is SLOW; plenty of room for optimization here.
+    ============= =========================================================
+    Arguments
+    data          3D numpy array of scalar values
+    level         The level at which to generate an isosurface
+    normals       If True, also return a normal vector for each vertex, 
+                  computed from the gradient of *data*. Normals point 
+                  toward decreasing values, in agreement with the 
+                  winding of the faces.
+    ============= =========================================================
+    
+    Returns (vertexes, faces) where vertexes is an Nx3 float32 array of vertex 
+    coordinates and faces is an Mx3 int32 array of vertex indexes. Faces that 
+    share an edge of the data grid also share the vertex on that edge. If 
+    *normals* is True, an Nx3 float32 array of unit normals is returned as a 
+    third value. All cells are processed with array operations.
     """
 
     ## map from grid cell index to edge index.
@@ -1159,47 +1608,93 @@ def isosurface(data, level):
     
     
     
-    facets = []
+    ## convert the triangle table to an array, padded with -1
+    nTris = np.array([len(t)//3 for t in triTable], dtype=int)
+    triArray = np.empty((256, 15), dtype=int)
+    triArray[:] = -1
+    for i, tris in enumerate(triTable):
+        triArray[i, :len(tris)] = tris
+    
+    ## for each cell edge, the axis along which it runs and the cell corner it starts from
+    edgeKey = np.array(edgeKey, dtype=int)
+    edgeAxis = np.argmax(np.abs(edgeKey[:,1] - edgeKey[:,0]), axis=1)
+    edgeBase = np.minimum(edgeKey[:,0], edgeKey[:,1])
+    
+    data = np.asarray(data)
     
     ## mark everything below the isosurface level
     mask = data < level
     
     ### make eight sub-fields and compute indexes for grid cells
     index = np.zeros([x-1 for x in data.shape], dtype=np.ubyte)
-    fields = np.empty((2,2,2), dtype=object)
     slices = [slice(0,-1), slice(1,None)]
     for i in [0,1]:
         for j in [0,1]:
             for k in [0,1]:
-                fields[i,j,k] = mask[slices[i], slices[j], slices[k]]
                 vertIndex = i - 2*j*i + 3*j + 4*k  ## this is just to match Bourk's vertex numbering scheme
-                #print i,j,k," : ", fields[i,j,k], 2**vertIndex
-                index += fields[i,j,k] * 2**vertIndex
-                #print index
-    #print index
-    
-    ## add facets
-    for i in xrange(index.shape[0]):                 # data x-axis
-        for j in xrange(index.shape[1]):             # data y-axis
-            for k in xrange(index.shape[2]):         # data z-axis
-                tris = triTable[index[i,j,k]]
-                for l in range(0, len(tris), 3):     ## faces for this grid cell
-                    edges = tris[l:l+3]
-                    pts = []
-                    for m in [0,1,2]:      # points in this face
-                        p1 = edgeKey[edges[m]][0]
-                        p2 = edgeKey[edges[m]][1]
-                        v1 = data[i+p1[0], j+p1[1], k+p1[2]]
-                        v2 = data[i+p2[0], j+p2[1], k+p2[2]]
-                        f = (level-v1) / (v2-v1)
-                        fi = 1.0 - f
-                        p = (    ## interpolate between corners
-                            p1[0]*fi + p2[0]*f + i + 0.5, 
-                            p1[1]*fi + p2[1]*f + j + 0.5, 
-                            p1[2]*fi + p2[2]*f + k + 0.5
-                        ) 
-                        pts.append(p)
-                    facets.append(pts)
+                index += mask[slices[i], slices[j], slices[k]].view(np.ubyte) * np.ubyte(2**vertIndex)
+    del mask
+    
+    ## only cells that are partly below the level contain any faces
+    index = index.ravel()
+    cells = np.argwhere((index != 0) & (index != 255))[:,0]
+    cellIndex = index[cells]
+    del index
 
-    return facets
+    ## list the faces, sorted by cell and then by position within the cell
+    faceCells = []
+    faceEdges = []
+    for t in xrange(5):
+        c = np.argwhere(nTris[cellIndex] > t)[:,0]
+        faceCells.append(cells[c])
+        faceEdges.append(triArray[cellIndex[c], 3*t:3*t+3])
+    faceCells = np.concatenate(faceCells)
+    faceEdges = np.concatenate(faceEdges)
+    order = np.argsort(faceCells, kind='mergesort')
+    faceCells = faceCells[order]
+    faceEdges = faceEdges[order]
+    
+    ## Each face vertex lies on a grid edge; give every grid edge a unique ID 
+    ## (axis * data.size + flat index of its first grid point) so that faces 
+    ## sharing an edge also share the vertex.
+    cellPos = np.array(np.unravel_index(faceCells, [x-1 for x in data.shape]))  ## (3, nFaces)
+    strides = np.array([data.shape[1]*data.shape[2], data.shape[2], 1])
+    gridPos = cellPos[:,:,np.newaxis] + edgeBase[faceEdges].transpose(2,0,1)  ## (3, nFaces, 3)
+    edgeIds = edgeAxis[faceEdges] * data.size + (gridPos * strides[:,np.newaxis,np.newaxis]).sum(axis=0)
+    del gridPos, cellPos
+    edgeIds, faces = np.unique(edgeIds.ravel(), return_inverse=True)
+    faces = faces.reshape(len(faceCells), 3).astype(np.int32)
+    
+    ## interpolate the location where the surface crosses each edge
+    axis = edgeIds // data.size
+    p1 = np.array(np.unravel_index(edgeIds % data.size, data.shape))  ## (3, nVerts)
+    p2 = p1.copy()
+    p2[axis, np.arange(len(axis))] += 1
+    v1 = data[tuple(p1)].astype(float)
+    v2 = data[tuple(p2)].astype(float)
+    f = (level-v1) / (v2-v1)
+    vertexes = p1 + 0.5
+    vertexes[axis, np.arange(len(axis))] += f
+    vertexes = vertexes.T.astype(np.float32)
+    
+    if not normals:
+        return vertexes, faces
+    
+    ## vertex normals are interpolated from the data gradient at both ends of the edge
+    grad = np.empty((len(axis), 3), dtype=float)
+    for ax in xrange(3):
+        g = []
+        for p in [p1, p2]:
+            lo = p.copy()
+            hi = p.copy()
+            lo[ax] = np.maximum(lo[ax]-1, 0)
+            hi[ax] = np.minimum(hi[ax]+1, data.shape[ax]-1)
+            g.append((data[tuple(hi)].astype(float) - data[tuple(lo)]) / (hi[ax] - lo[ax]))
+        grad[:,ax] = g[0] * (1.0-f) + g[1] * f
+    ## the gradient points toward higher values; normals point the opposite way
+    norms = np.sqrt((grad**2).sum(axis=1))
+    norms[norms == 0] = 1
+    vertNormals = (grad / -norms[:,np.newaxis]).astype(np.float32)
+    
+    return vertexes, faces, vertNormals
 
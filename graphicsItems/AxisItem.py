@@ -32,7 +32,10 @@ class AxisItem(GraphicsWidget):
         GraphicsWidget.__init__(self, parent)
         self.label = QtGui.QGraphicsTextItem(self)
         self.showValues = showValues
-        self.picture = None
+        self.tickStringCache = {}  ## {(spacing, scale, logMode): {tick index: string}} for the tick levels last drawn
+        self.textRects = {}  ## bounding rects of tick strings, measured with the font self.textFont
+        self.textFont = None
+        self.tickPens = {}   ## {alpha: QPen} used for drawing ticks
         self.orientation = orientation
         if orientation not in ['left', 'right', 'top', 'bottom']:
             raise Exception("Orientation argument must be one of 'left', 'right', 'top', or 'bottom'.")
@@ -85,7 +88,6 @@ class AxisItem(GraphicsWidget):
     def setGrid(self, grid):
         """Set the alpha value for the grid, or False to disable."""
         self.grid = grid
-        self.picture = None
         self.prepareGeometryChange()
         self.update()
         
@@ -96,7 +98,6 @@ class AxisItem(GraphicsWidget):
         of a :func:`PlotItem <pyqtgraph.PlotItem.setLogMode>`)
         """
         self.logMode = log
-        self.picture = None
         self.update()
         
     def resizeEvent(self, ev=None):
@@ -124,7 +125,7 @@ class AxisItem(GraphicsWidget):
             p.setY(int(self.size().height()-br.height()+nudge))
         #self.label.resize(s)
         self.label.setPos(p)
-        self.picture = None
+        self.update()
         
     def showLabel(self, show=True):
         """Show/hide the label text for this axis."""
@@ -151,7 +152,6 @@ class AxisItem(GraphicsWidget):
             self.labelStyle = args
         self.label.setHtml(self.labelString())
         self.resizeEvent()
-        self.picture = None
         self.update()
             
     def labelString(self):
@@ -177,7 +177,7 @@ class AxisItem(GraphicsWidget):
                 h += self.textHeight
         self.setMaximumHeight(h)
         self.setMinimumHeight(h)
-        self.picture = None
+        self.update()
         
         
     def setWidth(self, w=None):
@@ -190,7 +190,6 @@ class AxisItem(GraphicsWidget):
         
     def setPen(self, pen):
         self.pen = pen
-        self.picture = None
         self.update()
         
     def setScale(self, scale=None):
@@ -223,7 +222,6 @@ class AxisItem(GraphicsWidget):
         if scale != self.scale:
             self.scale = scale
             self.setLabel()
-            self.picture = None
             self.update()
         
     def setRange(self, mn, mx):
@@ -233,7 +231,6 @@ class AxisItem(GraphicsWidget):
         self.range = [mn, mx]
         if self.autoScale:
             self.setScale()
-        self.picture = None
         self.update()
         
     def linkedView(self):
@@ -277,14 +274,14 @@ class AxisItem(GraphicsWidget):
             return self.mapRectFromParent(self.geometry()) | linkedView.mapRectToItem(self, linkedView.boundingRect())
         
     def paint(self, p, opt, widget):
-        if self.picture is None:
-            self.picture = QtGui.QPicture()
-            painter = QtGui.QPainter(self.picture)
-            try:
-                self.drawPicture(painter)
-            finally:
-                painter.end()
-        self.picture.play(p)
+        ## The axis is drawn directly rather than being recorded to a QPicture, since 
+        ## the range (and thus the picture) changes on nearly every repaint while panning. 
+        ## Instead, tick strings and their text metrics are cached between repaints.
+        p.save()
+        try:
+            self.drawPicture(p)
+        finally:
+            p.restore()
         
 
 
@@ -384,6 +381,9 @@ class AxisItem(GraphicsWidget):
         For example, if the axis label's units are set to 'V', then a tick value of 0.001 might
         be accompanied by a scale value of 1000. This indicates that the label is displaying 'mV', and 
         thus the tick should display 0.001 * 1000 = 1.
+        
+        Strings are cached per tick for as long as the tick spacing and scale are unchanged,
+        so the string for each value should not depend on the other values in the list.
         """
         if self.logMode:
             return self.logTickStrings(values, scale, spacing)
@@ -402,6 +402,44 @@ class AxisItem(GraphicsWidget):
     def logTickStrings(self, values, scale, spacing):
         return ["%0.1g"%x for x in 10 ** np.array(values).astype(float)]
         
+    def cachedTickStrings(self, values, spacing):
+        """
+        Return tickStrings(values, self.scale, spacing), reusing the strings generated 
+        for ticks at the same spacing during previous repaints. While panning, only the
+        ticks that have just come into view need to be formatted.
+        """
+        key = (spacing, self.scale, self.logMode)
+        cache = self.tickStringCache.get(key, None)
+        if cache is None:
+            cache = self.tickStringCache[key] = {}
+        if spacing:
+            inds = [int(round(v / spacing)) for v in values]  ## robust against floating point error in tick values
+        else:
+            inds = list(values)
+        missing = [j for j in range(len(inds)) if inds[j] not in cache]
+        if len(missing) > 0:
+            strings = self.tickStrings([values[j] for j in missing], self.scale, spacing)
+            for j, s in zip(missing, strings):
+                cache[inds[j]] = s
+        return [cache[i] for i in inds]
+        
+    def textRect(self, p, text):
+        """
+        Return the bounding rect of *text* drawn with the current font of *p*. Rects are 
+        cached per string until the font changes.
+        """
+        font = p.font()
+        if font != self.textFont:
+            self.textFont = QtGui.QFont(font)
+            self.textRects = {}
+        rect = self.textRects.get(text, None)
+        if rect is None:
+            if len(self.textRects) > 1000:
+                self.textRects = {}
+            rect = p.boundingRect(QtCore.QRectF(0, 0, 100, 100), QtCore.Qt.AlignCenter, text)
+            self.textRects[text] = rect
+        return rect
+        
     def drawPicture(self, p):
         
         p.setRenderHint(p.Antialiasing, False)
@@ -475,10 +513,11 @@ class AxisItem(GraphicsWidget):
         
         ## draw ticks
         ## (to improve performance, we do not interleave line and text drawing, since this causes unnecessary pipeline switching)
-        ## draw three different intervals, long ticks first
+        ## draw three different intervals, long ticks first; all ticks of one interval are drawn with a single call
         for i in range(len(tickLevels)):
-            tickPositions.append([])
             ticks = tickLevels[i][1]
+            positions = ((np.asarray(ticks, dtype=float) * xScale) - offset).tolist()
+            tickPositions.append(positions)
         
             ## length of tick
             tickLength = self.tickLength / ((i*1.0)+1.0)
@@ -487,17 +526,19 @@ class AxisItem(GraphicsWidget):
             if self.grid is not False:
                 lineAlpha = self.grid
             
-            for v in ticks:
-                x = (v * xScale) - offset
-                p1 = [x, x]
-                p2 = [x, x]
-                p1[axis] = tickStart
-                p2[axis] = tickStop
-                if self.grid is False:
-                    p2[axis] += tickLength*tickDir
-                p.setPen(QtGui.QPen(QtGui.QColor(150, 150, 150, lineAlpha)))
-                p.drawLine(Point(p1), Point(p2))
-                tickPositions[i].append(x)
+            tickEnd = tickStop
+            if self.grid is False:
+                tickEnd += tickLength*tickDir
+            if axis == 0:
+                lines = [QtCore.QLineF(tickStart, x, tickEnd, x) for x in positions]
+            else:
+                lines = [QtCore.QLineF(x, tickStart, x, tickEnd) for x in positions]
+            
+            pen = self.tickPens.get(lineAlpha, None)
+            if pen is None:
+                pen = self.tickPens[lineAlpha] = QtGui.QPen(QtGui.QColor(150, 150, 150, lineAlpha))
+            p.setPen(pen)
+            p.drawLines(lines)
         prof.mark('draw ticks')
         
         ## determine level to draw text
@@ -505,10 +546,10 @@ class AxisItem(GraphicsWidget):
         for i in range(len(tickLevels)):
             ## take a small sample of strings and measure their rendered text
             spacing, values = tickLevels[i]
-            strings = self.tickStrings(values[:2], self.scale, spacing)
+            strings = self.cachedTickStrings(values[:2], spacing)
             if len(strings) == 0:
                 continue
-            textRects = [p.boundingRect(QtCore.QRectF(0, 0, 100, 100), QtCore.Qt.AlignCenter, s) for s in strings]
+            textRects = [self.textRect(p, s) for s in strings]
             if axis == 0:
                 textSize = np.max([r.height() for r in textRects])
             else:
@@ -521,12 +562,19 @@ class AxisItem(GraphicsWidget):
                 continue
         prof.mark('measure text')
             
+        ## forget strings for tick spacings that are no longer displayed
+        keys = set([(spacing, self.scale, self.logMode) for spacing, values in tickLevels])
+        for k in self.tickStringCache.keys():
+            if k not in keys:
+                del self.tickStringCache[k]
+            
         spacing, values = tickLevels[best]
-        strings = self.tickStrings(values, self.scale, spacing)
+        strings = self.cachedTickStrings(values, spacing)
+        p.setPen(QtGui.QPen(QtGui.QColor(150, 150, 150)))
         for j in range(len(strings)):
             vstr = strings[j]
             x = tickPositions[best][j]
-            textRect = p.boundingRect(QtCore.QRectF(0, 0, 100, 100), QtCore.Qt.AlignCenter, vstr)
+            textRect = self.textRect(p, vstr)
             height = textRect.height()
             self.textHeight = height
             if self.orientation == 'left':
@@ -542,7 +590,6 @@ class AxisItem(GraphicsWidget):
                 textFlags = QtCore.Qt.AlignCenter|QtCore.Qt.AlignTop
                 rect = QtCore.QRectF(x-100, tickStop+max(0,self.tickLength), 200, height)
             
-            p.setPen(QtGui.QPen(QtGui.QColor(150, 150, 150)))
             p.drawText(rect, textFlags, vstr)
         prof.mark('draw text')
         prof.finish()
@@ -19,10 +19,16 @@ class GridItem(UIGraphicsItem):
         #self.setCacheMode(QtGui.QGraphicsItem.DeviceCoordinateCache)
         
         self.picture = None
+        self.pictureSpacing = None  ## [(spacing, line alpha), ...] for each grid level drawn in self.picture
+        self.pictureBounds = None   ## region covered by the lines in self.picture
+        self.lineValues = []        ## [(level, [x values, y values], alpha), ...] for the lines in self.picture
         
         
     def viewChangedEvent(self):
-        self.picture = None
+        ## The picture is not discarded here; paint() only regenerates it when the grid 
+        ## spacing changes or the view leaves the region covered by the picture. 
+        ## Panning within that region only moves the view over the existing picture.
+        pass
         #UIGraphicsItem.viewRangeChanged(self)
         #self.update()
         
@@ -30,89 +36,91 @@ class GridItem(UIGraphicsItem):
         #p.setPen(QtGui.QPen(QtGui.QColor(100, 100, 100)))
         #p.drawRect(self.boundingRect())
         #UIGraphicsItem.paint(self, p, opt, widget)
-        ### draw picture
-        if self.picture is None:
-            #print "no pic, draw.."
-            self.generatePicture()
-        p.drawPicture(QtCore.QPointF(0, 0), self.picture)
-        #p.setPen(QtGui.QPen(QtGui.QColor(255,0,0)))
-        #p.drawLine(0, -100, 0, 100)
-        #p.drawLine(-100, 0, 100, 0)
-        #print "drawing Grid."
-        
+        ul, br, levels = self.gridLevels()
+        spacing = [(tuple(d), tuple(c)) for i, d, c in levels]
+        if self.picture is None or spacing != self.pictureSpacing or (ul < self.pictureBounds[0]).any() or (br > self.pictureBounds[1]).any():
+            self.generatePicture(ul, br, levels)
         
-    def generatePicture(self):
-        self.picture = QtGui.QPicture()
-        p = QtGui.QPainter()
-        p.begin(self.picture)
+        ### draw picture
+        p.save()
+        try:
+            p.setClipRect(self.boundingRect())  ## picture may extend beyond the view
+            p.drawPicture(QtCore.QPointF(0, 0), self.picture)
+            self.drawText(p, ul, br)
+        finally:
+            p.restore()
         
-        dt = self.viewTransform().inverted()[0]
+    def gridLevels(self):
+        """
+        Return the bounds of the view (ul, br) and a list of (level, spacing, alpha) for 
+        each of the three grid levels, where spacing and alpha are arrays giving the distance 
+        between lines and the line opacity for each axis.
+        """
         vr = self.getViewWidget().rect()
-        unit = self.pixelWidth(), self.pixelHeight()
-        dim = [vr.width(), vr.height()]
+        dim = np.array([vr.width(), vr.height()], dtype=float)
         lvr = self.boundingRect()
         ul = np.array([lvr.left(), lvr.top()])
         br = np.array([lvr.right(), lvr.bottom()])
         
-        texts = []
-        
         if ul[1] > br[1]:
             x = ul[1]
             ul[1] = br[1]
             br[1] = x
+        dist = br-ul
+        levels = []
         for i in [2,1,0]:   ## Draw three different scales of grid
-            dist = br-ul
             nlTarget = 10.**i
             d = 10. ** np.floor(np.log10(abs(dist/nlTarget))+0.5)
-            ul1 = np.floor(ul / d) * d
-            br1 = np.ceil(br / d) * d
-            dist = br1-ul1
-            nl = (dist / d) + 0.5
-            #print "level", i
-            #print "  dim", dim
-            #print "  dist", dist
-            #print "  d", d
-            #print "  nl", nl
+            ppl = dim / (dist / d)  ## pixels per line
+            c = np.clip(3.*(ppl-3), 0., 30.).astype(int)
+            levels.append((i, d, c))
+        return ul, br, levels
+        
+    def generatePicture(self, ul, br, levels):
+        ## Lines are generated to cover the view bounds expanded out to a multiple of the 
+        ## coarsest grid spacing, so the picture remains valid while panning within that region.
+        d0 = levels[-1][1]
+        ul0 = np.floor(ul / d0) * d0
+        br0 = np.ceil(br / d0) * d0
+        self.pictureSpacing = [(tuple(d), tuple(c)) for i, d, c in levels]
+        self.pictureBounds = (ul0, br0)
+        self.lineValues = []
+        
+        self.picture = QtGui.QPicture()
+        p = QtGui.QPainter()
+        p.begin(self.picture)
+        for i, d, c in levels:
+            values = []
             for ax in range(0,2):  ## Draw grid for both axes
-                ppl = dim[ax] / nl[ax]
-                c = np.clip(3.*(ppl-3), 0., 30.)
-                linePen = QtGui.QPen(QtGui.QColor(255, 255, 255, c)) 
-                textPen = QtGui.QPen(QtGui.QColor(255, 255, 255, c*2)) 
-                #linePen.setCosmetic(True)
-                #linePen.setWidth(1)
-                bx = (ax+1) % 2
-                for x in range(0, int(nl[ax])):
-                    linePen.setCosmetic(False)
+                x = np.arange(np.ceil(ul0[ax] / d[ax]), np.floor(br0[ax] / d[ax]) + 1) * d[ax]
+                values.append(x)
+                linePen = QtGui.QPen(QtGui.QColor(255, 255, 255, int(c[ax]))) 
+                linePen.setCosmetic(True)
+                p.setPen(linePen)
+                if ax == 0:
+                    lines = [QtCore.QLineF(v, ul0[1], v, br0[1]) for v in x.tolist()]
+                else:
+                    lines = [QtCore.QLineF(ul0[0], v, br0[0], v) for v in x.tolist()]
+                p.drawLines(lines)
+            self.lineValues.append((i, values, c))
+        p.end()
+
+    def drawText(self, p, ul, br):
+        ## label the lines of the two coarsest levels that are inside the view
+        unit = self.pixelWidth(), self.pixelHeight()
+        tr = self.deviceTransform()
+        p.setWorldTransform(tr.inverted()[0], True)
+        for i, values, c in self.lineValues:
+            if i >= 2:
+                continue
+            for ax in range(0,2):
+                textPen = QtGui.QPen(QtGui.QColor(255, 255, 255, int(c[ax])*2)) 
+                p.setPen(textPen)
+                x = values[ax]
+                x = x[(x >= ul[ax]) & (x <= br[ax])]  ## don't label lines that are out of bounds.
+                for v in x.tolist():
                     if ax == 0:
-                        linePen.setWidthF(self.pixelWidth())
-                        #print "ax 0 height", self.pixelHeight()
+                        pos = QtCore.QPointF(v + unit[0], ul[1] + unit[1] * 8.)
                     else:
-                        linePen.setWidthF(self.pixelHeight())
-                        #print "ax 1 width", self.pixelWidth()
-                    p.setPen(linePen)
-                    p1 = np.array([0.,0.])
-                    p2 = np.array([0.,0.])
-                    p1[ax] = ul1[ax] + x * d[ax]
-                    p2[ax] = p1[ax]
-                    p1[bx] = ul[bx]
-                    p2[bx] = br[bx]
-                    ## don't draw lines that are out of bounds.
-                    if p1[ax] < min(ul[ax], br[ax]) or p1[ax] > max(ul[ax], br[ax]):
-                        continue
-                    p.drawLine(QtCore.QPointF(p1[0], p1[1]), QtCore.QPointF(p2[0], p2[1]))
-                    if i < 2:
-                        p.setPen(textPen)
-                        if ax == 0:
-                            x = p1[0] + unit[0]
-                            y = ul[1] + unit[1] * 8.
-                        else:
-                            x = ul[0] + unit[0]*3
-                            y = p1[1] + unit[1]
-                        texts.append((QtCore.QPointF(x, y), "%g"%p1[ax]))
-        tr = self.deviceTransform()
-        #tr.scale(1.5, 1.5)
-        p.setWorldTransform(tr.inverted()[0])
-        for t in texts:
-            x = tr.map(t[0]) + Point(0.5, 0.5)
-            p.drawText(x, t[1])
-        p.end()
+                        pos = QtCore.QPointF(ul[0] + unit[0]*3, v + unit[1])
+                    p.drawText(tr.map(pos) + Point(0.5, 0.5), "%g"%v)
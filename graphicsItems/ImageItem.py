@@ -33,6 +33,9 @@ class ImageItem(GraphicsObject):
     ## performance gains from this are marginal, and it's rather unreliable.
     useWeave = False
     
+    ## number of ARGB buffers kept for reuse by render()
+    maxImageBuffers = 4
+    
     def __init__(self, image=None, **kargs):
         """
         See :func:`setImage <pyqtgraph.ImageItem.setImage>` for all allowed initialization arguments.
@@ -51,6 +54,8 @@ class ImageItem(GraphicsObject):
         
         self.levels = None  ## [min, max] or [[redMin, redMax], ...]
         self.lut = None
+        self.argbTable = None  ## cached color table for 8/16-bit images: (dtype, lut, (table, alpha))
+        self.imageBuffers = {}  ## {(width, height, alpha): ARGB buffer} reused by render()
         
         #self.clipLevel = None
         self.drawKernel = None
@@ -124,10 +129,20 @@ class ImageItem(GraphicsObject):
         Only the first format is compatible with lookup tables. See :func:`makeARGB <pyqtgraph.makeARGB>`
         for more details on how levels are applied.
         """
+        if levels is not None:
+            levels = np.array(levels)  ## copy, so that changes made by the caller are noticed next time
+        if not self.levelsEqual(levels, self.levels):
+            self.argbTable = None
         self.levels = levels
         if update:
             self.updateImage()
         
+    @staticmethod
+    def levelsEqual(a, b):
+        if a is None or b is None:
+            return a is b
+        return np.array_equal(a, b)
+        
     def getLevels(self):
         return self.levels
         #return self.whiteLevel, self.blackLevel
@@ -143,6 +158,7 @@ class ImageItem(GraphicsObject):
         or :class:`GradientEditorItem <pyqtgraph.GradientEditorItem>`.
         """
         self.lut = lut
+        self.argbTable = None
         if update:
             self.updateImage()
 
@@ -261,12 +277,98 @@ class ImageItem(GraphicsObject):
         #print lut.shape
         #print self.lut
             
-        argb, alpha = fn.makeARGB(self.image, lut=lut, levels=self.levels)
+        table = self.getColorTable(self.image, lut)
+        prof.mark('color table')
+            
+        alpha = self.hasAlpha(lut, table)
+        argb, alpha = fn.makeARGB(self.image, lut=lut, levels=self.levels, table=table, output=self.getImageBuffer(alpha))
+        prof.mark('makeARGB')
         self.qimage = fn.makeQImage(argb, alpha)
         #self.pixmap = QtGui.QPixmap.fromImage(self.qimage)
         prof.finish()
     
 
+    def getColorTable(self, image, lut):
+        ## For 8- and 16-bit images, the levels and lut are combined into a single color 
+        ## table that is reused until either one changes.
+        if image.ndim != 2 or fn.tableIndexType(image.dtype) is None:
+            return None
+        if self.levels is not None and np.ndim(self.levels) != 1:
+            return None
+        cached = self.argbTable
+        if cached is None or cached[0] != image.dtype or cached[1] is not lut:
+            cached = (image.dtype, lut, fn.makeARGBTable(image.dtype, lut=lut, levels=self.levels))
+            self.argbTable = cached
+        return cached[2]
+        
+    def getRenderer(self, image=None):
+        """
+        Return a function render(image) that converts an image to a QImage using the 
+        current levels and lookup table, exactly as this item would display it. The 
+        function does not access the item, so it can be used to render images in other 
+        threads (see :func:`setRenderedImage <pyqtgraph.ImageItem.setRenderedImage>`). 
+        *image* is an example of the images to be rendered (by default, the current image);
+        it is used to select the lookup table.
+        """
+        if image is None:
+            image = self.image
+        if callable(self.lut):
+            lut = self.lut(image)
+        else:
+            lut = self.lut
+        table = self.getColorTable(image, lut)
+        levels = self.levels
+        if levels is not None:
+            levels = np.array(levels)  ## copy, in case the caller modifies it later
+        dtype = image.dtype
+        def render(image):
+            ## allocate the output in the layout used by QImage so makeQImage does not copy it
+            output = np.empty((image.shape[1], image.shape[0], 4), dtype=np.ubyte).transpose(1, 0, 2)
+            if image.dtype == dtype:
+                argb, alpha = fn.makeARGB(image, lut=lut, levels=levels, table=table, output=output)
+            else:
+                argb, alpha = fn.makeARGB(image, lut=lut, levels=levels, output=output)
+            return fn.makeQImage(argb, alpha)
+        return render
+        
+    def setRenderedImage(self, image, qimage):
+        """
+        Display *image* using *qimage*, which must have been generated from it by a 
+        function returned by :func:`getRenderer <pyqtgraph.ImageItem.getRenderer>`.
+        This is used for displaying frames that were rendered ahead of time.
+        """
+        if self.image is None or image.shape != self.image.shape:
+            self.prepareGeometryChange()
+        self.image = image.view(np.ndarray)
+        self.qimage = qimage
+        self.update()
+        self.sigImageChanged.emit()
+
+    def hasAlpha(self, lut, table=None):
+        ## predict whether makeARGB will produce an alpha channel for the current image
+        if table is not None:
+            return table[1]
+        if self.image.ndim == 3:
+            return self.image.shape[2] == 4
+        if lut is not None:
+            return lut.ndim == 2 and lut.shape[1] == 4
+        return self.levels is not None and np.ndim(self.levels) == 2 and len(self.levels) == 4
+    
+    def getImageBuffer(self, alpha):
+        """
+        Return an ARGB buffer of shape (width, height, 4) for the current image. The buffer
+        is laid out in memory as (height, width, 4) so that it can be wrapped by a QImage
+        without copying, and is reused by later calls for images of the same shape.
+        """
+        key = self.image.shape[:2] + (alpha,)
+        buf = self.imageBuffers.get(key, None)
+        if buf is None:
+            if len(self.imageBuffers) >= self.maxImageBuffers:
+                self.imageBuffers = {}
+            buf = np.empty((key[1], key[0], 4), dtype=np.ubyte).transpose(1, 0, 2)
+            self.imageBuffers[key] = buf
+        return buf
+
     def paint(self, p, *args):
         prof = debug.Profiler('ImageItem.paint', disabled=True)
         if self.image is None:
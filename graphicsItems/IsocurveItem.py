@@ -93,13 +93,10 @@ class IsocurveItem(GraphicsObject):
         return self.path.boundingRect()
     
     def generatePath(self):
-        self.path = QtGui.QPainterPath()
         if self.data is None:
+            self.path = QtGui.QPainterPath()
             return
-        lines = fn.isocurve(self.data, self.level)
-        for line in lines:
-            self.path.moveTo(*line[0])
-            self.path.lineTo(*line[1])
+        self.path = fn.isocurve(self.data, self.level, connected=True, path=True)
     
     def paint(self, p, *args):
         if self.path is None:
@@ -1,12 +1,10 @@
 from pyqtgraph.Qt import QtGui, QtCore
 from scipy.fftpack import fft
 import numpy as np
-import scipy.stats
 from GraphicsObject import GraphicsObject
 import pyqtgraph.functions as fn
 from pyqtgraph import debug
 from pyqtgraph.Point import Point
-import struct
 
 __all__ = ['PlotCurveItem']
 class PlotCurveItem(GraphicsObject):
@@ -34,6 +32,9 @@ class PlotCurveItem(GraphicsObject):
     sigPlotChanged = QtCore.Signal(object)
     sigClicked = QtCore.Signal(object)
     
+    ## number of samples per path segment used when data is streamed in with appendData()
+    pathChunkSize = 4096
+    
     def __init__(self, *args, **kargs):
         """
         Forwards all arguments to :func:`setData <pyqtgraph.PlotCurveItem.setData>`.
@@ -48,6 +49,7 @@ class PlotCurveItem(GraphicsObject):
         ==============  =======================================================
         """
         GraphicsObject.__init__(self, kargs.get('parent', None))
+        self.dataVersion = 0  ## incremented whenever the data changes
         self.clear()
         self.path = None
         self.fillPath = None
@@ -64,6 +66,8 @@ class PlotCurveItem(GraphicsObject):
             'shadowPen': None,
             'fillLevel': None,
             'brush': None,
+            'clipToView': False,
+            'connect': 'all',
         }
         self.setClickable(kargs.get('clickable', False))
         self.setData(*args, **kargs)
@@ -83,6 +87,12 @@ class PlotCurveItem(GraphicsObject):
         return self.xData, self.yData
         
     def dataBounds(self, ax, frac=1.0):
+        ## bounds are cached until the data changes (see invalidateBounds)
+        frac = min(frac, 1.0)
+        bounds = self.boundsCache.get((ax, frac), None)
+        if bounds is not None:
+            return bounds
+        
         (x, y) = self.getData()
         if x is None or len(x) == 0:
             return (0, 0)
@@ -93,11 +103,18 @@ class PlotCurveItem(GraphicsObject):
             d = y
             
         if frac >= 1.0:
-            return (d.min(), d.max())
+            bounds = (d.min(), d.max())
         elif frac <= 0.0:
             raise Exception("Value for parameter 'frac' must be > 0. (got %s)" % str(frac))
         else:
-            return (scipy.stats.scoreatpercentile(d, 50 - (frac * 50)), scipy.stats.scoreatpercentile(d, 50 + (frac * 50)))
+            bounds = fn.percentileBounds(d, frac)
+        self.boundsCache[(ax, frac)] = bounds
+        return bounds
+        
+    def invalidateBounds(self):
+        ## discard cached bounds; must be called whenever the data changes
+        self.dataVersion += 1
+        self.boundsCache = {}
             
     def setPen(self, *args, **kargs):
         """Set the pen used to draw the curve."""
@@ -121,8 +138,52 @@ class PlotCurveItem(GraphicsObject):
         """Set the level filled to when filling under the curve"""
         self.opts['fillLevel'] = level
         self.fillPath = None
+        if self.pathChunks is not None:
+            self.pathChunks = {}
         self.update()
 
+    def setClipToView(self, clip):
+        """
+        If *clip* is True, the path is generated only from the data within (and near) the 
+        visible x range. The clipped region extends one view width beyond either side of
+        the view; the path is regenerated only when the view leaves that region (or zooms
+        far into it). Clipping is not applied while data is streamed in with appendData().
+        """
+        self.opts['clipToView'] = clip
+        self.path = None
+        self.fillPath = None
+        self.update()
+        
+    def getClippedData(self):
+        """Return the (x, y) data within the current clip region (all data if clipping is disabled)."""
+        x, y = self.getData()
+        if self.clipWindow is not None and x is not None:
+            if self.xSorted is None:
+                self.xSorted = fn.isSorted(x)
+            x, y = fn.clipCurve(x, y, self.clipWindow[0], self.clipWindow[1], self.xSorted)
+        return x, y
+        
+    def updateClipWindow(self):
+        ## Determine the region of data to draw when clipping to the view.
+        ## Returns True if the region has changed.
+        ## (clipping would break the pairing of points for other connect modes)
+        connect = self.opts['connect']
+        if not self.opts['clipToView'] or isinstance(connect, np.ndarray) or connect not in ('all', 'finite'):
+            if self.clipWindow is None:
+                return False
+            self.clipWindow = None
+            return True
+        vr = self.viewRect()
+        if vr is None:
+            return False
+        xmin, xmax = vr.left(), vr.right()
+        cw = self.clipWindow
+        if cw is not None and xmin >= cw[0] and xmax <= cw[1] and (xmax - xmin) * 9 >= cw[1] - cw[0]:
+            return False
+        w = xmax - xmin
+        self.clipWindow = (xmin - w, xmax + w)
+        return True
+
     #def setColor(self, color):
         #self.pen.setColor(color)
         #self.update()
@@ -171,6 +232,9 @@ class PlotCurveItem(GraphicsObject):
                         *fillLevel*
         brush           QBrush to use when filling. Any single argument accepted
                         by :func:`mkBrush <pyqtgraph.mkBrush>` is allowed.
+        connect         'all' (default), 'pairs', 'finite', or a boolean array 
+                        specifying which points are joined by line segments. 
+                        See :func:`arrayToQPath <pyqtgraph.arrayToQPath>`.
         ==============  =======================================================
         
         If non-keyword arguments are used, they will be interpreted as
@@ -220,6 +284,10 @@ class PlotCurveItem(GraphicsObject):
         
         self.path = None
         self.fillPath = None
+        self.pathChunks = None
+        self.dataOffset = 0
+        self.xSorted = None
+        self.invalidateBounds()
         #self.xDisp = self.yDisp = None
         
         if 'pen' in kargs:
@@ -230,6 +298,8 @@ class PlotCurveItem(GraphicsObject):
             self.setFillLevel(kargs['fillLevel'])
         if 'brush' in kargs:
             self.setBrush(kargs['brush'])
+        if 'connect' in kargs:
+            self.opts['connect'] = kargs['connect']
         
         
         prof.mark('set')
@@ -239,59 +309,113 @@ class PlotCurveItem(GraphicsObject):
         prof.mark('emit')
         prof.finish()
         
-    def generatePath(self, x, y):
-        prof = debug.Profiler('PlotCurveItem.generatePath', disabled=True)
-        path = QtGui.QPainterPath()
+    def appendData(self, x, y, dropped=0, droppedData=None):
+        """
+        Update the curve after samples have been added to the end of its data. 
+        *x* and *y* are the complete arrays to display; they must be equal to the previous
+        data with the first *dropped* samples removed and the new samples appended 
+        (this is how :func:`PlotDataItem.appendData <pyqtgraph.PlotDataItem.appendData>` 
+        uses it). If samples were dropped, *droppedData* may give their (x, y) values so 
+        that the cached bounds can be updated without scanning all of the data. (The 
+        dropped samples can not be read from the previous data, since the caller may 
+        already have overwritten them.)
+        
+        The path is stored in segments of pathChunkSize samples and only the segments
+        that changed are regenerated, so the cost of an update does not grow with the
+        length of the data.
+        """
+        if self.xData is None or len(self.xData) == 0:
+            self.updateData(x=x, y=y)
+            return
         
-        ## Create all vertices in path. The method used below creates a binary format so that all 
-        ## vertices can be read in at once. This binary format may change in future versions of Qt, 
-        ## so the original (slower) method is left here for emergencies:
-        #path.moveTo(x[0], y[0])
-        #for i in range(1, y.shape[0]):
-        #    path.lineTo(x[i], y[i])
+        x = x.view(np.ndarray)
+        y = y.view(np.ndarray)
+        if x.shape != y.shape:
+            raise Exception("X and Y arrays must be the same shape--got %s and %s." % (str(x.shape), str(y.shape)))
             
-        ## Speed this up using >> operator
-        ## Format is:
-        ##    numVerts(i4)   0(i4)
-        ##    x(f8)   y(f8)   0(i4)    <-- 0 means this vertex does not connect
-        ##    x(f8)   y(f8)   1(i4)    <-- 1 means this vertex connects to the previous vertex
-        ##    ...
-        ##    0(i4)
-        ##
-        ## All values are big endian--pack using struct.pack('>d') or struct.pack('>i')
-        
-        n = x.shape[0]
-        # create empty array, pad with extra space on either end
-        arr = np.empty(n+2, dtype=[('x', '>f8'), ('y', '>f8'), ('c', '>i4')])
-        # write first two integers
-        prof.mark('allocate empty')
-        arr.data[12:20] = struct.pack('>ii', n, 0)
-        prof.mark('pack header')
-        # Fill array with vertex values
-        arr[1:-1]['x'] = x
-        arr[1:-1]['y'] = y
-        arr[1:-1]['c'] = 1
-        prof.mark('fill array')
-        # write last 0
-        lastInd = 20*(n+1) 
-        arr.data[lastInd:lastInd+4] = struct.pack('>i', 0)
-        prof.mark('footer')
-        # create datastream object and stream into path
-        buf = QtCore.QByteArray(arr.data[12:lastInd+4])  # I think one unnecessary copy happens here
-        prof.mark('create buffer')
-        ds = QtCore.QDataStream(buf)
-        prof.mark('create datastream')
-        ds >> path
-        prof.mark('load')
+        ## The min/max bounds are updated with only the new and dropped samples. They are 
+        ## recomputed from all data later only if an extreme value was dropped.
+        nNew = len(x) - (len(self.xData) - dropped)
+        bounds = [self.boundsCache.get((ax, 1.0), None) for ax in [0, 1]]
+        self.invalidateBounds()
+        if nNew >= 0 and (dropped == 0 or droppedData is not None):
+            for ax, d in [(0, x), (1, y)]:
+                if dropped > 0:
+                    b = fn.mergeBounds(bounds[ax], d[len(d)-nNew:], np.asarray(droppedData[ax]))
+                else:
+                    b = fn.mergeBounds(bounds[ax], d[len(d)-nNew:])
+                if b is not None:
+                    self.boundsCache[(ax, 1.0)] = b
+            
+        self.prepareGeometryChange()
+        self.xData = x
+        self.yData = y
+        self.dataOffset += dropped  ## number of samples removed from the beginning since setData()
+        self.xSorted = None
+        connect = self.opts['connect']
+        if self.pathChunks is None or (dropped % 2 == 1 and not isinstance(connect, np.ndarray) and connect == 'pairs'):
+            ## 'pairs' are counted from the first remaining sample, so every segment changes
+            self.pathChunks = {}
+        self.path = None  ## still used by shape()
+        self.fillPath = None
         
-        prof.finish()
-        return path
+        self.update()
+        self.sigPlotChanged.emit(self)
+        
+    def updatePathChunks(self):
+        """
+        Regenerate any path segments whose range of samples has changed since the last call.
+        Segments cover fixed blocks of absolute sample indexes, so when data is appended 
+        only the last block(s) change, and when samples are dropped only the first block changes.
+        Returns the list of (path, fillPath) to draw.
+        """
+        x, y = self.getData()
+        B = self.pathChunkSize
+        start = self.dataOffset
+        end = start + len(x)
+        fill = self.opts['brush'] is not None and self.opts['fillLevel'] is not None
+        
+        chunks = {}
+        for i in xrange(start // B, (end-1) // B + 1):
+            ## each segment also includes the sample preceding its block so that consecutive 
+            ## segments are connected; segments are keyed by the full range of samples they 
+            ## use, so the first segment is regenerated when that sample is dropped.
+            s = max(i*B - 1, start)
+            e = min((i+1)*B, end)
+            chunk = self.pathChunks.get(i, None)
+            if chunk is None or chunk[0] != s or chunk[1] != e:
+                a = s - start
+                b = e - start
+                connect = self.opts['connect']
+                if isinstance(connect, np.ndarray):
+                    connect = connect[a:b]
+                elif connect == 'pairs' and a % 2 == 1:
+                    connect = np.arange(a, b) % 2 == 0
+                chunk = [s, e, self.generatePath(x[a:b], y[a:b], connect), None]
+            if fill and chunk[3] is None:
+                a = s - start
+                b = e - start
+                p2 = QtGui.QPainterPath(chunk[2])
+                p2.lineTo(x[b-1], self.opts['fillLevel'])
+                p2.lineTo(x[a], self.opts['fillLevel'])
+                p2.lineTo(x[a], y[a])
+                p2.closeSubpath()
+                chunk[3] = p2
+            chunks[i] = chunk
+        self.pathChunks = chunks
+        
+        return [(chunks[i][2], chunks[i][3]) for i in sorted(chunks.keys())]
+        
+    def generatePath(self, x, y, connect=None):
+        if connect is None:
+            connect = self.opts['connect']
+        return fn.arrayToQPath(x, y, connect=connect)
 
 
     def shape(self):
         if self.path is None:
             try:
-                self.path = self.generatePath(*self.getData())
+                self.path = self.generatePath(*self.getClippedData())
             except:
                 return QtGui.QPainterPath()
         return self.path
@@ -301,6 +425,9 @@ class PlotCurveItem(GraphicsObject):
         if x is None or y is None or len(x) == 0 or len(y) == 0:
             return QtCore.QRectF()
             
+        ## use the cached bounds; this is called for every appendData()
+        (xmn, xmx) = self.dataBounds(0)
+        (ymn, ymx) = self.dataBounds(1)
             
         if self.opts['shadowPen'] is not None:
             lineWidth = (max(self.opts['pen'].width(), self.opts['shadowPen'].width()) + 1)
@@ -311,10 +438,10 @@ class PlotCurveItem(GraphicsObject):
         pixels = self.pixelVectors()
         if pixels is None:
             pixels = [Point(0,0), Point(0,0)]
-        xmin = x.min() - pixels[0].x() * lineWidth
-        xmax = x.max() + pixels[0].x() * lineWidth
-        ymin = y.min() - abs(pixels[1].y()) * lineWidth
-        ymax = y.max() + abs(pixels[1].y()) * lineWidth
+        xmin = xmn - pixels[0].x() * lineWidth
+        xmax = xmx + pixels[0].x() * lineWidth
+        ymin = ymn - abs(pixels[1].y()) * lineWidth
+        ymax = ymx + abs(pixels[1].y()) * lineWidth
         
             
         return QtCore.QRectF(xmin, ymin, xmax-xmin, ymax-ymin)
@@ -331,30 +458,39 @@ class PlotCurveItem(GraphicsObject):
         #else:
         x = None
         y = None
-        if self.path is None:
-            x,y = self.getData()
-            if x is None or len(x) == 0 or y is None or len(y) == 0:
+        if self.pathChunks is not None:
+            ## data is being streamed in with appendData(); draw the path in segments
+            if len(self.xData) == 0:
                 return
-            self.path = self.generatePath(x,y)
-            self.fillPath = None
-            
+            paths = self.updatePathChunks()
+            prof.mark('generate path segments')
+        else:
+            if self.updateClipWindow():
+                self.path = None
+            if self.path is None:
+                x,y = self.getClippedData()
+                if x is None or len(x) == 0 or y is None or len(y) == 0:
+                    return
+                self.path = self.generatePath(x,y)
+                self.fillPath = None
+            prof.mark('generate path')
             
-        path = self.path
-        prof.mark('generate path')
+            if self.opts['brush'] is not None and self.opts['fillLevel'] is not None:
+                if self.fillPath is None:
+                    if x is None:
+                        x,y = self.getClippedData()
+                    p2 = QtGui.QPainterPath(self.path)
+                    p2.lineTo(x[-1], self.opts['fillLevel'])
+                    p2.lineTo(x[0], self.opts['fillLevel'])
+                    p2.lineTo(x[0], y[0])
+                    p2.closeSubpath()
+                    self.fillPath = p2
+                prof.mark('generate fill path')
+            paths = [(self.path, self.fillPath)]
             
         if self.opts['brush'] is not None and self.opts['fillLevel'] is not None:
-            if self.fillPath is None:
-                if x is None:
-                    x,y = self.getData()
-                p2 = QtGui.QPainterPath(self.path)
-                p2.lineTo(x[-1], self.opts['fillLevel'])
-                p2.lineTo(x[0], self.opts['fillLevel'])
-                p2.lineTo(x[0], y[0])
-                p2.closeSubpath()
-                self.fillPath = p2
-                
-            prof.mark('generate fill path')
-            p.fillPath(self.fillPath, self.opts['brush'])
+            for path, fillPath in paths:
+                p.fillPath(fillPath, self.opts['brush'])
             prof.mark('draw fill path')
             
 
@@ -379,9 +515,11 @@ class PlotCurveItem(GraphicsObject):
             
         if sp is not None:
             p.setPen(sp)
-            p.drawPath(path)
+            for path, fillPath in paths:
+                p.drawPath(path)
         p.setPen(cp)
-        p.drawPath(path)
+        for path, fillPath in paths:
+            p.drawPath(path)
         prof.mark('drawPath')
         
         #print "Render hints:", int(p.renderHints())
@@ -396,6 +534,12 @@ class PlotCurveItem(GraphicsObject):
         self.xDisp = None  ## display values (after log / fft)
         self.yDisp = None
         self.path = None
+        self.fillPath = None
+        self.pathChunks = None  ## path segments used when streaming data with appendData()
+        self.invalidateBounds()
+        self.dataOffset = 0
+        self.xSorted = None
+        self.clipWindow = None  ## x range of data used to generate the path when clipping to the view
         #del self.xData, self.yData, self.xDisp, self.yDisp, self.path
         
     #def mousePressEvent(self, ev):
@@ -10,6 +10,7 @@ from PlotCurveItem import PlotCurveItem
 from ScatterPlotItem import ScatterPlotItem
 import numpy as np
 import scipy
+import weakref
 import pyqtgraph.functions as fn
 import pyqtgraph.debug as debug
 
@@ -91,6 +92,19 @@ class PlotDataItem(GraphicsObject):
             ==========   ================================================
             identical    spots are all identical. The spot image will be rendered only once and repeated for every point
             decimate     (int) decimate data
+            downsample   (int) combine every *downsample* samples into one, or True to choose
+                         the factor automatically so that there are about two points per 
+                         pixel column for the current view. See 
+                         :func:`setDownsampling() <pyqtgraph.PlotDataItem.setDownsampling>`
+            downsampleMethod  'peak' (default), 'mean', or 'subsample'. See 
+                         :func:`downsampleCurve() <pyqtgraph.downsampleCurve>`
+            clipToView   (bool) If True, only the data within (and near) the visible x range
+                         is passed to the curve and scatter plot. The data is clipped again 
+                         when the view is panned or zoomed beyond the clipped region.
+                         See :func:`setClipToView() <pyqtgraph.PlotDataItem.setClipToView>`
+            maxLength    (int) maximum number of samples to keep when data is added with
+                         :func:`appendData() <pyqtgraph.PlotDataItem.appendData>`. The oldest
+                         samples are discarded first. Default is None (no limit).
             ==========   ================================================
         
         **Meta-info keyword arguments:**
@@ -103,8 +117,20 @@ class PlotDataItem(GraphicsObject):
         self.setFlag(self.ItemHasNoContents)
         self.xData = None
         self.yData = None
-        self.xDisp = None
+        self.xTrans = None  ## data with NaN/inf removed and fft/log applied
+        self.yTrans = None
+        self.dataVersion = 0  ## incremented whenever the transformed data changes
+        self.boundsCache = {}  ## {(axis, frac): bounds} for the current data version
+        self.xDisp = None   ## transformed data after clipping and downsampling
         self.yDisp = None
+        self.xSorted = None  ## whether xData is sorted (None if not yet known)
+        self.clipWindow = None  ## x range of the clipped data (in display coordinates)
+        self.xBuffer = None  ## storage for data added by appendData()
+        self.yBuffer = None
+        self.bufferStart = 0
+        self.nonFinite = None  ## number of NaN/inf samples in xData/yData (None if not yet known)
+        self.autoDsFactor = None  ## downsampling factor in use if automatic downsampling is enabled
+        self._connectedView = None
         #self.curves = []
         #self.scatters = []
         self.curve = PlotCurveItem()
@@ -121,6 +147,8 @@ class PlotDataItem(GraphicsObject):
             'fftMode': False,
             'logMode': [False, False],
             'downsample': False,
+            'downsampleMethod': 'peak',
+            'clipToView': False,
             'alphaHint': 1.0,
             'alphaMode': False,
             
@@ -134,6 +162,7 @@ class PlotDataItem(GraphicsObject):
             'symbolPen': (200,200,200),
             'symbolBrush': (50, 50, 150),
             'identical': False,
+            'maxLength': None,
             
             'data': None,
         }
@@ -156,11 +185,15 @@ class PlotDataItem(GraphicsObject):
         
     def setFftMode(self, mode):
         self.opts['fftMode'] = mode
+        self.xTrans = self.yTrans = None
+        self.invalidateBounds()
         self.xDisp = self.yDisp = None
         self.updateItems()
     
     def setLogMode(self, xMode, yMode):
         self.opts['logMode'] = (xMode, yMode)
+        self.xTrans = self.yTrans = None
+        self.invalidateBounds()
         self.xDisp = self.yDisp = None
         self.updateItems()
     
@@ -233,9 +266,122 @@ class PlotDataItem(GraphicsObject):
         #self.scatter.setSymbolSize(symbolSize)
         self.updateItems()
 
-    def setDownsampling(self, ds):
-        if self.opts['downsample'] != ds:
+    def setDownsampling(self, ds, method=None):
+        """
+        Set the downsampling used to reduce the number of samples displayed.
+        
+        ==============  =================================================================
+        **Arguments:**
+        ds              (int) Number of consecutive samples to combine into one. 
+                        If True, the factor is determined automatically from the view 
+                        range so that there are about two points per pixel column. 
+                        The data is then downsampled again whenever zooming changes the 
+                        factor. False or 1 disables downsampling.
+        method          'peak' (keep the minimum and maximum of each block of samples), 
+                        'mean', or 'subsample'. If None, the method is left unchanged.
+        ==============  =================================================================
+        """
+        changed = False
+        if self.opts['downsample'] != ds or (self.opts['downsample'] is True) != (ds is True):
             self.opts['downsample'] = ds
+            changed = True
+        if method is not None and self.opts['downsampleMethod'] != method:
+            self.opts['downsampleMethod'] = method
+            changed = True
+        if changed:
+            self.xDisp = self.yDisp = None
+            self.updateItems()
+            
+    def setClipToView(self, clip):
+        """
+        If *clip* is True, only the part of the data within (and near) the visible x range
+        is displayed. The clipped region extends one view width beyond either side of the 
+        view, and the data is clipped again only when the view leaves that region 
+        (or zooms far into it). This makes panning and zooming large data sets much faster.
+        """
+        if self.opts['clipToView'] != clip:
+            self.opts['clipToView'] = clip
+            self.xDisp = self.yDisp = None
+            self.updateItems()
+            
+    def visibleXRange(self):
+        """Return the (min, max) x values visible in the view, or None if there is no view."""
+        rect = self.viewRect()
+        if rect is None:
+            return None
+        return (rect.left(), rect.right())
+        
+    def isXSorted(self):
+        """Return True if the transformed x values (see getTransformedData) are sorted."""
+        if self.opts['fftMode']:
+            return True
+        if self.xSorted is None:
+            self.xSorted = fn.isSorted(self.xData)
+        return self.xSorted  ## removing samples and log scaling do not change the order
+            
+    def autoDownsampleFactor(self):
+        """
+        Return the number of samples per pixel column for the current view, 
+        as used by automatic downsampling.
+        """
+        x, y = self.getTransformedData()
+        if x is None or len(x) < 2:
+            return 1
+        px = self.pixelWidth()
+        if px == 0:
+            return 1
+        vr = self.visibleXRange()
+        if self.isXSorted() and vr is not None:
+            ## count the samples actually in view
+            i0, i1 = np.searchsorted(x, vr)
+            i1 = min(i1, len(x)-1)
+            if i1 - i0 < 2:
+                return 1
+            pixels = float(x[i1] - x[i0]) / px
+            if pixels <= 0:
+                return 1
+            return max(1, int((i1 - i0) / pixels))
+        dx = float(x[-1] - x[0]) / (len(x) - 1)  ## assumes samples are roughly evenly spaced
+        if dx == 0 or not np.isfinite(dx):
+            return 1
+        return max(1, int(px / abs(dx)))
+        
+    def itemChange(self, change, value):
+        ret = GraphicsObject.itemChange(self, change, value)
+        if change == self.ItemParentHasChanged or change == self.ItemSceneHasChanged:
+            self.updateView()
+        return ret
+        
+    def updateView(self):
+        ## connect to the range-change signal of this item's view (used by automatic downsampling)
+        view = self.getViewBox()
+        if view is None or not hasattr(view, 'sigRangeChanged'):
+            return
+        if self._connectedView is not None and view is self._connectedView():
+            return
+        if self._connectedView is not None:
+            cv = self._connectedView()
+            if cv is not None:
+                cv.sigRangeChanged.disconnect(self.viewRangeChanged)
+        view.sigRangeChanged.connect(self.viewRangeChanged)
+        self._connectedView = weakref.ref(view)
+        
+    def viewRangeChanged(self):
+        """Called when the view range has changed; regenerates the displayed data if needed."""
+        if self.xDisp is None:
+            return
+        update = False
+        if self.opts['clipToView']:
+            vr = self.visibleXRange()
+            cw = self.clipWindow
+            if vr is not None:
+                if cw is None or vr[0] < cw[0] or vr[1] > cw[1]:
+                    update = True  ## view has left the clipped region
+                elif (vr[1] - vr[0]) * 9 < cw[1] - cw[0]:
+                    update = True  ## zoomed in far enough that clipping again is worthwhile
+        if not update and self.opts['downsample'] is True:
+            update = self.autoDownsampleFactor() != self.autoDsFactor
+        if update:
             self.xDisp = self.yDisp = None
             self.updateItems()
         
@@ -336,8 +482,15 @@ class PlotDataItem(GraphicsObject):
         
         self.xData = x.view(np.ndarray)  ## one last check to make sure there are no MetaArrays getting by
         self.yData = y.view(np.ndarray)
+        self.xBuffer = None
+        self.yBuffer = None
+        self.nonFinite = None
+        self.xSorted = None
+        self.xTrans = None
+        self.yTrans = None
         self.xDisp = None
         self.yDisp = None
+        self.invalidateBounds()
         prof.mark('set data')
         
         self.updateItems()
@@ -386,21 +539,51 @@ class PlotDataItem(GraphicsObject):
 
 
     def getData(self):
+        """
+        Return the (x, y) data as displayed: after any fft/log transformation, clipping 
+        to the view, and downsampling.
+        """
         if self.xData is None:
             return (None, None)
         if self.xDisp is None:
-            nanMask = np.isnan(self.xData) | np.isnan(self.yData) | np.isinf(self.xData) | np.isinf(self.yData)
-            if any(nanMask):
+            x, y = self.getTransformedData()
+            if self.opts['clipToView']:
+                vr = self.visibleXRange()
+                if vr is None:
+                    self.clipWindow = None
+                else:
+                    w = vr[1] - vr[0]
+                    self.clipWindow = (vr[0] - w, vr[1] + w)
+                    x, y = fn.clipCurve(x, y, self.clipWindow[0], self.clipWindow[1], self.isXSorted())
+            ds = self.opts['downsample']
+            if ds is True:
+                ds = self.autoDsFactor = self.autoDownsampleFactor()
+            if ds > 1:
+                #y = resample(y[:len(x)*ds], len(x))  ## scipy.signal.resample causes nasty ringing
+                x, y = fn.downsampleCurve(x, y, ds, self.opts['downsampleMethod'])
+            self.xDisp = x
+            self.yDisp = y
+        #print self.yDisp.shape, self.yDisp.min(), self.yDisp.max()
+        #print self.xDisp.shape, self.xDisp.min(), self.xDisp.max()
+        return self.xDisp, self.yDisp
+        
+    def getTransformedData(self):
+        """
+        Return the (x, y) data with NaN/inf values removed and any fft/log transformation 
+        applied, but not clipped or downsampled.
+        """
+        if self.xData is None:
+            return (None, None)
+        if self.xTrans is None:
+            if self.nonFinite != 0:
+                nanMask = np.isnan(self.xData) | np.isnan(self.yData) | np.isinf(self.xData) | np.isinf(self.yData)
+                self.nonFinite = nanMask.sum()
+            if self.nonFinite > 0:
                 x = self.xData[~nanMask]
                 y = self.yData[~nanMask]
             else:
                 x = self.xData
                 y = self.yData
-            ds = self.opts['downsample']
-            if ds > 1:
-                x = x[::ds]
-                #y = resample(y[:len(x)*ds], len(x))  ## scipy.signal.resample causes nasty ringing
-                y = y[::ds]
             if self.opts['fftMode']:
                 f = np.fft.fft(y) / len(y)
                 y = abs(f[1:len(f)/2])
@@ -415,14 +598,18 @@ class PlotDataItem(GraphicsObject):
                 if any(nanMask):
                     x = x[~nanMask]
                     y = y[~nanMask]
-            self.xDisp = x
-            self.yDisp = y
-        #print self.yDisp.shape, self.yDisp.min(), self.yDisp.max()
-        #print self.xDisp.shape, self.xDisp.min(), self.xDisp.max()
-        return self.xDisp, self.yDisp
+            self.xTrans = x
+            self.yTrans = y
+        return self.xTrans, self.yTrans
 
     def dataBounds(self, ax, frac=1.0):
-        (x, y) = self.getData()
+        ## bounds are cached until the data changes (see invalidateBounds)
+        frac = min(frac, 1.0)
+        bounds = self.boundsCache.get((ax, frac), None)
+        if bounds is not None:
+            return bounds
+        
+        (x, y) = self.getTransformedData()  ## bounds of all data, not just the clipped region
         if x is None or len(x) == 0:
             return (0, 0)
             
@@ -432,11 +619,18 @@ class PlotDataItem(GraphicsObject):
             d = y
             
         if frac >= 1.0:
-            return (np.min(d), np.max(d))
+            bounds = (np.min(d), np.max(d))
         elif frac <= 0.0:
             raise Exception("Value for parameter 'frac' must be > 0. (got %s)" % str(frac))
         else:
-            return (scipy.stats.scoreatpercentile(d, 50 - (frac * 50)), scipy.stats.scoreatpercentile(d, 50 + (frac * 50)))
+            bounds = fn.percentileBounds(d, frac)
+        self.boundsCache[(ax, frac)] = bounds
+        return bounds
+        
+    def invalidateBounds(self):
+        ## discard cached bounds; must be called whenever the transformed data changes
+        self.dataVersion += 1
+        self.boundsCache = {}
 
 
     def clear(self):
@@ -447,13 +641,137 @@ class PlotDataItem(GraphicsObject):
         #self.scatters = []
         self.xData = None
         self.yData = None
+        self.xTrans = None
+        self.yTrans = None
         self.xDisp = None
         self.yDisp = None
+        self.xBuffer = None
+        self.yBuffer = None
+        self.nonFinite = None
+        self.xSorted = None
+        self.invalidateBounds()
         self.curve.setData([])
         self.scatter.setData([])
             
     def appendData(self, *args, **kargs):
-        pass
+        """
+        Add samples to the end of the data displayed by this item. Accepts appendData(y), 
+        appendData(x, y), or x and y keyword arguments. If no x values are given, they
+        continue counting up from the last x value.
+        
+        Data is stored in a preallocated buffer that grows by doubling its capacity, so 
+        adding k samples costs O(k) rather than copying the entire history. If *maxLength*
+        has been set (see :func:`__init__() <pyqtgraph.PlotDataItem.__init__>`), the oldest
+        samples are discarded so that the buffer acts as a ring buffer with fixed capacity;
+        getData() still returns contiguous arrays without copying.
+        
+        As long as no fft, log, or downsampling transformation is active and the data
+        contains no NaN or inf values, the curve and scatter plot are updated 
+        incrementally as well. Otherwise the displayed data is regenerated as in setData().
+        """
+        prof = debug.Profiler('PlotDataItem.appendData (0x%x)' % id(self), disabled=True)
+        x = kargs.get('x', None)
+        y = kargs.get('y', None)
+        if len(args) == 1:
+            y = args[0]
+        elif len(args) == 2:
+            x, y = args
+        if y is None:
+            return
+        y = np.asarray(y)
+        if y.ndim == 0:
+            y = y.reshape(1)
+        if x is None:
+            if self.xData is None or len(self.xData) == 0:
+                x = np.arange(len(y))
+            else:
+                x = self.xData[-1] + 1 + np.arange(len(y))
+        else:
+            x = np.asarray(x)
+            if x.ndim == 0:
+                x = x.reshape(1)
+        if x.shape != y.shape or x.ndim != 1:
+            raise Exception("X and Y arrays must be 1D and the same shape--got %s and %s." % (str(x.shape), str(y.shape)))
+        
+        if self.xData is None or len(self.xData) == 0:
+            self.setData(x=x, y=y)
+            return
+        
+        ## the displayed data can be updated incrementally only if it is the raw data
+        incremental = self.xDisp is self.xData and self.yDisp is self.yData
+        
+        maxLen = self.opts['maxLength']
+        if maxLen is not None and len(y) > maxLen:
+            x = x[-maxLen:]
+            y = y[-maxLen:]
+        n = len(self.xData)
+        k = len(y)
+        if maxLen is not None:
+            drop = min(n, max(0, n + k - maxLen))
+        else:
+            drop = 0
+            
+        if self.xSorted is not None:
+            self.xSorted = fn.isSorted(x) and (drop == n or self.xSorted and x[0] >= self.xData[-1])
+        if self.nonFinite is not None:
+            self.nonFinite += (~(np.isfinite(x) & np.isfinite(y))).sum()
+            if drop > 0:
+                self.nonFinite -= (~(np.isfinite(self.xData[:drop]) & np.isfinite(self.yData[:drop]))).sum()
+        prof.mark('check values')
+        
+        ## extend the cached min/max bounds (before the dropped samples are overwritten)
+        dropped = (self.xData[:drop].copy(), self.yData[:drop].copy())
+        bounds = [fn.mergeBounds(self.boundsCache.get((0, 1.0), None), x, dropped[0]),
+                  fn.mergeBounds(self.boundsCache.get((1, 1.0), None), y, dropped[1])]
+        self.invalidateBounds()
+        
+        ## make room at the end of the buffer. The buffers hold up to twice the number 
+        ## of samples kept, so data only needs to be moved to the front occasionally.
+        start = self.bufferStart + drop
+        n -= drop
+        xBuf = self.xBuffer
+        yBuf = self.yBuffer
+        if xBuf is None or start + n + k > len(xBuf) or not np.can_cast(x.dtype, xBuf.dtype) or not np.can_cast(y.dtype, yBuf.dtype):
+            cap = max(2 * (n + k), 16)
+            if maxLen is not None:
+                cap = max(min(cap, 2 * maxLen), n + k)
+            if xBuf is None or cap > len(xBuf) or not np.can_cast(x.dtype, xBuf.dtype) or not np.can_cast(y.dtype, yBuf.dtype):
+                xBuf = np.empty(cap, dtype=np.promote_types(self.xData.dtype, x.dtype))
+                yBuf = np.empty(cap, dtype=np.promote_types(self.yData.dtype, y.dtype))
+            xBuf[:n] = self.xData[drop:].copy()
+            yBuf[:n] = self.yData[drop:].copy()
+            self.xBuffer = xBuf
+            self.yBuffer = yBuf
+            start = 0
+        xBuf[start+n:start+n+k] = x
+        yBuf[start+n:start+n+k] = y
+        self.bufferStart = start
+        self.xData = xBuf[start:start+n+k]
+        self.yData = yBuf[start:start+n+k]
+        prof.mark('copy data')
+        
+        if incremental and self.nonFinite == 0:
+            self.xTrans = self.xDisp = self.xData
+            self.yTrans = self.yDisp = self.yData
+            for ax in [0, 1]:
+                if bounds[ax] is not None:
+                    self.boundsCache[(ax, 1.0)] = bounds[ax]
+            if self.curve.isVisibleTo(self):
+                self.curve.appendData(self.xDisp, self.yDisp, drop, dropped)
+            if self.scatter.isVisibleTo(self):
+                self.scatter.addPoints(x=x, y=y, maxLength=maxLen)
+        else:
+            self.xTrans = self.yTrans = None
+            self.xDisp = self.yDisp = None
+            self.updateItems()
+        prof.mark('update items')
+        
+        view = self.getViewBox()
+        if view is not None:
+            view.itemBoundsChanged(self)  ## inform view so it can update its range if it wants
+        self.sigPlotChanged.emit(self)
+        prof.mark('emit')
+        prof.finish()
     
     def curveClicked(self):
         self.sigClicked.emit(self)
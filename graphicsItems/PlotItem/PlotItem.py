@@ -289,6 +289,8 @@ class PlotItem(GraphicsWidget):
         #self.ctrl.yLinkCombo.currentIndexChanged.connect(self.yLinkComboChanged)
 
         c.downsampleSpin.valueChanged.connect(self.updateDownsampling)
+        c.decimateGroup.toggled.connect(self.updateDownsampling)
+        c.autoDecimateRadio.toggled.connect(self.updateDownsampling)
 
         self.ctrl.avgParamList.itemClicked.connect(self.avgParamListClicked)
         self.ctrl.averageGroup.toggled.connect(self.avgToggled)
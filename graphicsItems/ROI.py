@@ -726,7 +726,15 @@ class ROI(GraphicsObject):
     def getArrayRegion(self, data, img, axes=(0,1)):
         """Use the position of this ROI relative to an imageItem to pull a slice from an array."""
         
+        shape, vectors, origin = self.getAffineSliceParams(data, img, axes)
+        return fn.affineSlice(data, shape=shape, vectors=vectors, origin=origin, axes=axes, order=1)
         
+    def getAffineSliceParams(self, data, img, axes=(0,1)):
+        """
+        Return the (shape, vectors, origin) arguments that :func:`affineSlice <pyqtgraph.affineSlice>`
+        needs to pull this ROI's region from *data*. Only the shape of *data* is used, so the result
+        also applies to any other array with the same shape along *axes*.
+        """
         shape = self.state['size']
         
         origin = self.mapToItem(img, QtCore.QPointF(0, 0))
@@ -749,7 +757,7 @@ class ROI(GraphicsObject):
         
         #print "shape", shape, "vectors", vectors, "origin", origin
         
-        return fn.affineSlice(data, shape=shape, vectors=vectors, origin=origin, axes=axes, order=1)
+        return shape, vectors, origin
         
         ### transpose data so x and y are the first 2 axes
         #trAx = range(0, data.ndim)
@@ -3,7 +3,6 @@ from pyqtgraph.Point import Point
 import pyqtgraph.functions as fn
 from GraphicsObject import GraphicsObject
 import numpy as np
-import scipy.stats
 
 __all__ = ['ScatterPlotItem', 'SpotItem']
 
@@ -29,6 +28,182 @@ for k, c in coords.iteritems():
     Symbols[k].closeSubpath()
 
 
+def symbolName(symbol):
+    """Return the key into Symbols for *symbol*, which may also be given as an integer (for easy iteration)."""
+    try:
+        symbol = int(symbol)
+    except:
+        pass
+    if symbol is None or symbol == '':
+        return 'o'    ## circle by default
+    elif isinstance(symbol, int):
+        return ['o', 's', 't', 'd', '+'][symbol]
+    return symbol
+
+def drawSymbol(painter, symbol, size, pen, brush):
+    painter.scale(size, size)
+    painter.setPen(pen)
+    painter.setBrush(brush)
+    painter.drawPath(Symbols[symbolName(symbol)])
+
+def penKey(pen):
+    """Return a tuple of numbers that identifies how *pen* draws a symbol."""
+    return (pen.color().rgba(), pen.widthF(), int(pen.style()))
+
+def brushKey(brush):
+    """Return a tuple of numbers that identifies how *brush* fills a symbol."""
+    return (brush.color().rgba(), int(brush.style()))
+
+def setRecordPen(recs, index, pen):
+    """Set the pen of spot *index* in the record array *recs*, along with its numeric key."""
+    recs['pen'][index] = pen
+    recs['penColor'][index], recs['penWidth'][index], recs['penStyle'][index] = penKey(pen)
+
+def setRecordBrush(recs, index, brush):
+    """Set the brush of spot *index* in the record array *recs*, along with its numeric key."""
+    recs['brush'][index] = brush
+    recs['brushColor'][index], recs['brushStyle'][index] = brushKey(brush)
+
+## record fields that determine how a spot is drawn; spots are grouped by these in generateSpots()
+StyleFields = ['symbol', 'size', 'penColor', 'penWidth', 'penStyle', 'brushColor', 'brushStyle']
+
+def makeSymbolImage(symbol, size, pen, brush):
+    """Render a single symbol into a QImage just large enough to hold it (including the pen)."""
+    penWidth = max(pen.widthF(), 1) if pen.style() != QtCore.Qt.NoPen else 0
+    width = int(np.ceil(size + penWidth)) + 2
+    image = QtGui.QImage(width, width, QtGui.QImage.Format_ARGB32_Premultiplied)
+    image.fill(0)
+    p = QtGui.QPainter(image)
+    p.setRenderHint(p.Antialiasing)
+    p.translate(width*0.5, width*0.5)
+    drawSymbol(p, symbol, size, pen, brush)
+    p.end()
+    return image
+
+
+class SymbolAtlas(object):
+    """
+    Renders each distinct spot style (symbol, size, pen, brush) only once and packs
+    the images together into a single QPixmap. This allows all spots in a
+    ScatterPlotItem to be drawn with a single call to QPainter.drawPixmapFragments.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.index = {}     ## style key: index into self.images / self.coords
+        self.images = []    ## pre-rendered QImage for each style
+        self.coords = []    ## QRectF locating each style within the atlas pixmap
+        self.atlas = None   ## None indicates the pixmap must be rebuilt
+
+    def symbolIndex(self, symbol, size, pen, brush):
+        """Return the index of the atlas entry for this spot style, rendering it if needed."""
+        symbol = symbolName(symbol)
+        key = (symbol, size) + penKey(pen) + brushKey(brush)
+        ind = self.index.get(key, None)
+        if ind is None:
+            ind = len(self.images)
+            self.images.append(makeSymbolImage(symbol, size, pen, brush))
+            self.index[key] = ind
+            self.atlas = None
+        return ind
+
+    def maxWidth(self):
+        if len(self.images) == 0:
+            return 0
+        return max([img.width() for img in self.images])
+
+    def getAtlas(self):
+        if self.atlas is None:
+            self.buildAtlas()
+        return self.atlas
+
+    def buildAtlas(self):
+        ## Simple shelf packing: place the tallest images first, in rows that are
+        ## about as wide as the atlas is tall.
+        sizes = [(img.width(), img.height()) for img in self.images]
+        if len(sizes) == 0:
+            self.atlas = QtGui.QPixmap()
+            self.coords = []
+            return
+        area = sum([w*h for w,h in sizes])
+        width = max(max([w for w,h in sizes]), int(np.ceil(area**0.5)))
+        order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+        coords = [None] * len(sizes)
+        x = y = rowHeight = 0
+        for i in order:
+            w, h = sizes[i]
+            if x + w > width:
+                y += rowHeight
+                x = 0
+                rowHeight = 0
+            coords[i] = QtCore.QRectF(x, y, w, h)
+            x += w
+            rowHeight = max(rowHeight, h)
+
+        img = QtGui.QImage(width, y + rowHeight, QtGui.QImage.Format_ARGB32_Premultiplied)
+        img.fill(0)
+        p = QtGui.QPainter(img)
+        for i in xrange(len(self.images)):
+            p.drawImage(coords[i].topLeft(), self.images[i])
+        p.end()
+        self.coords = coords
+        self.atlas = QtGui.QPixmap.fromImage(img)
+
+
+
+class SpotIndex(object):
+    """
+    Uniform grid over the spot positions of a ScatterPlotItem, used to find
+    spots near a point without testing every spot.
+    
+    Spots are sorted by grid cell so that the spots within any run of cells
+    along the y axis are contiguous in self.order. Non-finite positions are
+    placed in an extra cell past the end of the grid and are never returned.
+    
+    *offset* is the number of points that had been dropped from the beginning of
+    the data by addPoints when the index was built; ScatterPlotItem uses it to keep
+    using the index (for the points that remain) after more points are added or dropped.
+    """
+    def __init__(self, x, y, sizes, spotsPerCell=4, offset=0):
+        n = len(x)
+        self.n = n
+        self.offset = offset
+        self.sizes = sizes
+        self.maxSize = sizes.max() if n > 0 else 0
+        finite = np.isfinite(x) & np.isfinite(y)
+        if finite.any():
+            self.x0 = x[finite].min()
+            self.y0 = y[finite].min()
+            w = x[finite].max() - self.x0
+            h = y[finite].max() - self.y0
+        else:
+            self.x0 = self.y0 = 0.
+            w = h = 0.
+        self.nx = self.ny = max(1, int((n / float(spotsPerCell)) ** 0.5))
+        self.cw = (w / self.nx) if w > 0 else 1.0
+        self.ch = (h / self.ny) if h > 0 else 1.0
+        
+        x = np.where(finite, x, self.x0)
+        y = np.where(finite, y, self.y0)
+        cx = np.clip(((x - self.x0) / self.cw).astype(int), 0, self.nx-1)
+        cy = np.clip(((y - self.y0) / self.ch).astype(int), 0, self.ny-1)
+        cell = cx * self.ny + cy
+        cell[~finite] = self.nx * self.ny
+        self.order = np.argsort(cell, kind='mergesort')
+        self.starts = np.searchsorted(cell[self.order], np.arange(self.nx * self.ny + 2))
+        
+    def candidates(self, x, y, rx, ry):
+        """Return indexes of all spots that may lie within (rx, ry) of (x, y)."""
+        cx0 = max(0, int(np.floor((x - rx - self.x0) / self.cw)))
+        cx1 = min(self.nx-1, int(np.floor((x + rx - self.x0) / self.cw)))
+        cy0 = max(0, int(np.floor((y - ry - self.y0) / self.ch)))
+        cy1 = min(self.ny-1, int(np.floor((y + ry - self.y0) / self.ch)))
+        if cx0 > cx1 or cy0 > cy1:
+            return np.empty(0, dtype=int)
+        runs = [self.order[self.starts[cx*self.ny+cy0]:self.starts[cx*self.ny+cy1+1]] for cx in xrange(cx0, cx1+1)]
+        return np.concatenate(runs)
+
 
 class ScatterPlotItem(GraphicsObject):
     """
@@ -39,6 +214,11 @@ class ScatterPlotItem(GraphicsObject):
     The size, shape, pen, and fill brush may be set for each point individually 
     or for all points. 
     
+    All points are drawn by the ScatterPlotItem itself. In pxMode, each distinct
+    spot style is pre-rendered once into a shared pixmap (see SymbolAtlas) and
+    all visible spots are drawn with a single call to QPainter.drawPixmapFragments.
+    :class:`SpotItem` objects are only created when they are requested through
+    points(), pointsAt(), or sigClicked.
     
     ========================  ===============================================
     **Signals:**
@@ -59,11 +239,23 @@ class ScatterPlotItem(GraphicsObject):
         
         GraphicsObject.__init__(self)
         self.data = None
-        self.spots = []
-        self.bounds = [None, None]
-        self.opts = {}
+        self._buffer = None   ## self.data is a view of self._buffer, which may have extra capacity for addPoints
+        self._start = 0       ## index of self.data[0] within self._buffer
+        self._dropped = 0     ## number of points discarded from the beginning of the data by addPoints
+        self._generation = 0  ## incremented when the data is replaced (clear / setData); invalidates old SpotItems
+        self.bounds = [None, None]  ## cached (min, max) for each axis
+        self.boundsCache = {}  ## cached percentile bounds {(axis, frac): bounds}
+        self.dataVersion = 0   ## incremented whenever the data or spot sizes change
+        self.opts = {'maxLength': None, 'data': None}
         self.spotsValid = False
-        self._spotPixmap = None
+        self.atlas = SymbolAtlas()
+        self.fragments = None    ## cached list of PixmapFragments (pxMode)
+        self.fragmentKey = None  ## (transform, cull rect) that self.fragments was generated for
+        self.fragmentRows = None ## index of the spot drawn by each fragment
+        self.fragmentAtlas = None ## atlas pixmap whose sub-images self.fragments refer to
+        self.picture = None      ## cached list of QPictures of all spots (not pxMode); at most a few are kept
+        self.spotIndex = None    ## SpotIndex used by pointsAt(); regenerated when data changes
+        self.exportOpts = False
         
         self.setPen(200,200,200)
         self.setBrush(100,100,150)
@@ -107,12 +299,37 @@ class ScatterPlotItem(GraphicsObject):
         *size*                 The size (or list of sizes) of spots. If *pxMode* is True, this value is in pixels. Otherwise,
                                it is in the item's local coordinate system.
         *data*                 a list of python objects used to uniquely identify each spot.
+        *maxLength*            The maximum number of points to keep when points are added with addPoints().
+                               See :func:`setMaxLength <pyqtgraph.ScatterPlotItem.setMaxLength>`.
         ====================== ===============================================================================================
         """
         
         self.clear()
+        recs, opts = self.buildRecords(*args, **kargs)
+        self.data = self._buffer = recs
+        self._start = 0
+        self._dropped = 0
 
+        ## Set any extra parameters provided in keyword arguments
+        for k in ['pxMode', 'identical', 'pen', 'brush', 'symbol', 'size', 'maxLength']:
+            if k in opts:
+                setMethod = getattr(self, 'set' + k[0].upper() + k[1:])
+                setMethod(opts[k])
         
+        if 'data' in opts:
+            self.setPointData(opts['data'])
+            
+        self.prepareGeometryChange()
+        self.updateSpots()
+        self.sigPlotChanged.emit(self)
+        
+    def buildRecords(self, *args, **kargs):
+        """
+        Interpret the arguments accepted by setData() and return a tuple (records, opts).
+        *records* is a new record array with one row per spot, including any per-spot
+        pens, brushes, symbols, sizes, and data that were given as lists. *opts* contains
+        the remaining keyword arguments, which apply to all spots.
+        """
         ## deal with non-keyword arguments
         if len(args) == 1:
             kargs['spots'] = args[0]
@@ -152,13 +369,21 @@ class ScatterPlotItem(GraphicsObject):
             numPts = 0
         
         ## create empty record array
-        self.data = np.empty(numPts, dtype=[('x', float), ('y', float), ('size', float), ('symbol', 'S1'), ('pen', object), ('brush', object), ('spot', object)])
-        self.data['size'] = -1  ## indicates use default size
-        self.data['symbol'] = ''
-        self.data['pen'] = None
-        self.data['brush'] = None
-        self.pointData = np.empty(numPts, dtype=object)
-        self.pointData[:] = None
+        recs = np.empty(numPts, dtype=[('x', float), ('y', float), ('size', float), ('symbol', 'S1'), ('pen', object), ('brush', object), 
+                                       ('penColor', np.uint32), ('penWidth', float), ('penStyle', int), ('brushColor', np.uint32), ('brushStyle', int),
+                                       ('data', object), ('spot', object), ('atlasIndex', int)])
+        recs['size'] = -1  ## indicates use default size
+        recs['symbol'] = ''
+        recs['pen'] = None
+        recs['brush'] = None
+        recs['penColor'] = 0
+        recs['penWidth'] = 0
+        recs['penStyle'] = -1  ## indicates use default pen
+        recs['brushColor'] = 0
+        recs['brushStyle'] = -1  ## indicates use default brush
+        recs['data'] = None
+        recs['spot'] = None
+        recs['atlasIndex'] = 0
         
         if 'spots' in kargs:
             spots = kargs['spots']
@@ -166,91 +391,53 @@ class ScatterPlotItem(GraphicsObject):
                 spot = spots[i]
                 for k in spot:
                     if k == 'pen':
-                        self.data[i][k] = fn.mkPen(spot[k])
+                        setRecordPen(recs, i, fn.mkPen(spot[k]))
                     elif k == 'brush':
-                        self.data[i][k] = fn.mkBrush(spot[k])
+                        setRecordBrush(recs, i, fn.mkBrush(spot[k]))
                     elif k == 'pos':
                         pos = spot[k]
                         if isinstance(pos, QtCore.QPointF):
                             x,y = pos.x(), pos.y()
                         else:
                             x,y = pos[0], pos[1]
-                        self.data[i]['x'] = x
-                        self.data[i]['y'] = y
+                        recs[i]['x'] = x
+                        recs[i]['y'] = y
                     elif k in ['x', 'y', 'size', 'symbol']:
-                        self.data[i][k] = spot[k]
+                        recs[i][k] = spot[k]
                     elif k == 'data':
-                        self.pointData[i] = spot[k]
+                        recs[i]['data'] = spot[k]
                     else:
                         raise Exception("Unknown spot parameter: %s" % k)
         elif 'y' in kargs:
-            self.data['x'] = kargs['x']
-            self.data['y'] = kargs['y']
-        
-        
-        ## Set any extra parameters provided in keyword arguments
-        for k in ['pxMode', 'identical', 'pen', 'brush', 'symbol', 'size']:
-            if k in kargs:
-                setMethod = getattr(self, 'set' + k[0].upper() + k[1:])
-                setMethod(kargs[k])
-                
-        if 'data' in kargs:
-            self.setPointData(kargs['data'])
-            
-        self.updateSpots()
-        
-        
-        
-        
-        
-        
-        
-        
-        #pen = kargs.get('pen', (200,200,200))
-        #brush = kargs.get('pen', (100,100,150))
-        
-        #if hasattr(pen, '__len__'):
-            #pen = map(pg.mkPen(pen))
-        #self.data['pen'] = pen
-        
-        #if hasattr(pen, '__len__'):
-            #brush = map(pg.mkPen(pen))
-        #self.data['brush'] = pen
-        
-        #self.data['size'] = kargs.get('size', 7)
-        #self.data['symbol'] = kargs.get('symbol', 'o')
-        
-        
-        
-        #if spots is not None and len(spots) > 0:
-            #spot = spots[0]
-            #for k in spot:
-                #self.data[k] = []
-            #for spot in spots:
-                #for k,v in spot.iteritems():
-                    #self.data[k].append(v)
+            recs['x'] = kargs['x']
+            recs['y'] = kargs['y']
+        
+        
+        ## per-spot lists are stored in the records; everything else applies to all spots
+        opts = {}
+        for k in ['pxMode', 'identical', 'pen', 'brush', 'symbol', 'size', 'data', 'maxLength']:
+            if k not in kargs:
+                continue
+            v = kargs[k]
+            if k in ['pen', 'brush', 'symbol', 'size', 'data'] and (isinstance(v, np.ndarray) or isinstance(v, list)):
+                if len(v) != numPts:
+                    raise Exception("Number of %s values does not match number of points (%d != %d)" % (k, len(v), numPts))
+                col = recs[k]
+                for i in xrange(numPts):
+                    if k == 'pen':
+                        setRecordPen(recs, i, fn.mkPen(v[i]))
+                    elif k == 'brush':
+                        setRecordBrush(recs, i, fn.mkBrush(v[i]))
+                    else:
+                        col[i] = v[i]
+            else:
+                opts[k] = v
+        return recs, opts
         
     def setPoints(self, *args, **kargs):
         ##Deprecated; use setData
         return self.setData(*args, **kargs)
         
-    #def setPoints(self, spots=None, x=None, y=None, data=None):
-        #"""
-        #Remove all existing points in the scatter plot and add a new set.
-        #Arguments:
-            #spots - list of dicts specifying parameters for each spot
-                    #[ {'pos': (x,y), 'pen': 'r', ...}, ...]
-            #x, y -  arrays specifying location of spots to add. 
-                    #all other parameters (pen, symbol, etc.) will be set to the default
-                    #values for this scatter plot.
-                    #these arguments are IGNORED if 'spots' is specified
-            #data -  list of arbitrary objects to be assigned to spot.data for each spot
-                    #(this is useful for identifying spots that are clicked on)
-        #"""
-        #self.clear()
-        #self.bounds = [[0,0],[0,0]]
-        #self.addPoints(spots, x, y, data)
-        
     def implements(self, interface=None):
         ints = ['plotData']
         if interface is None:
@@ -265,7 +452,7 @@ class ScatterPlotItem(GraphicsObject):
             if len(pens) != len(self.data):
                 raise Exception("Number of pens does not match number of points (%d != %d)" % (len(pens), len(self.data)))
             for i in xrange(len(pens)):
-                self.data[i]['pen'] = fn.mkPen(pens[i])
+                setRecordPen(self.data, i, fn.mkPen(pens[i]))
         else:
             self.opts['pen'] = fn.mkPen(*args, **kargs)
         self.updateSpots()
@@ -278,7 +465,7 @@ class ScatterPlotItem(GraphicsObject):
             if len(brushes) != len(self.data):
                 raise Exception("Number of brushes does not match number of points (%d != %d)" % (len(brushes), len(self.data)))
             for i in xrange(len(brushes)):
-                self.data[i]['brush'] = fn.mkBrush(brushes[i], **kargs)
+                setRecordBrush(self.data, i, fn.mkBrush(brushes[i], **kargs))
         else:
             self.opts['brush'] = fn.mkBrush(*args, **kargs)
         self.updateSpots()
@@ -305,6 +492,8 @@ class ScatterPlotItem(GraphicsObject):
             self.data['size'] = sizes
         else:
             self.opts['size'] = size
+        self.invalidateBounds()
+        self.prepareGeometryChange()
         self.updateSpots()
         
     def setPointData(self, data):
@@ -313,32 +502,52 @@ class ScatterPlotItem(GraphicsObject):
                 raise Exception("Must set xy data before setting meta data.")
             if len(data) != len(self.data):
                 raise Exception("Length of meta data does not match number of points (%d != %d)" % (len(data), len(self.data)))
-        self.pointData = data
+            col = self.data['data']
+            for i in xrange(len(data)):
+                col[i] = data[i]
+        else:
+            self.opts['data'] = data
         self.updateSpots()
         
+    def setMaxLength(self, length):
+        """
+        Set the maximum number of points kept by addPoints(). When more points are added,
+        the oldest points are discarded so that the plot behaves like a ring buffer.
+        Use None (the default) to keep all points.
+        """
+        self.opts['maxLength'] = length
+        
         
     def setIdentical(self, ident):
         self.opts['identical'] = ident
+        self.invalidateBounds()
+        self.prepareGeometryChange()
         self.updateSpots()
         
     def setPxMode(self, mode):
         self.opts['pxMode'] = mode
+        self.invalidateBounds()
+        self.prepareGeometryChange()
         self.updateSpots()
         
     def updateSpots(self):
+        ## invalidate all cached rendering state; it is regenerated on the next paint
         self.spotsValid = False
+        self.fragments = None
+        self.picture = None
+        self.spotIndex = None
         self.update()
         
     def clear(self):
-        for i in self.spots:
-            i.setParentItem(None)
-            s = i.scene()
-            if s is not None:
-                s.removeItem(i)
-        self.spots = []
         self.data = None
+        self._buffer = None
+        self._start = 0
+        self._generation += 1
         self.spotsValid = False
-        self.bounds = [None, None]
+        self.fragments = None
+        self.picture = None
+        self.spotIndex = None
+        self.invalidateBounds()
         
 
     def dataBounds(self, ax, frac=1.0):
@@ -354,149 +563,269 @@ class ScatterPlotItem(GraphicsObject):
             d = self.data['y']
             
         if frac >= 1.0:
-            minIndex = np.argmin(d)
-            maxIndex = np.argmax(d)
-            minVal = d[minIndex]
-            maxVal = d[maxIndex]
-            if not self.opts['pxMode']:
-                minVal -= self.data[minIndex]['size']
-                maxVal += self.data[maxIndex]['size']
-            self.bounds[ax] = (minVal, maxVal)
+            self.bounds[ax] = self.recordBounds(self.data, ax)
             return self.bounds[ax]
         elif frac <= 0.0:
             raise Exception("Value for parameter 'frac' must be > 0. (got %s)" % str(frac))
-        else:
-            return (scipy.stats.scoreatpercentile(d, 50 - (frac * 50)), scipy.stats.scoreatpercentile(d, 50 + (frac * 50)))
-            
+        elif (ax, frac) not in self.boundsCache:
+            self.boundsCache[(ax, frac)] = fn.percentileBounds(d, frac)
+        return self.boundsCache[(ax, frac)]
+        
+    def invalidateBounds(self):
+        ## discard cached bounds; must be called whenever the data or spot sizes change
+        self.bounds = [None, None]
+        self.boundsCache = {}
+        self.dataVersion += 1
             
+    def recordBounds(self, recs, ax):
+        """Return (min, max) of the spots in *recs* along axis *ax*, including spot size if not in pxMode."""
+        d = recs['x'] if ax == 0 else recs['y']
+        minIndex = np.argmin(d)
+        maxIndex = np.argmax(d)
+        minVal = d[minIndex]
+        maxVal = d[maxIndex]
+        if not self.opts['pxMode']:
+            sizes = self.spotSizes(recs)
+            minVal -= sizes[minIndex] * 0.5
+            maxVal += sizes[maxIndex] * 0.5
+        return (minVal, maxVal)
 
     
     def addPoints(self, *args, **kargs):
         """
         Add new points to the scatter plot. 
         Arguments are the same as setData()
-        Note: this is expensive; plenty of room for optimization here.
+        
+        Points are appended to a buffer that grows by doubling its capacity, so the
+        cost of adding points does not depend on the number of points already present.
+        If a maximum length has been set (see setMaxLength), the oldest points are 
+        discarded. Cached bounds and rendering state are updated only for the points 
+        that were added or removed.
         """
-        if self.data is None:
+        if self.data is None or len(self.data) == 0:
             self.setData(*args, **kargs)
             return
             
-        
-        data1 = self.data[:]
-        #range1 = [self.bounds[0][:], self.bounds[1][:]]
-        self.setData(*args, **kargs)
-        newData = np.empty(len(self.data) + len(data1), dtype=self.data.dtype)
-        newData[:len(data1)] = data1
-        newData[len(data1):] = self.data
-        #self.bounds = [
-            #[min(self.bounds[0][0], range1[0][0]), max(self.bounds[0][1], range1[0][1])],
-            #[min(self.bounds[1][0], range1[1][0]), max(self.bounds[1][1], range1[1][1])],
-        #]
-        self.data = newData
+        recs, opts = self.buildRecords(*args, **kargs)
+        for k in ['pxMode', 'identical', 'pen', 'brush', 'symbol', 'size', 'maxLength']:
+            if k in opts:
+                setMethod = getattr(self, 'set' + k[0].upper() + k[1:])
+                setMethod(opts[k])
+        if 'data' in opts:
+            self.setPointData(opts['data'])
+        
+        maxLen = self.opts['maxLength']
+        if maxLen is not None and len(recs) > maxLen:
+            recs = recs[-maxLen:]
+        n = len(self.data)
+        k = len(recs)
+        if k == 0:
+            return
+        if maxLen is not None:
+            drop = min(n, max(0, n + k - maxLen))
+        else:
+            drop = 0
+
+        ## update cached bounds (before the dropped points are overwritten)
+        for ax, col in [(0, 'x'), (1, 'y')]:
+            b = self.bounds[ax]
+            if b is None:
+                continue
+            if drop > 0:
+                ## compare using the same spot-size padding as the cached bounds
+                db = self.recordBounds(self.data[:drop], ax)
+                if db[0] <= b[0] or db[1] >= b[1]:
+                    self.bounds[ax] = None  ## an extreme point was removed; must rescan
+                    continue
+            nb = self.recordBounds(recs, ax)
+            self.bounds[ax] = (min(b[0], nb[0]), max(b[1], nb[1]))
+        self.boundsCache = {}
+        self.dataVersion += 1
+
+        ## make room at the end of the buffer
+        start = self._start + drop
+        n -= drop
+        if start + n + k > len(self._buffer):
+            cap = max(2 * (n + k), 16)
+            if maxLen is not None:
+                cap = min(cap, 2 * maxLen)
+            if cap > len(self._buffer):
+                buf = np.empty(cap, dtype=self._buffer.dtype)
+            else:
+                buf = self._buffer
+            buf[:n] = self._buffer[start:start+n].copy()
+            self._buffer = buf
+            start = 0
+        self._buffer[start+n:start+n+k] = recs
+        self._start = start
+        self.data = self._buffer[start:start+n+k]
+        self._dropped += drop
+        
+        ## self.spotIndex is kept; pointsAt() tests the new points directly until a rebuild is due
+        if self.spotsValid:
+            atlasSize = len(self.atlas.images)
+            self.generateSpots(n)
+            if len(self.atlas.images) != atlasSize:
+                self.fragments = None  ## atlas will be re-packed
+            
+        ## discard fragments / pictures for dropped points and generate them for new points
+        if self.fragments is not None:
+            if drop > 0:
+                cut = np.searchsorted(self.fragmentRows, drop)
+                self.fragments = self.fragments[cut:]
+                self.fragmentRows = self.fragmentRows[cut:] - drop
+            tr0, lin0, cull0 = self.fragmentKey
+            frags, rows = self.generateFragments(tr0, cull0, n)
+            self.fragments.extend(frags)
+            self.fragmentRows = np.concatenate([self.fragmentRows, rows])
+        if self.picture is not None:
+            if drop > 0:
+                self.picture = None
+            else:
+                self.picture.append(self.generatePicture(n))
+                if len(self.picture) > 8:
+                    self.picture = None  ## merge into a single picture on the next paint
+                
+        self.prepareGeometryChange()
+        self.update()
         self.sigPlotChanged.emit(self)
     
     
-    def generateSpots(self, clear=True):
-        if clear:
-            for spot in self.spots:
-                self.scene().removeItem(spot)
-            self.spots = []
-        
-        
-        xmn = ymn = xmx = ymx = None
-        
-        ## apply defaults
-        size = self.data['size'].copy()
+    def spotSizes(self, recs=None):
+        """Return an array giving the size of every spot, with the default size applied."""
+        if recs is None:
+            recs = self.data
+        if self.opts['identical']:
+            return np.ones(len(recs)) * self.opts['size']
+        size = recs['size'].copy()
         size[size<0] = self.opts['size']
-        
-        pen = self.data['pen'].copy()
-        pen[pen<0] = self.opts['pen']  ## note pen<0 checks for pen==None
-        
-        brush = self.data['brush'].copy()
-        brush[brush<0] = self.opts['brush']
-        
-        symbol = self.data['symbol'].copy()
-        symbol[symbol==''] = self.opts['symbol']
+        return size
+        
+    def spotStyle(self, index):
+        """Return (symbol, size, pen, brush) for the spot at *index*, with defaults applied."""
+        rec = self.data[index]
+        if self.opts['identical']:
+            return (self.opts['symbol'], self.opts['size'], self.opts['pen'], self.opts['brush'])
+        symbol = rec['symbol'] if rec['symbol'] != '' else self.opts['symbol']
+        size = rec['size'] if rec['size'] >= 0 else self.opts['size']
+        pen = rec['pen'] if rec['pen'] is not None else self.opts['pen']
+        brush = rec['brush'] if rec['brush'] is not None else self.opts['brush']
+        return (symbol, size, pen, brush)
+        
+    def generateSpots(self, start=0):
+        """
+        Determine which entry in the symbol atlas each spot is drawn with, beginning 
+        at index *start*. (Using start > 0 keeps the existing atlas entries.)
+        No graphics items are created here; see points().
+        """
+        if start == 0:
+            self.atlas.clear()
+        recs = self.data[start:]
+        if self.opts['identical'] or len(recs) == 0:
+            recs['atlasIndex'] = self.atlas.symbolIndex(self.opts['symbol'], self.opts['size'], self.opts['pen'], self.opts['brush'])
+        else:
+            ## group the spots by their numeric style fields; only one spot 
+            ## of each distinct style is looked up in the atlas
+            keys = np.empty(len(recs), dtype=[(f, recs.dtype[f]) for f in StyleFields])
+            for f in StyleFields:
+                keys[f] = recs[f]
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            styleIndex = np.array([self.atlas.symbolIndex(*self.spotStyle(start+i)) for i in first], dtype=int)
+            recs['atlasIndex'] = styleIndex[inverse.reshape(-1)]
 
-        
-        for i in xrange(len(self.data)):
-            s = self.data[i]
-            pos = Point(s['x'], s['y'])
-            if self.opts['pxMode']:
-                psize = 0
-            else:
-                psize = size[i]
-                
-            if self.pointData is None or self.pointData[i] is None:
-                data = self.opts.get('data', None)
-            else:
-                data = self.pointData[i]
-                
-            #if xmn is None:
-                #xmn = pos[0]-psize
-                #xmx = pos[0]+psize
-                #ymn = pos[1]-psize
-                #ymx = pos[1]+psize
-            #else:
-                #xmn = min(xmn, pos[0]-psize)
-                #xmx = max(xmx, pos[0]+psize)
-                #ymn = min(ymn, pos[1]-psize)
-                #ymx = max(ymx, pos[1]+psize)
-                
-            item = self.mkSpot(pos, size[i], self.opts['pxMode'], brush[i], pen[i], data, symbol=symbol[i], index=len(self.spots))
-            self.spots.append(item)
-            self.data[i]['spot'] = item
-            #if self.optimize:
-                #item.hide()
-                #frag = QtGui.QPainter.PixmapFragment.create(pos, QtCore.QRectF(0, 0, size, size))
-                #self.optimizeFragments.append(frag)
-                
-        #self.bounds = [[xmn, xmx], [ymn, ymx]]
         self.spotsValid = True
-        self.sigPlotChanged.emit(self)
-        
         
-    #def setPointSize(self, size):
-        #for s in self.spots:
-            #s.size = size
-        ##self.setPoints([{'size':s.size, 'pos':s.pos(), 'data':s.data} for s in self.spots])
-        #self.setPoints()
+    def generateFragments(self, tr, cullRect, start=0):
+        """
+        Build PixmapFragments for the spots beginning at index *start* whose device 
+        coordinates (as given by the QTransform *tr*) fall within *cullRect*.
+        Returns the list of fragments and an array of the spot indexes they belong to.
+        """
+        self.atlas.getAtlas()  ## (re-)pack the atlas so that its coords are up to date
+        recs = self.data[start:]
+        x, y = fn.transformCoordinates(tr, recs['x'], recs['y'])
+        pad = self.atlas.maxWidth() * 0.5
+        mask = (x > cullRect.left()-pad) & (x < cullRect.right()+pad) & (y > cullRect.top()-pad) & (y < cullRect.bottom()+pad)
+        inds = np.nonzero(mask)[0]
+        x = x[inds].tolist()
+        y = y[inds].tolist()
+        atlasIndex = recs['atlasIndex'][inds].tolist()
                 
-    #def paint(self, p, *args):
-        #if not self.optimize:
-            #return
-        ##p.setClipRegion(self.boundingRect())
-        #p.drawPixmapFragments(self.optimizeFragments, self.optimizePixmap)
-
-    def paint(self, *args):
+        rects = self.atlas.coords
+        create = QtGui.QPainter.PixmapFragment.create
+        QPointF = QtCore.QPointF
+        frags = [create(QPointF(x[i], y[i]), rects[atlasIndex[i]]) for i in xrange(len(inds))]
+        return frags, inds + start
+        
+    def generatePicture(self, start=0):
+        """Record the spots beginning at index *start* into a QPicture (used when not in pxMode)."""
+        picture = QtGui.QPicture()
+        p = QtGui.QPainter(picture)
+        for i in xrange(start, len(self.data)):
+            p.resetTransform()
+            p.translate(self.data['x'][i], self.data['y'][i])
+            drawSymbol(p, *self.spotStyle(i))
+        p.end()
+        return picture
+                
+    def paint(self, p, *args):
+        if self.data is None or len(self.data) == 0:
+            return
         if not self.spotsValid:
             self.generateSpots()
 
-    def spotPixmap(self):
-        ## If all spots are identical, return the pixmap to use for all spots
-        ## Otherwise return None
-        
-        if not self.opts['identical']:
-            return None
-        if self._spotPixmap is None:
-            spot = SpotItem(size=self.opts['size'], pxMode=True, brush=self.opts['brush'], pen=self.opts['pen'], symbol=self.opts['symbol'])
-            self._spotPixmap = spot.pixmap
-        return self._spotPixmap
-
-    def mkSpot(self, pos, size, pxMode, brush, pen, data, symbol=None, index=None):
-        ## Make and return a SpotItem (or PixmapSpotItem if in pxMode)
-        brush = fn.mkBrush(brush)
-        pen = fn.mkPen(pen)
-        if pxMode:
-            img = self.spotPixmap()  ## returns None if not using identical mode
-            #item = PixmapSpotItem(size, brush, pen, data, image=img, symbol=symbol, index=index)
-            item = SpotItem(size, pxMode, brush, pen, data, symbol=symbol, image=img, index=index)
+        if self.exportOpts is not False:
+            aa = self.exportOpts.get('antialias', True)
+        else:
+            aa = True
+        
+        if self.opts['pxMode']:
+            tr = p.transform()
+            if self.exportOpts is not False:
+                ## draw vector symbols so that exported images/SVG are not pixmap-based
+                p.setRenderHint(p.Antialiasing, aa)
+                x, y = fn.transformCoordinates(tr, self.data['x'], self.data['y'])
+                for i in xrange(len(self.data)):
+                    p.resetTransform()
+                    p.translate(x[i], y[i])
+                    drawSymbol(p, *self.spotStyle(i))
+                return
+
+            ## Fragments are generated in device coordinates for a region three times the
+            ## size of the device in each direction. As long as only the translation of the
+            ## view changes and the device stays inside that region, they can be reused.
+            linear = (tr.m11(), tr.m12(), tr.m13(), tr.m21(), tr.m22(), tr.m23(), tr.m33())
+            dev = p.device()
+            devRect = QtCore.QRectF(0, 0, dev.width(), dev.height())
+            atlas = self.atlas.getAtlas()
+            if self.fragments is not None:
+                tr0, lin0, cull0 = self.fragmentKey
+                offset = QtCore.QPointF(tr.dx()-tr0.dx(), tr.dy()-tr0.dy())
+                if lin0 != linear or self.fragmentAtlas is not atlas or not cull0.contains(devRect.translated(-offset)):
+                    self.fragments = None  ## view was scaled/rotated, moved too far, or atlas was re-packed
+            if self.fragments is None:
+                cullRect = devRect.adjusted(-devRect.width(), -devRect.height(), devRect.width(), devRect.height())
+                self.fragments, self.fragmentRows = self.generateFragments(tr, cullRect)
+                self.fragmentKey = (QtGui.QTransform(tr), linear, cullRect)
+                self.fragmentAtlas = atlas
+                offset = QtCore.QPointF(0, 0)
+
+            p.resetTransform()
+            p.translate(offset)
+            p.drawPixmapFragments(self.fragments, atlas)
+        else:
+            if self.picture is None:
+                self.picture = [self.generatePicture()]
+            p.setRenderHint(p.Antialiasing, aa)
+            for picture in self.picture:
+                picture.play(p)
+
+    def setExportMode(self, export, opts):
+        if export:
+            self.exportOpts = opts
         else:
-            item = SpotItem(size, pxMode, brush, pen, data, symbol=symbol, index=index)
-        item.setParentItem(self)
-        item.setPos(pos)
-        #item.sigClicked.connect(self.pointClicked)
-        return item
+            self.exportOpts = False
+        self.update()
         
     def boundingRect(self):
         (xmn, xmx) = self.dataBounds(ax=0)
@@ -507,71 +836,81 @@ class ScatterPlotItem(GraphicsObject):
         if ymn is None or ymx is None:
             ymn = 0
             ymx = 0
-        return QtCore.QRectF(xmn, ymn, xmx-xmn, ymx-ymn)
-        
-        #if xmn is None or xmx is None or ymn is None or ymx is None:
-            #return QtCore.QRectF()
-        #return QtCore.QRectF(xmn, ymn, xmx-xmn, ymx-ymn)
-        #return QtCore.QRectF(xmn-1, ymn-1, xmx-xmn+2, ymx-ymn+2)
         
-    #def pointClicked(self, point):
-        #self.sigPointClicked.emit(self, point)
+        ## in pxMode, spots extend beyond their data coordinates by a fixed number of pixels
+        px = py = 0
+        if self.opts['pxMode'] and self.data is not None and len(self.data) > 0:
+            pixels = self.pixelVectors()
+            if pixels is not None:
+                pad = self.spotSizes().max() * 0.5 + 1
+                px = Point(pixels[0]).length() * pad
+                py = Point(pixels[1]).length() * pad
+        return QtCore.QRectF(xmn-px, ymn-py, xmx-xmn+2*px, ymx-ymn+2*py)
+        
+    def spotItem(self, index):
+        """Return the SpotItem for the spot at *index*, creating it if needed."""
+        spot = self.data['spot'][index]
+        if spot is None:
+            spot = SpotItem(self, index)
+            self.data['spot'][index] = spot
+        return spot
 
     def points(self):
-        if not self.spotsValid:
-            self.generateSpots()
-        return self.spots[:]
+        if self.data is None:
+            return []
+        return [self.spotItem(i) for i in xrange(len(self.data))]
 
     def pointsAt(self, pos):
-        if not self.spotsValid:
-            self.generateSpots()
+        """
+        Return a list of SpotItems for all spots under *pos* (in local coordinates),
+        topmost spots first.
+        """
+        if self.data is None or len(self.data) == 0:
+            return []
+        
+        ## Points added by addPoints() since the index was built are not in the index; 
+        ## they are tested individually until there are enough of them (or enough indexed
+        ## points have been dropped) to make rebuilding the index worthwhile.
+        if self.spotIndex is not None:
+            shift = self._dropped - self.spotIndex.offset
+            unindexed = len(self.data) - (self.spotIndex.n - shift)
+            if shift > self.spotIndex.n // 2 or unindexed > max(10000, self.spotIndex.n // 10):
+                self.spotIndex = None
+        if self.spotIndex is None:
+            self.spotIndex = SpotIndex(self.data['x'], self.data['y'], self.spotSizes(), offset=self._dropped)
+        shift = self._dropped - self.spotIndex.offset  ## number of indexed points since dropped
+        indexed = self.spotIndex.n - shift             ## current rows [0:indexed] are in the index
+        newSizes = self.spotSizes(self.data[indexed:])
+        
         x = pos.x()
         y = pos.y()
-        pw = self.pixelWidth()
-        ph = self.pixelHeight()
-        pts = []
-        for s in self.spots:
-            sp = s.pos()
-            ss = s.size
-            sx = sp.x()
-            sy = sp.y()
-            s2x = s2y = ss * 0.5
-            if self.opts['pxMode']:
-                s2x *= pw
-                s2y *= ph
-            if x > sx-s2x and x < sx+s2x and y > sy-s2y and y < sy+s2y:
-                pts.append(s)
-                #print "HIT:", x, y, sx, sy, s2x, s2y
-            #else:
-                #print "No hit:", (x, y), (sx, sy)
-                #print "       ", (sx-s2x, sy-s2y), (sx+s2x, sy+s2y)
-        pts.sort(lambda a,b: cmp(b.zValue(), a.zValue()))
-        return pts
-            
+        rx = ry = max(self.spotIndex.maxSize, newSizes.max() if len(newSizes) > 0 else 0) * 0.5
+        if self.opts['pxMode']:
+            pw = self.pixelWidth()
+            ph = self.pixelHeight()
+            rx *= pw
+            ry *= ph
+        
+        ## use the grid to select nearby spots, then test each against its own size
+        inds = self.spotIndex.candidates(x, y, rx, ry)
+        sizes = self.spotIndex.sizes[inds]
+        inds = inds - shift
+        keep = inds >= 0
+        inds = np.concatenate([inds[keep], np.arange(indexed, len(self.data))])
+        s2x = s2y = np.concatenate([sizes[keep], newSizes]) * 0.5
+        if self.opts['pxMode']:
+            s2x = s2x * pw
+            s2y = s2y * ph
+        hit = (np.abs(self.data['x'][inds] - x) < s2x) & (np.abs(self.data['y'][inds] - y) < s2y)
+        
+        ## spots drawn last appear on top; return those first
+        inds = np.sort(inds[hit])[::-1]
+        return [self.spotItem(i) for i in inds]
 
-    #def mousePressEvent(self, ev):
-        #QtGui.QGraphicsItem.mousePressEvent(self, ev)
-        #if ev.button() == QtCore.Qt.LeftButton:
-            #pts = self.pointsAt(ev.pos())
-            #if len(pts) > 0:
-                #self.mouseMoved = False
-                #self.ptsClicked = pts
-                #ev.accept()
-            #else:
-                ##print "no spots"
-                #ev.ignore()
-        #else:
-            #ev.ignore()
-        
-    #def mouseMoveEvent(self, ev):
-        #QtGui.QGraphicsItem.mouseMoveEvent(self, ev)
-        #self.mouseMoved = True
-        #pass
-    
-    #def mouseReleaseEvent(self, ev):
-        #QtGui.QGraphicsItem.mouseReleaseEvent(self, ev)
-        #if not self.mouseMoved:
-            #self.sigClicked.emit(self, self.ptsClicked)
+    def hoverEvent(self, ev):
+        ## only claim clicks when the mouse is over a spot
+        if not ev.isExit() and len(self.pointsAt(ev.pos())) > 0:
+            ev.acceptClicks(QtCore.Qt.LeftButton)
 
     def mouseClickEvent(self, ev):
         if ev.button() == QtCore.Qt.LeftButton:
@@ -588,76 +927,77 @@ class ScatterPlotItem(GraphicsObject):
 
 
 
-class SpotItem(GraphicsObject):
-    #sigClicked = QtCore.Signal(object)
+class SpotItem(object):
+    """
+    Class referring to an individual spot in a scatter plot.
+    SpotItems are returned by ScatterPlotItem.points() and pointsAt() and are sent
+    with sigClicked. They are not graphics items; all spots are drawn by their
+    ScatterPlotItem, so changing a spot's style causes the plot to be redrawn.
+    """
     
-    def __init__(self, size, pxMode, brush, pen, data=None, symbol=None, image=None, index=None):
-        GraphicsObject.__init__(self)
-        self.pxMode = pxMode
+    def __init__(self, plot, index):
+        self._plot = plot
+        self._id = index + plot._dropped  ## stays valid when addPoints() discards old points
+        self._generation = plot._generation
 
-        try:
-            symbol = int(symbol)
-        except: 
-            pass
+    @property
+    def index(self):
+        if self._generation != self._plot._generation:
+            raise Exception("This spot has been removed from its plot by setData() or clear().")
+        index = self._id - self._plot._dropped
+        if index < 0:
+            ## a negative index would silently refer to a different point at the end of the data
+            raise Exception("This spot has been removed from its plot by addPoints().")
+        return index
+
+    def _rec(self):
+        return self._plot.data[self.index]
         
-        if symbol is None:
-            symbol = 'o'    ## circle by default
-        elif isinstance(symbol, int):  ## allow symbols specified by integer for easy iteration
-            symbol = ['o', 's', 't', 'd', '+'][symbol]
+    def pos(self):
+        rec = self._rec()
+        return Point(rec['x'], rec['y'])
             
+    def viewPos(self):
+        return self._plot.mapToView(self.pos())
             
+    @property
+    def size(self):
+        return self._plot.spotStyle(self.index)[1]
             
-        ####print 'SpotItem symbol: ', symbol
-        self.data = data
-        self.pen = pen
-        self.brush = brush
-        self.size = size
-        self.index = index
-        self.symbol = symbol
-        #s2 = size/2.
-        self.path = Symbols[symbol]
-        
-        if pxMode:
-            ## pre-render an image of the spot and display this rather than redrawing every time.
-            if image is None:
-                self.pixmap = self.makeSpotImage(size, pen, brush, symbol)
-            else:
-                self.pixmap = image ## image is already provided (probably shared with other spots)
-            self.setFlags(self.flags() | self.ItemIgnoresTransformations | self.ItemHasNoContents)
-            self.pi = QtGui.QGraphicsPixmapItem(self.pixmap, self)
-            self.pi.setPos(-0.5*size, -0.5*size)
-        else:
-            self.scale(size, size)
+    @property
+    def symbol(self):
+        return symbolName(self._plot.spotStyle(self.index)[0])
+        
+    @property
+    def pen(self):
+        return fn.mkPen(self._plot.spotStyle(self.index)[2])
 
+    @property
+    def brush(self):
+        return fn.mkBrush(self._plot.spotStyle(self.index)[3])
 
-    def makeSpotImage(self, size, pen, brush, symbol=None):
-        self.spotImage = QtGui.QImage(size+2, size+2, QtGui.QImage.Format_ARGB32_Premultiplied)
-        self.spotImage.fill(0)
-        p = QtGui.QPainter(self.spotImage)
-        p.setRenderHint(p.Antialiasing)
-        p.translate(size*0.5+1, size*0.5+1)
-        p.scale(size, size)
-        self.paint(p, None, None)
-        p.end()
-        return QtGui.QPixmap(self.spotImage)
+    @property
+    def data(self):
+        d = self._rec()['data']
+        if d is None:
+            return self._plot.opts['data']
+        return d
 
+    def setBrush(self, *args, **kargs):
+        setRecordBrush(self._plot.data, self.index, fn.mkBrush(*args, **kargs))
+        self._plot.updateSpots()
 
-    def setBrush(self, brush):
-        self.brush = fn.mkBrush(brush)
-        self.update()
-        
-    def setPen(self, pen):
-        self.pen = fn.mkPen(pen)
-        self.update()
-        
-    def boundingRect(self):
-        return self.path.boundingRect()
-        
-    def shape(self):
-        return self.path
+    def setPen(self, *args, **kargs):
+        setRecordPen(self._plot.data, self.index, fn.mkPen(*args, **kargs))
+        self._plot.updateSpots()
         
-    def paint(self, p, *opts):
-        p.setPen(self.pen)
-        p.setBrush(self.brush)
-        p.drawPath(self.path)
+    def setSize(self, size):
+        self._plot.data['size'][self.index] = size
+        self._plot.invalidateBounds()
+        self._plot.prepareGeometryChange()
+        self._plot.updateSpots()
         
+    def setSymbol(self, symbol):
+        self._plot.data['symbol'][self.index] = symbol
+        self._plot.updateSpots()
+        
\ No newline at end of file
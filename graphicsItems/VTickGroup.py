@@ -5,6 +5,7 @@ if __name__ == '__main__':
 
 from pyqtgraph.Qt import QtGui, QtCore
 import pyqtgraph.functions as fn
+import numpy as np
 import weakref
 from UIGraphicsItem import UIGraphicsItem
 
@@ -44,6 +45,7 @@ class VTickGroup(UIGraphicsItem):
         
         self.ticks = []
         self.xvals = []
+        self.sortedXVals = np.empty(0)  ## used to find the ticks inside the view when they are dense
         #if view is None:
             #self.view = None
         #else:
@@ -64,11 +66,13 @@ class VTickGroup(UIGraphicsItem):
         
         ============= =====================================================================
         **Arguments** 
-        vals          A list of x values (in data/plot coordinates) at which to draw ticks.
+        vals          A list or array of x values (in data/plot coordinates) at which to draw ticks.
         ============= =====================================================================
         """
-        self.xvals = vals
+        self.xvals = np.asarray(vals, dtype=float).ravel()
+        self.sortedXVals = np.sort(self.xvals)
         self.rebuildTicks()
+        self.update()
         #self.valid = False
         
     def setYRange(self, vals):
@@ -84,7 +88,8 @@ class VTickGroup(UIGraphicsItem):
                     #self.view().sigRangeChanged.disconnect(self.rescale)
                 #except:
                     #pass
-        self.rebuildTicks()
+        #self.rebuildTicks()  ## tick path is in normalized y coordinates; paint() scales it to the y range
+        self.update()
         #self.valid = False
         
     def dataBounds(self, *args, **kargs):
@@ -137,14 +142,12 @@ class VTickGroup(UIGraphicsItem):
         return self.yrange
             
     def rebuildTicks(self):
-        self.path = QtGui.QPainterPath()
-        yrange = self.yRange()
-        #print "rebuild ticks:", yrange
-        for x in self.xvals:
-            #path.moveTo(x, yrange[0])
-            #path.lineTo(x, yrange[1])
-            self.path.moveTo(x, 0.)
-            self.path.lineTo(x, 1.)
+        ## each tick is a disconnected line segment from y=0 to y=1; 
+        ## the entire path is loaded at once rather than one tick at a time.
+        x = np.repeat(np.asarray(self.xvals, dtype=float), 2)
+        y = np.zeros(len(x))
+        y[1::2] = 1.
+        self.path = fn.arrayToQPath(x, y, connect='pairs')
         #self.setPath(self.path)
         #self.valid = True
         #self.rescale()
@@ -157,11 +160,43 @@ class VTickGroup(UIGraphicsItem):
         h = br.height()
         br.setY(br.y() + self.yrange[0] * h)
         br.setHeight(h - (1.0-self.yrange[1]) * h)
+        pw = self.pixelWidth()
         p.translate(0, br.y())
         p.scale(1.0, br.height())
         p.setPen(self.pen)
-        p.drawPath(self.path)
+        ## only the ticks inside the view decide whether drawing them individually is wasteful
+        start = np.searchsorted(self.sortedXVals, br.left(), side='left')
+        stop = np.searchsorted(self.sortedXVals, br.right(), side='right')
+        if pw > 0 and stop - start > br.width() / pw:
+            self.paintDense(p, self.sortedXVals[start:stop], br.left(), pw)
+        else:
+            p.drawPath(self.path)
         #QtGui.QGraphicsPathItem.paint(self, *args)
+        
+    def paintDense(self, p, xvals, left, pw):
+        ## There are more ticks in the view (*xvals*) than pixels, so drawing every tick 
+        ## is wasted effort. Instead, draw one tick for each pixel column that contains 
+        ## ticks, and fill runs of adjacent occupied columns as solid spans.
+        cols = np.unique(((xvals - left) / pw).astype(int))
+        if len(cols) == 0:
+            return
+        
+        ## find runs of adjacent columns
+        breaks = np.argwhere(np.diff(cols) > 1)[:,0] + 1
+        runStart = cols[np.concatenate([[0], breaks])]
+        runStop = cols[np.concatenate([breaks-1, [len(cols)-1]])] + 1
+        single = (runStop - runStart) == 1
+        
+        x = np.repeat(left + (runStart[single] + 0.5) * pw, 2)
+        y = np.zeros(len(x))
+        y[1::2] = 1.
+        p.drawPath(fn.arrayToQPath(x, y, connect='pairs'))
+        
+        spans = [QtCore.QRectF(left + a*pw, 0., (b-a)*pw, 1.) for a, b in zip(runStart[~single].tolist(), runStop[~single].tolist())]
+        if len(spans) > 0:
+            p.setPen(QtGui.QPen(QtCore.Qt.NoPen))
+            p.setBrush(fn.mkBrush(self.pen.color()))
+            p.drawRects(spans)
 
 
 if __name__ == '__main__':
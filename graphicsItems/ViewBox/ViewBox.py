@@ -83,6 +83,7 @@ class ViewBox(GraphicsWidget):
         self.name = None
         self.linksBlocked = False
         self.addedItems = []
+        self.itemBoundsCache = weakref.WeakKeyDictionary()  ## item: ((dataVersion, frac), (xRange, yRange))
         #self.gView = view
         #self.showGrid = showGrid
         
@@ -254,6 +255,7 @@ class ViewBox(GraphicsWidget):
             self.addedItems.remove(item)
         except:
             pass
+        self.itemBoundsCache.pop(item, None)
         self.scene().removeItem(item)
         self.updateAutoRange()
 
@@ -880,8 +882,18 @@ class ViewBox(GraphicsWidget):
             if hasattr(item, 'dataBounds'):
                 if frac is None:
                     frac = (1.0, 1.0)
-                xr = item.dataBounds(0, frac=frac[0])
-                yr = item.dataBounds(1, frac=frac[1])
+                ## Items that have a dataVersion keep their bounds in itemBoundsCache until 
+                ## their data changes, so only items that were updated need to be rescanned.
+                version = getattr(item, 'dataVersion', None)
+                cached = self.itemBoundsCache.get(item, None) if version is not None else None
+                key = (version, tuple(frac))
+                if cached is not None and cached[0] == key:
+                    xr, yr = cached[1]
+                else:
+                    xr = item.dataBounds(0, frac=frac[0])
+                    yr = item.dataBounds(1, frac=frac[1])
+                    if version is not None:
+                        self.itemBoundsCache[item] = (key, (xr, yr))
                 if xr is None or xr == (None, None):
                     useX = False
                     xr = (0,0)
@@ -26,6 +26,9 @@ import sys
 import pyqtgraph.ptime as ptime
 import numpy as np
 import pyqtgraph.debug as debug
+import pyqtgraph.functions as fn
+import collections
+import threading
 
 from pyqtgraph.SignalProxy import SignalProxy
 
@@ -36,6 +39,165 @@ class PlotROI(ROI):
         self.addRotateHandle([0, 0], [0.5, 0.5])
 
 
+class RoiTraceThread(QtCore.QThread):
+    """
+    Computes the mean value inside an ROI for every frame of an image stack in a 
+    background thread. Frames are read and processed a block at a time, so the image
+    may be much larger than the available memory (for example, a np.memmap).
+    
+    Requests are coalesced: if a new computation is requested while one is running,
+    the running one is abandoned at the end of its current block and only the most 
+    recent request is computed. Results are emitted via sigTraceChanged(jobId, data, nFrames),
+    where only the first nFrames values of data are valid; partial results are emitted 
+    periodically while the computation is in progress.
+    """
+    sigTraceChanged = QtCore.Signal(object, object, object)
+    
+    def __init__(self):
+        QtCore.QThread.__init__(self)
+        self.lock = threading.Lock()
+        self.nextJob = None
+        self.jobId = 0
+        self.running = False
+        self.cancelled = False
+        
+    def compute(self, readFunc, measureFunc, nFrames, chunkSize=1):
+        """Request the ROI trace of an image with *nFrames* frames. 
+        readFunc(start, stop) must return frames [start:stop] (or the part of them covered by the ROI),
+        and measureFunc(frames, inds) must return the mean value inside the ROI for each of 
+        these frames, whose indexes are given in *inds*. Returns the id that will accompany the results."""
+        with self.lock:
+            self.jobId += 1
+            self.nextJob = (self.jobId, readFunc, measureFunc, nFrames, chunkSize)
+            self.cancelled = False
+            if self.running:
+                return self.jobId
+            self.running = True
+        self.wait()  ## the thread may still be exiting from its last job
+        self.start()
+        return self.jobId
+        
+    def cancel(self):
+        """Discard any requested computation and wait for the thread to exit."""
+        with self.lock:
+            self.nextJob = None
+            self.cancelled = True
+        self.wait()
+        
+    def run(self):
+        while True:
+            with self.lock:
+                job = self.nextJob
+                self.nextJob = None
+                if job is None:
+                    self.running = False
+                    return
+            self.runJob(*job)
+            
+    def runJob(self, jobId, readFunc, measureFunc, nFrames, chunkSize):
+        data = np.empty(nFrames)
+        lastEmit = ptime.time()
+        for start in xrange(0, nFrames, chunkSize):
+            if self.nextJob is not None or self.cancelled:
+                return  ## superseded by a newer request
+            stop = min(start+chunkSize, nFrames)
+            data[start:stop] = measureFunc(readFunc(start, stop), np.arange(start, stop))
+            
+            now = ptime.time()
+            if now - lastEmit > 0.1 and stop < nFrames:
+                self.sigTraceChanged.emit(jobId, data[:stop].copy(), stop)
+                lastEmit = now
+        self.sigTraceChanged.emit(jobId, data, nFrames)
+
+
+class FramePrefetcher(object):
+    """
+    Renders frames ahead of time using a pool of background threads. Frames are 
+    requested by index with request(), and finished frames are collected with 
+    takeFrame(). Results from a render function that has since been replaced (or 
+    rendered before stop() was called) are discarded.
+    """
+    def __init__(self, nThreads=2):
+        self.nThreads = nThreads
+        self.lock = threading.Condition()
+        self.threads = []
+        self.pending = []    ## frame indexes waiting to be rendered, most urgent first
+        self.active = set()  ## frame indexes currently being rendered
+        self.ready = {}      ## {frame index: result of renderFunc}
+        self.renderFunc = None
+        self.generation = 0
+        self.stopped = False
+        
+    def setRenderFunc(self, func):
+        """Set the function func(index) used to render frames and discard all previous results."""
+        with self.lock:
+            self.renderFunc = func
+            self.generation += 1
+            self.pending = []
+            self.active = set()
+            self.ready = {}
+            
+    def request(self, indexes):
+        """Render the frames in *indexes*, in order. Requests and results for any other frames are discarded."""
+        with self.lock:
+            self.ready = dict([(i, self.ready[i]) for i in indexes if i in self.ready])
+            self.pending = [i for i in indexes if i not in self.ready and i not in self.active]
+            self.stopped = False
+            self.lock.notifyAll()
+            while len(self.threads) < self.nThreads:
+                thread = threading.Thread(target=self.run)
+                thread.daemon = True
+                self.threads.append(thread)
+                thread.start()
+            
+    def readyFrames(self):
+        """Return the indexes of all frames that have been rendered."""
+        with self.lock:
+            return self.ready.keys()
+        
+    def takeFrame(self, index):
+        with self.lock:
+            return self.ready.pop(index)
+        
+    def stop(self):
+        """
+        Discard all requests and results and stop the threads. This does not wait for 
+        frames currently being rendered; the threads exit when they finish, and their 
+        results are discarded.
+        """
+        with self.lock:
+            self.stopped = True
+            self.generation += 1
+            self.pending = []
+            self.active = set()
+            self.ready = {}
+            self.threads = []  ## threads not in this list exit as soon as they are idle
+            self.lock.notifyAll()
+        
+    def run(self):
+        thread = threading.currentThread()
+        while True:
+            with self.lock:
+                while not self.stopped and len(self.pending) == 0 and thread in self.threads:
+                    self.lock.wait()
+                if self.stopped or thread not in self.threads:
+                    return
+                index = self.pending.pop(0)
+                func = self.renderFunc
+                generation = self.generation
+                self.active.add(index)
+            try:
+                result = func(index)
+            except:
+                debug.printExc("Error rendering frame %d:" % index)
+                result = None
+            with self.lock:
+                if generation == self.generation:
+                    self.active.discard(index)
+                    if result is not None:
+                        self.ready[index] = result
+
+
 class ImageView(QtGui.QWidget):
     """
     Widget used for display and analysis of image data.
@@ -56,9 +218,27 @@ class ImageView(QtGui.QWidget):
         imv = pg.ImageView()
         imv.show()
         imv.setImage(data)
+        
+    Large image stacks need not be loaded into memory; setImage also accepts a np.memmap, 
+    a MetaArray read with mmap=True, or any object with shape, dtype and __getitem__. 
+    Frames are then read as they are displayed, and the ROI plot is computed in a 
+    background thread.
     """
     sigTimeChanged = QtCore.Signal(object, object)
     sigProcessingChanged = QtCore.Signal(object)
+    sigFpsChanged = QtCore.Signal(object)  ## emitted about once per second during playback with the achieved frame rate
+    
+    ## show an ROI trace computed from a subset of frames while the full trace is computed in the background
+    roiPreview = True
+    ## number of frames rendered ahead of time during playback, and the number of threads rendering them
+    prefetchFrames = 8
+    prefetchThreads = 2
+    ## number of normalized frames kept in memory for scrubbing back and forth
+    normFrameCacheSize = 16
+    ## maximum number of frames averaged for the time-range background; longer ranges are sampled evenly
+    normBackgroundFrames = 64
+    ## approximate number of pixels to process at once when normalizing many frames
+    chunkPixels = 2**23
     
     def __init__(self, parent=None, name="ImageView", *args):
         QtGui.QWidget.__init__(self, parent, *args)
@@ -67,7 +247,17 @@ class ImageView(QtGui.QWidget):
         self.name = name
         self.image = None
         self.axes = {}
-        self.imageDisp = None
+        self.imageDisp = None   ## fully processed image; only generated by getProcessedImage
+        self.normTerms = None   ## background terms used for normalization (see normBackground)
+        self.normFrames = collections.OrderedDict()  ## {frame index: normalized frame}, most recent last
+        self.levelRange = None
+        self.roiTraceThread = RoiTraceThread()
+        self.roiTraceJob = None
+        self.normGeneration = 0  ## incremented whenever the normalization changes
+        self.prefetcher = FramePrefetcher(self.prefetchThreads)
+        self.prefetchKey = None  ## (normGeneration, lut, levels) used to render prefetched frames
+        self.playIndex = 0  ## frame that playback should be showing now; may be ahead of currentIndex
+        self.fps = None
         self.ui = Ui_Form()
         self.ui.setupUi(self)
         self.scene = self.ui.graphicsView.scene()
@@ -157,6 +347,7 @@ class ImageView(QtGui.QWidget):
         self.ui.normFrameCheck.clicked.connect(self.updateNorm)
         self.ui.normTimeRangeCheck.clicked.connect(self.updateNorm)
         self.playTimer.timeout.connect(self.timeout)
+        self.roiTraceThread.sigTraceChanged.connect(self.roiTraceChanged)
         
         self.normProxy = SignalProxy(self.normRgn.sigRegionChanged, slot=self.updateNorm)
         self.normRoi.sigRegionChangeFinished.connect(self.updateNorm)
@@ -174,7 +365,9 @@ class ImageView(QtGui.QWidget):
         
         ============== =======================================================================
         **Arguments:**
-        *img*          (numpy array) the image to be displayed.
+        *img*          (numpy array) the image to be displayed. This may also be a
+                       np.memmap or any object with shape, dtype, and __getitem__; 
+                       frames are then read from it only as they are needed.
         *xvals*        (numpy array) 1D array of z-axis values corresponding to the third axis
                        in a 3D image. For video, this array should contain the time of each frame.
         *autoRange*    (bool) whether to scale/pan the view to fit the image.
@@ -189,8 +382,12 @@ class ImageView(QtGui.QWidget):
         prof = debug.Profiler('ImageView.setImage', disabled=True)
         
         if not isinstance(img, np.ndarray):
-            raise Exception("Image must be specified as ndarray.")
+            for attr in ['shape', 'dtype', '__getitem__']:
+                if not hasattr(img, attr):
+                    raise Exception("Image must be specified as ndarray or an object with shape, dtype, and __getitem__.")
+        self.roiTraceThread.cancel()
         self.image = img
+        ndim = len(img.shape)
         
         if xvals is not None:
             self.tVals = xvals
@@ -207,14 +404,14 @@ class ImageView(QtGui.QWidget):
         prof.mark('1')
         
         if axes is None:
-            if img.ndim == 2:
+            if ndim == 2:
                 self.axes = {'t': None, 'x': 0, 'y': 1, 'c': None}
-            elif img.ndim == 3:
+            elif ndim == 3:
                 if img.shape[2] <= 4:
                     self.axes = {'t': None, 'x': 0, 'y': 1, 'c': 2}
                 else:
                     self.axes = {'t': 0, 'x': 1, 'y': 2, 'c': None}
-            elif img.ndim == 4:
+            elif ndim == 4:
                 self.axes = {'t': 0, 'x': 1, 'y': 2, 'c': 3}
             else:
                 raise Exception("Can not interpret image with dimensions %s" % (str(img.shape)))
@@ -232,7 +429,7 @@ class ImageView(QtGui.QWidget):
         prof.mark('2')
             
         self.imageDisp = None
-        
+        self.resetNorm()
         
         prof.mark('3')
             
@@ -287,12 +484,19 @@ class ImageView(QtGui.QWidget):
         """Begin automatically stepping frames forward at the given rate (in fps).
         This can also be accessed by pressing the spacebar."""
         #print "play:", rate
+        if not self.hasTimeAxis():
+            rate = 0  ## there are no frames to step through
         self.playRate = rate
         if rate == 0:
             self.playTimer.stop()
+            self.prefetcher.stop()
+            self.prefetchKey = None
             return
             
         self.lastPlayTime = ptime.time()
+        self.playIndex = self.currentIndex
+        self.fpsCount = 0
+        self.fpsTime = self.lastPlayTime
         if not self.playTimer.isActive():
             self.playTimer.start(16)
             
@@ -312,27 +516,84 @@ class ImageView(QtGui.QWidget):
 
     def autoRange(self):
         """Auto scale and pan the view around the image."""
-        image = self.getProcessedImage()
+        #image = self.getProcessedImage()
         
         #self.ui.graphicsView.setRange(QtCore.QRectF(0, 0, image.shape[self.axes['x']], image.shape[self.axes['y']]), padding=0., lockAspect=True)        
         self.view.setRange(self.imageItem.boundingRect(), padding=0.)
         
     def getProcessedImage(self):
-        """Returns the image data after it has been processed by any normalization options in use."""
+        """Returns the image data after it has been processed by any normalization options in use.
+        
+        The display does not use this method; frames are normalized individually as they 
+        are displayed (see :func:`getProcessedFrame <pyqtgraph.ImageView.getProcessedFrame>`).
+        When normalization is enabled, calling this method normalizes the entire image.
+        """
         if self.imageDisp is None:
-            image = self.normalize(self.image)
-            self.imageDisp = image
-            self.levelMin, self.levelMax = map(float, ImageView.quickMinMax(self.imageDisp))
-            self.ui.histogram.setHistogramRange(self.levelMin, self.levelMax)
-            
+            self.imageDisp = self.normalize(self.image)
         return self.imageDisp
         
+    def getProcessedFrame(self, ind=None):
+        """Return frame *ind* of the image after normalization. If the image has no 
+        time axis, the entire normalized image is returned.
+        
+        Normalized frames are computed when they are first requested and the most 
+        recently used ones are kept, so moving back and forth between nearby frames
+        is fast.
+        """
+        if not self.hasTimeAxis():
+            ind = None
+        if self.ui.normOffRadio.isChecked():
+            return self.getFrames(ind)
+        
+        if ind in self.normFrames:
+            frame = self.normFrames.pop(ind)
+        elif ind is None:
+            frame = self.normalize(self.getFrames())
+        else:
+            frame = self.normalizeFrames(self.getFrames(ind, ind+1), ind)[0]
+        self.normFrames[ind] = frame
+        while len(self.normFrames) > self.normFrameCacheSize:
+            self.normFrames.popitem(last=False)
+        return frame
+        
+    def getFrames(self, start=None, stop=None):
+        ## Read frames [start:stop] (or frame *start* if stop is None) from the image as an ndarray.
+        ## If start is None, the entire image is returned.
+        if start is None:
+            if isinstance(self.image, np.ndarray):
+                return self.image.view(np.ndarray)
+            return np.asarray(self.image[:])
+        if stop is None:
+            return np.asarray(self.image[start])
+        return np.asarray(self.image[start:stop])
+        
+    def updateLevelRange(self):
+        ## Determine the range of values in the processed image; this sets the limits of the histogram.
+        if self.levelRange is None:
+            if not self.hasTimeAxis():
+                self.levelRange = ImageView.quickMinMax(self.getProcessedFrame())
+            else:
+                ## estimate from a few frames spread over the whole image so that 
+                ## large (memory-mapped) images need not be read completely
+                nFrames = self.image.shape[0]
+                inds = np.unique(np.linspace(0, nFrames-1, min(nFrames, 16)).astype(int))
+                if self.ui.normOffRadio.isChecked():
+                    frames = [self.getFrames(i) for i in inds]
+                else:
+                    frames = [self.normalizeFrames(self.getFrames(i, i+1), i) for i in inds]
+                mm = np.array([ImageView.quickMinMax(f) for f in frames])
+                self.levelRange = (mm[:,0].min(), mm[:,1].max())
+            self.levelMin, self.levelMax = map(float, self.levelRange)
+            self.ui.histogram.setHistogramRange(self.levelMin, self.levelMax)
+        
         
     def close(self):
         """Closes the widget nicely, making sure to clear the graphics scene and release memory."""
         self.ui.roiPlot.close()
         self.ui.graphicsView.close()
         #self.ui.gradientWidget.sigGradientChanged.disconnect(self.updateImage)
+        self.roiTraceThread.cancel()
+        self.prefetcher.stop()
         self.scene.clear()
         del self.image
         del self.imageDisp
@@ -342,7 +603,7 @@ class ImageView(QtGui.QWidget):
         #print ev.key()
         if ev.key() == QtCore.Qt.Key_Space:
             if self.playRate == 0:
-                fps = (self.getProcessedImage().shape[0]-1) / (self.tVals[-1] - self.tVals[0])
+                fps = (self.image.shape[0]-1) / (self.tVals[-1] - self.tVals[0])
                 self.play(fps)
                 #print fps
             else:
@@ -353,7 +614,7 @@ class ImageView(QtGui.QWidget):
             self.play(0)
             ev.accept()
         elif ev.key() == QtCore.Qt.Key_End:
-            self.setCurrentIndex(self.getProcessedImage().shape[0]-1)
+            self.setCurrentIndex(self.image.shape[0]-1)
             self.play(0)
             ev.accept()
         elif ev.key() in self.noRepeatKeys:
@@ -406,6 +667,9 @@ class ImageView(QtGui.QWidget):
         
         
     def timeout(self):
+        if not self.hasTimeAxis():
+            self.play(0)
+            return
         now = ptime.time()
         dt = now - self.lastPlayTime
         if dt < 0:
@@ -415,13 +679,70 @@ class ImageView(QtGui.QWidget):
         if n != 0:
             #print n, dt, self.lastPlayTime
             self.lastPlayTime += (float(n)/self.playRate)
-            if self.currentIndex+n > self.image.shape[0]:
+            if self.playIndex+n > self.image.shape[0]:
                 self.play(0)
-            self.jumpFrames(n)
+                self.jumpFrames(self.playIndex + n - self.currentIndex)
+                return
+            self.playIndex = np.clip(self.playIndex + n, 0, self.image.shape[0]-1)
+        self.showPrefetchedFrames()
+        
+    def showPrefetchedFrames(self):
+        ## Frames are rendered ahead of time by background threads; the GUI thread only 
+        ## displays them. If several frames are due, only the latest is shown and the others 
+        ## are dropped, so playback keeps up with the clock when rendering is slow.
+        key = self.prefetchKey
+        if key is None or key[0] != self.normGeneration or key[1] is not self.imageItem.lut or not ImageItem.levelsEqual(key[2], self.imageItem.levels):
+            self.prefetcher.setRenderFunc(self.frameRenderer())
+            self.prefetchKey = (self.normGeneration, self.imageItem.lut, self.imageItem.levels)
+        
+        ## frames are requested at the spacing that the current rate requires
+        step = int(np.sign(self.playRate) * max(1, round(abs(self.playRate) * self.playTimer.interval() * 0.001)))
+        due = [i for i in self.prefetcher.readyFrames() if (i-self.currentIndex) * step > 0 and (self.playIndex-i) * step >= 0]
+        if len(due) > 0:
+            ind = max(due, key=lambda i: i * step)
+            frame, qimage = self.prefetcher.takeFrame(ind)
+            self.showFrame(ind, frame, qimage)
+            
+        nFrames = self.image.shape[0]
+        inds = [self.playIndex + step * i for i in range(self.prefetchFrames)]
+        inds = [i for i in inds if 0 <= i < nFrames and i != self.currentIndex]
+        self.prefetcher.request(inds)
+        
+    def frameRenderer(self):
+        ## Return a function that reads, normalizes, and renders a single frame for the prefetch threads.
+        image = self.image
+        render = self.imageItem.getRenderer()
+        if self.ui.normOffRadio.isChecked():
+            norm = None
+        else:
+            norm = self.frameNormalizer()
+        def renderFrame(ind):
+            frame = np.asarray(image[ind])
+            if norm is not None:
+                frame = norm(frame[np.newaxis], ind)[0]
+            return frame, render(frame)
+        return renderFrame
+        
+    def showFrame(self, ind, frame, qimage):
+        ## display a frame that was rendered ahead of time
+        self.currentIndex = ind
+        self.imageItem.setRenderedImage(frame, qimage)
+        self.ignoreTimeLine = True
+        self.timeLine.setValue(self.tVals[self.currentIndex])
+        self.ignoreTimeLine = False
+        
+        self.fpsCount += 1
+        now = ptime.time()
+        if now - self.fpsTime > 1.0:
+            self.fps = self.fpsCount / (now - self.fpsTime)
+            self.fpsCount = 0
+            self.fpsTime = now
+            self.sigFpsChanged.emit(self.fps)
         
     def setCurrentIndex(self, ind):
         """Set the currently displayed frame index."""
-        self.currentIndex = np.clip(ind, 0, self.getProcessedImage().shape[0]-1)
+        self.currentIndex = np.clip(ind, 0, self.image.shape[0]-1)
+        self.playIndex = self.currentIndex
         self.updateImage()
         self.ignoreTimeLine = True
         self.timeLine.setValue(self.tVals[self.currentIndex])
@@ -433,7 +754,7 @@ class ImageView(QtGui.QWidget):
             self.setCurrentIndex(self.currentIndex + n)
 
     def normRadioChanged(self):
-        self.imageDisp = None
+        self.resetNorm()
         self.updateImage()
         self.roiChanged()
         self.sigProcessingChanged.emit(self)
@@ -462,11 +783,19 @@ class ImageView(QtGui.QWidget):
             self.normRoi.hide()
         
         if not self.ui.normOffRadio.isChecked():
-            self.imageDisp = None
+            self.resetNorm()
             self.updateImage()
             self.roiChanged()
             self.sigProcessingChanged.emit(self)
 
+    def resetNorm(self):
+        ## discard all cached normalization results
+        self.imageDisp = None
+        self.normTerms = None
+        self.normFrames.clear()
+        self.levelRange = None
+        self.normGeneration += 1
+
     def normToggled(self, b):
         self.ui.normGroup.setVisible(b)
         self.normRoi.setVisible(b and self.ui.normROICheck.isChecked())
@@ -509,16 +838,21 @@ class ImageView(QtGui.QWidget):
         self.ui.roiPlot.setVisible(showRoiPlot)
 
     def roiChanged(self):
-        if self.image is None:
+        if self.image is None or not self.ui.roiBtn.isChecked():
             return
             
-        image = self.getProcessedImage()
-        if image.ndim == 2:
+        ndim = len(self.image.shape)
+        if ndim == 3 and self.hasTimeAxis():
+            self.updateRoiTrace()
+            return
+        
+        if ndim == 2:
             axes = (0, 1)
-        elif image.ndim == 3:
+        elif ndim == 3:
             axes = (1, 2)
         else:
             return
+        image = self.getProcessedFrame()
         data = self.roi.getArrayRegion(image.view(np.ndarray), self.imageItem, axes)
         if data is not None:
             while data.ndim > 1:
@@ -528,6 +862,76 @@ class ImageView(QtGui.QWidget):
             else:
                 self.roiCurve.setData(y=data, x=range(len(data)))
                 
+    def updateRoiTrace(self):
+        ## Measure the mean value inside the ROI in every frame of a 3D image.
+        image = self.image
+        nFrames = image.shape[0]
+        axes = (1, 2)
+        shape, vectors, origin = self.roi.getAffineSliceParams(image, self.imageItem, axes)
+        region = ImageView.alignedRegion(shape, vectors, origin, image.shape[1:])
+        if self.ui.normOffRadio.isChecked():
+            normFunc = None
+        else:
+            normFunc = self.frameNormalizer()
+            
+        if region is None:
+            ## rotated or scaled ROI: the region must be interpolated from every frame
+            readFunc = lambda start, stop, step=1: np.asarray(image[start:stop:step])
+            def measureFunc(frames, inds):
+                if normFunc is not None:
+                    frames = normFunc(frames, inds)
+                rgn = fn.affineSlice(frames, shape=shape, vectors=vectors, origin=origin, axes=axes, order=1)
+                return rgn.reshape(len(rgn), -1).mean(axis=1)
+            framePixels = np.prod(image.shape[1:])
+        else:
+            ## the ROI covers whole pixels; slice the region directly from the image
+            (xs, ys), area = region
+            if isinstance(image, np.ndarray):
+                readFunc = lambda start, stop, step=1: image[start:stop:step, xs, ys].view(np.ndarray)
+            else:
+                readFunc = lambda start, stop, step=1: np.asarray(image[start:stop:step])[:, xs, ys]
+            def measureFunc(frames, inds):
+                if normFunc is not None:
+                    frames = normFunc(frames, inds, (xs, ys))
+                ## pixels outside the image count as 0, as they do for the interpolated region
+                return frames.reshape(len(frames), -1).sum(axis=1, dtype=float) / area
+            framePixels = max(1, (xs.stop-xs.start) * (ys.stop-ys.start))
+            
+        if nFrames * framePixels <= self.chunkPixels:
+            ## small enough to do right away
+            self.roiTraceJob = None
+            self.roiCurve.setData(y=measureFunc(readFunc(0, nFrames), np.arange(nFrames)), x=self.tVals)
+            return
+            
+        if self.roiPreview:
+            step = int(np.ceil(nFrames * framePixels / float(self.chunkPixels)))
+            inds = np.arange(0, nFrames, step)
+            self.roiCurve.setData(y=measureFunc(readFunc(0, nFrames, step), inds), x=self.tVals[inds])
+        chunkSize = max(1, int(self.chunkPixels / framePixels))
+        self.roiTraceJob = self.roiTraceThread.compute(readFunc, measureFunc, nFrames, chunkSize)
+        
+    @staticmethod
+    def alignedRegion(shape, vectors, origin, imageShape):
+        ## If a region (as given to affineSlice) is not rotated or scaled and lies on pixel
+        ## boundaries, it can be sliced directly from the image instead of interpolated. 
+        ## Returns ((xSlice, ySlice), nPixels) for such regions, or None otherwise. The slices 
+        ## cover only the part of the region that lies inside the image.
+        bounds = fn.alignedSliceBounds(shape, vectors, origin)
+        if bounds is None:
+            return None
+        slices = []
+        for (start, stop), n in zip(bounds, imageShape):
+            slices.append(slice(max(start, 0), max(start, 0, min(stop, n))))
+        return tuple(slices), (bounds[0][1]-bounds[0][0]) * (bounds[1][1]-bounds[1][0])
+        
+    def roiTraceChanged(self, jobId, data, nFrames):
+        ## receives (partial) ROI traces from roiTraceThread
+        if jobId != self.roiTraceJob:
+            return
+        if nFrames < len(self.tVals) and self.roiPreview:
+            return  ## keep showing the preview until the trace is complete
+        self.roiCurve.setData(y=data[:nFrames], x=self.tVals[:nFrames])
+                
             #self.ui.roiPlot.replot()
 
 
@@ -545,44 +949,101 @@ class ImageView(QtGui.QWidget):
         if self.ui.normOffRadio.isChecked():
             return image
             
-        div = self.ui.normDivideRadio.isChecked()
-        norm = image.view(np.ndarray).copy()
-        #if div:
-            #norm = ones(image.shape)
-        #else:
-            #norm = zeros(image.shape)
-        if div:
-            norm = norm.astype(np.float32)
+        if len(image.shape) != 3 or not self.hasTimeAxis():
+            return np.asarray(image).astype(np.float32)
             
-        if self.ui.normTimeRangeCheck.isChecked() and image.ndim == 3:
+        norm = np.empty(image.shape, dtype=np.float32)
+        chunk = max(1, int(self.chunkPixels / max(1, np.prod(image.shape[1:]))))
+        for start in xrange(0, image.shape[0], chunk):
+            norm[start:start+chunk] = self.normalizeFrames(np.asarray(image[start:start+chunk]), start)
+        return norm
+        
+    def normBackground(self):
+        ## Compute the background terms used for normalization. These are small compared to 
+        ## the image (a single frame, or one value per frame) and are cached until the 
+        ## normalization options change.
+        if self.normTerms is not None:
+            return self.normTerms
+        
+        image = self.image
+        self.normTerms = {}
+        if len(image.shape) != 3:
+            return self.normTerms
+            
+        if self.ui.normTimeRangeCheck.isChecked():
             (sind, start) = self.timeIndex(self.normRgn.lines[0])
             (eind, end) = self.timeIndex(self.normRgn.lines[1])
             #print start, end, sind, eind
-            n = image[sind:eind+1].mean(axis=0)
-            n.shape = (1,) + n.shape
-            if div:
-                norm /= n
-            else:
-                norm -= n
-                
-        if self.ui.normFrameCheck.isChecked() and image.ndim == 3:
-            n = image.mean(axis=1).mean(axis=1)
-            n.shape = n.shape + (1, 1)
-            if div:
-                norm /= n
+            n = np.zeros(image.shape[1:], dtype=float)
+            if eind + 1 - sind > self.normBackgroundFrames:
+                ## average a sample of frames spread over the range so that 
+                ## large (memory-mapped) images need not be read completely
+                inds = np.unique(np.linspace(sind, eind, self.normBackgroundFrames).astype(int))
+                for i in inds:
+                    n += self.getFrames(i)
+                self.normTerms['time'] = n / len(inds)
             else:
-                norm -= n
+                for i in xrange(sind, eind+1, self.chunkFrames()):
+                    n += self.getFrames(i, min(i+self.chunkFrames(), eind+1)).sum(axis=0)
+                self.normTerms['time'] = n / max(1, len(xrange(sind, eind+1)))
             
-        if self.ui.normROICheck.isChecked() and image.ndim == 3:
-            n = self.normRoi.getArrayRegion(norm, self.imageItem, (1, 2)).mean(axis=1).mean(axis=1)
-            n = n[:,np.newaxis,np.newaxis]
-            #print start, end, sind, eind
-            if div:
-                norm /= n
+        if self.ui.normFrameCheck.isChecked():
+            n = np.empty(image.shape[0], dtype=float)
+            for i in xrange(0, image.shape[0], self.chunkFrames()):
+                n[i:i+self.chunkFrames()] = self.getFrames(i, i+self.chunkFrames()).mean(axis=1).mean(axis=1)
+            self.normTerms['frame'] = n
+            
+        if self.ui.normROICheck.isChecked():
+            ## the ROI is measured after the other terms have been applied
+            n = np.empty(image.shape[0], dtype=float)
+            for start, frames in self.iterNormalizedFrames():
+                n[start:start+len(frames)] = self.normRoi.getArrayRegion(frames, self.imageItem, (1, 2)).mean(axis=1).mean(axis=1)
+            self.normTerms['roi'] = n
+            
+        return self.normTerms
+        
+    def normalizeFrames(self, frames, start):
+        ## Return normalized copies of *frames*, which are image[start:start+len(frames)] for a 3D image
+        return self.frameNormalizer()(frames, start)
+        
+    def frameNormalizer(self):
+        ## Return a function normalize(frames, start, region=None) that uses the current options and background terms.
+        ## The function does not access the GUI, so it may be called from other threads.
+        ## *start* may also be an array giving the index of each frame, and *region* a pair of 
+        ## slices if the frames have been cropped.
+        terms = self.normBackground()
+        div = self.ui.normDivideRadio.isChecked()
+        def normalize(frames, start, region=None):
+            norm = np.asarray(frames).astype(np.float32)
+            if np.isscalar(start):
+                inds = slice(start, start+len(norm))
             else:
-                norm -= n
+                inds = start
+            for name in ['time', 'frame', 'roi']:
+                n = terms.get(name, None)
+                if n is None:
+                    continue
+                if name == 'time':
+                    if region is not None:
+                        n = n[region]
+                else:
+                    n = n[inds, np.newaxis, np.newaxis]
+                if div:
+                    norm /= n
+                else:
+                    norm -= n
+            return norm
+        return normalize
                 
-        return norm
+    def iterNormalizedFrames(self):
+        ## Yield (start, frames) for consecutive blocks of normalized frames from a 3D image
+        for start in xrange(0, self.image.shape[0], self.chunkFrames()):
+            yield start, self.normalizeFrames(self.getFrames(start, start+self.chunkFrames()), start)
+            
+    def chunkFrames(self):
+        ## number of frames to process at once
+        frameSize = np.prod(self.image.shape[1:])
+        return max(1, int(self.chunkPixels / max(1, frameSize)))
         
     def timeLineChanged(self):
         #(ind, time) = self.timeIndex(self.ui.timeSlider)
@@ -602,18 +1063,18 @@ class ImageView(QtGui.QWidget):
         if self.image is None:
             return
             
-        image = self.getProcessedImage()
+        self.updateLevelRange()
         #print "update:", image.ndim, image.max(), image.min(), self.blackLevel(), self.whiteLevel()
         if self.axes['t'] is None:
             #self.ui.timeSlider.hide()
-            self.imageItem.updateImage(image)
+            self.imageItem.updateImage(self.getProcessedFrame())
             #self.ui.roiPlot.hide()
             #self.ui.roiBtn.hide()
         else:
             #self.ui.roiBtn.show()
             self.ui.roiPlot.show()
             #self.ui.timeSlider.show()
-            self.imageItem.updateImage(image[self.currentIndex])
+            self.imageItem.updateImage(self.getProcessedFrame(self.currentIndex))
             
             
     def timeIndex(self, slider):
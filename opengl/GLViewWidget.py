@@ -165,10 +165,15 @@ class GLViewWidget(QtOpenGL.QGLWidget):
     def pixelSize(self, pos):
         """
         Return the approximate size of a screen pixel at the location pos
-        
+        Pos may be a Vector or an (N,3) array of locations; in the latter case
+        an array of N pixel sizes is returned.
         """
         cam = self.cameraPosition()
-        dist = (pos-cam).length()
+        if isinstance(pos, np.ndarray):
+            cam = np.array([cam.x(), cam.y(), cam.z()])
+            dist = ((pos-cam)**2).sum(axis=-1)**0.5
+        else:
+            dist = (pos-cam).length()
         xDist = dist * 2. * np.tan(0.5 * self.opts['fov'] * np.pi / 180.)
         return xDist / self.width()
         
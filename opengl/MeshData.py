@@ -1,5 +1,6 @@
 from pyqtgraph.Qt import QtGui
 import pyqtgraph.functions as fn
+import numpy as np
 
 class MeshData(object):
     """
@@ -10,12 +11,15 @@ class MeshData(object):
     - list of triangles
     - colors per vertex, edge, or tri
     - normals per vertex or tri
+
+    All data is stored in numpy arrays: vertexes as an Nx3 array of float, faces
+    as an Mx3 array of vertex indexes, and colors as Nx4 arrays of float RGBA values.
     """
 
     def __init__(self):
-        self._vertexes = []
+        self._vertexes = np.empty((0, 3), dtype=float)
         self._edges = None
-        self._faces = []
+        self._faces = np.empty((0, 3), dtype=np.int32)
         self._vertexFaces = None  ## maps vertex ID to a list of face IDs
         self._vertexNormals = None
         self._faceNormals = None
@@ -36,6 +40,8 @@ class MeshData(object):
             faces = [ (p1, p2, p3), ... ]
             vertexes = [ (x, y, z), ... ]
             
+        Either form may also be given as numpy arrays, such as those returned by
+        :func:`isosurface <pyqtgraph.isosurface>`.
         """
         
         if vertexes is None:
@@ -50,98 +56,152 @@ class MeshData(object):
         self._vertexColors = None
         self._faceColors = None
     
+    def setVertexColors(self, colors):
+        """Set the color of each vertex as an Nx4 array of float RGBA values (0.0-1.0)."""
+        self._vertexColors = self._colorArray(colors, len(self._vertexes))
+
+    def setFaceColors(self, colors):
+        """Set the color of each face as an Mx4 array of float RGBA values (0.0-1.0)."""
+        self._faceColors = self._colorArray(colors, len(self._faces))
+
+    def setEdgeColors(self, colors):
+        """Set the color of each edge as an Nx4 array of float RGBA values (0.0-1.0)."""
+        self._edgeColors = None if colors is None else np.array(colors, dtype=float).reshape(-1, 4)
+
+    @staticmethod
+    def _colorArray(colors, n):
+        if colors is None:
+            return None
+        colors = np.array(colors, dtype=float)
+        if colors.shape != (n, 4):
+            raise Exception("Color array must have shape (%d, 4) (got %s)" % (n, str(colors.shape)))
+        return colors
+
     def _setUnindexedFaces(self, faces):
-        verts = {}
-        self._faces = []
-        self._vertexes = []
-        self._vertexFaces = []
+        faces = np.asarray(faces, dtype=float).reshape(-1, 3)
+        ## quantize to be sure that nearly-identical points will be merged
+        verts = np.round(faces * 1e14)
+    
+        ## sort the points so that identical points are adjacent, then give each 
+        ## group of identical points the index of the first face vertex in the group
+        order = np.lexsort(verts.T[::-1])
+        verts = verts[order]
+        isNew = np.empty(len(verts), dtype=bool)
+        isNew[:1] = True
+        isNew[1:] = (verts[1:] != verts[:-1]).any(axis=1)
+        first = order[isNew]
+        group = np.empty(len(order), dtype=int)
+        group[order] = np.cumsum(isNew) - 1
+        
+        ## number vertexes in the order they first appear in the face list
+        firstOrder = np.argsort(first)
+        rank = np.empty(len(first), dtype=np.int32)
+        rank[firstOrder] = np.arange(len(first))
+        self._vertexes = faces[first[firstOrder]]
+        self._faces = rank[group].reshape(-1, 3)
+        self._edges = None
+        self._vertexFaces = None
         self._faceNormals = None
         self._vertexNormals = None
-        for face in faces:
-            inds = []
-            for pt in face:
-                pt2 = tuple([round(x*1e14) for x in pt])  ## quantize to be sure that nearly-identical points will be merged
-                index = verts.get(pt2, None)
-                if index is None:
-                    self._vertexes.append(QtGui.QVector3D(*pt))
-                    self._vertexFaces.append([])
-                    index = len(self._vertexes)-1
-                    verts[pt2] = index
-                self._vertexFaces[index].append(len(self._faces))
-                inds.append(index)
-            self._faces.append(tuple(inds))
-    
+        self._vertexColors = None
+        self._faceColors = None
+
     def _setIndexedFaces(self, faces, vertexes):
-        self._vertexes = [QtGui.QVector3D(*v) for v in vertexes]
-        self._faces = faces
+        self._vertexes = np.array(vertexes, dtype=float).reshape(-1, 3)
+        self._faces = np.array(faces, dtype=np.int32).reshape(-1, 3)
         self._edges = None
         self._vertexFaces = None
         self._faceNormals = None
         self._vertexNormals = None
+        self._vertexColors = None
+        self._faceColors = None
+
+    def vertexes(self):
+        """Return an Nx3 array of vertex positions."""
+        return self._vertexes
+
+    def faces(self):
+        """Return an Mx3 array of vertex indexes for each face."""
+        return self._faces
 
     def vertexFaces(self):
         """
         Return list mapping each vertex index to a list of face indexes that use the vertex.
         """
         if self._vertexFaces is None:
-            self._vertexFaces = [[]] * len(self._vertexes)
-            for i, face in enumerate(self._faces):
-                for ind in face:
-                    if len(self._vertexFaces[ind]) == 0:
-                        self._vertexFaces[ind] = []  ## need a unique/empty list to fill
-                    self._vertexFaces[ind].append(i)
+            verts = self._faces.ravel()
+            order = np.argsort(verts, kind='mergesort')
+            faceInds = (order // 3).tolist()
+            bounds = np.searchsorted(verts[order], np.arange(len(self._vertexes)+1)).tolist()
+            self._vertexFaces = [faceInds[bounds[i]:bounds[i+1]] for i in xrange(len(self._vertexes))]
         return self._vertexFaces
         
     def __iter__(self):
-        """Iterate over all faces, yielding a list of three tuples [(position, normal, color), ...] for each face."""
-        vnorms = self.vertexNormals()
+        """
+        Iterate over all faces, yielding a list of three tuples [(position, normal, color), ...] for each face.
+        Positions and normals are QVector3D. This is kept for compatibility; the
+        arrays returned by vertexes(), faces(), vertexNormals(), etc. are much faster to use.
+        """
+        vnorms = self.vertexNormals().tolist()
+        verts = self._vertexes.tolist()
         vcolors = self.vertexColors()
-        for i in range(len(self._faces)):
+        fcolors = self.faceColors()
+        if vcolors is not None:
+            vcolors = [tuple(c) for c in vcolors.tolist()]
+        if fcolors is not None:
+            fcolors = [tuple(c) for c in fcolors.tolist()]
+        for i, inds in enumerate(self._faces.tolist()):
             face = []
-            for j in [0,1,2]:
-                vind = self._faces[i][j]
-                pos = self._vertexes[vind]
-                norm = vnorms[vind]
-                if vcolors is None:
-                    color = self._meshColor
-                else:
+            for vind in inds:
+                pos = QtGui.QVector3D(*verts[vind])
+                norm = QtGui.QVector3D(*vnorms[vind])
+                if vcolors is not None:
                     color = vcolors[vind]
+                elif fcolors is not None:
+                    color = fcolors[i]
+                else:
+                    color = self._meshColor
                 face.append((pos, norm, color))
             yield face
     
     
     def faceNormals(self):
         """
-        Computes and stores normal of each face.
+        Computes and stores normal of each face. Returns an Mx3 array.
         """
         if self._faceNormals is None:
-            self._faceNormals = []
-            for i, face in enumerate(self._faces):
-                ## compute face normal
-                pts = [self._vertexes[vind] for vind in face]
-                norm = QtGui.QVector3D.crossProduct(pts[1]-pts[0], pts[2]-pts[0])
-                norm = norm / norm.length()  ## don't use .normalized(); doesn't work for small values.
-                self._faceNormals.append(norm)
+            pts = self._vertexes[self._faces]
+            norms = np.cross(pts[:,1]-pts[:,0], pts[:,2]-pts[:,0])
+            self._faceNormals = self._normalize(norms)
         return self._faceNormals
     
     def vertexNormals(self):
         """
         Assigns each vertex the average of its connected face normals.
         If face normals have not been computed yet, then generateFaceNormals will be called.
+        Returns an Nx3 array.
         """
         if self._vertexNormals is None:
             faceNorms = self.faceNormals()
-            vertFaces = self.vertexFaces()
-            self._vertexNormals = []
-            for vindex in xrange(len(self._vertexes)):
-                #print vertFaces[vindex]
-                norms = [faceNorms[findex] for findex in vertFaces[vindex]]
-                norm = QtGui.QVector3D()
-                for fn in norms:
-                    norm += fn
-                norm = norm / norm.length()  ## don't use .normalize(); doesn't work for small values.
-                self._vertexNormals.append(norm)
+            ## sum the normals of the faces using each vertex. (bincount is used rather 
+            ## than np.add.at, which requires numpy >= 1.8)
+            verts = self._faces.ravel()
+            weights = np.repeat(faceNorms, 3, axis=0)  ## one row per entry in verts
+            norms = np.empty(self._vertexes.shape, dtype=float)
+            for ax in [0,1,2]:
+                norms[:,ax] = np.bincount(verts, weights=weights[:,ax], minlength=len(self._vertexes))
+            self._vertexNormals = self._normalize(norms)
         return self._vertexNormals
+
+    @staticmethod
+    def _normalize(vecs):
+        ## divide each vector by its length; zero-length vectors are left unchanged
+        lengths = np.sqrt((vecs**2).sum(axis=1))
+        lengths[lengths == 0] = 1
+        return vecs / lengths[:,np.newaxis]
+        
+    def meshColor(self):
+        return self._meshColor
         
     def vertexColors(self):
         return self._vertexColors
@@ -180,4 +240,4 @@ class MeshData(object):
             setattr(self, k, state[k])
         
         
-        
\ No newline at end of file
+        
@@ -20,19 +20,94 @@ class GLMeshItem(GLGraphicsItem):
         """
         See :class:`MeshData <pyqtgraph.opengl.MeshData>` for initialization arguments.
         """
+        GLGraphicsItem.__init__(self)
+        self.setMeshData(faces, vertexes)
+        
+    def setMeshData(self, faces, vertexes=None):
+        """
+        Set the mesh to display. Arguments may be a :class:`MeshData <pyqtgraph.opengl.MeshData>`
+        or any arguments accepted by MeshData.setFaces.
+        """
         if isinstance(faces, MeshData):
             self.data = faces
         else:
             self.data = MeshData()
             self.data.setFaces(faces, vertexes)
-        GLGraphicsItem.__init__(self)
+        self.meshDataChanged()
+        
+    def meshDataChanged(self):
+        """
+        Must be called after the MeshData has been modified; causes all of the 
+        vertex arrays to be regenerated.
+        """
+        self.vertexes = None   ## float32 arrays passed to glVertexPointer / glNormalPointer
+        self.normals = None
+        self.faces = None      ## uint32 index array for glDrawElements, or None to draw unindexed vertexes
+        self.colors = None     ## float32 array for glColorPointer, or None to use the mesh color
+        self.colorsValid = False
+        self.update()
+        
+    def setVertexColors(self, colors):
+        """
+        Set the color of each vertex as an Nx4 array of float RGBA values. 
+        Only the color array is regenerated; the vertexes are reused.
+        """
+        self.data.setVertexColors(colors)
+        self.colorsChanged()
+        
+    def setFaceColors(self, colors):
+        """Set the color of each face as an Mx4 array of float RGBA values."""
+        self.data.setFaceColors(colors)
+        self.colorsChanged()
+        
+    def setMeshColor(self, color):
+        """Set the color of the entire mesh, removing any per-vertex or per-face colors."""
+        self.data.setMeshColor(color)
+        self.colorsChanged()
+        
+    def colorsChanged(self):
+        """
+        Must be called after the colors in the MeshData have been modified.
+        """
+        ## vertexes are only shared between faces when there are no face colors
+        indexed = self.data.vertexColors() is not None or self.data.faceColors() is None
+        if indexed != (self.faces is not None):
+            self.vertexes = None
+        self.colorsValid = False
+        self.update()
+        
+    def parseMeshData(self):
+        ## generate the arrays used for drawing from the MeshData
+        md = self.data
+        vertColors = md.vertexColors()
+        faceColors = md.faceColors()
+        if self.vertexes is None:
+            if vertColors is not None or faceColors is None:
+                self.vertexes = np.ascontiguousarray(md.vertexes(), dtype=np.float32)
+                self.normals = np.ascontiguousarray(md.vertexNormals(), dtype=np.float32)
+                self.faces = np.ascontiguousarray(md.faces(), dtype=np.uint32)
+            else:
+                ## each face needs its own copy of its vertexes to have a single color
+                faces = md.faces()
+                self.vertexes = md.vertexes()[faces].reshape(-1, 3).astype(np.float32)
+                self.normals = md.vertexNormals()[faces].reshape(-1, 3).astype(np.float32)
+                self.faces = None
+            self.colorsValid = False
+        
+        if not self.colorsValid:
+            if vertColors is not None:
+                self.colors = np.ascontiguousarray(vertColors, dtype=np.float32)
+            elif faceColors is not None:
+                self.colors = np.repeat(faceColors, 3, axis=0).astype(np.float32)
+            else:
+                self.colors = None
+            self.colorsValid = True
         
     def initializeGL(self):
         self.shader = shaders.getShader('balloon')
         
-        l = glGenLists(1)
-        self.triList = l
-        glNewList(l, GL_COMPILE)
+    def paint(self):
+        self.parseMeshData()
         
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         glEnable( GL_BLEND )
@@ -40,39 +115,27 @@ class GLMeshItem(GLGraphicsItem):
         #glAlphaFunc( GL_ALWAYS,0.5 )
         glEnable( GL_POINT_SMOOTH )
         glDisable( GL_DEPTH_TEST )
-        glColor4f(1, 1, 1, .1)
-        glBegin( GL_TRIANGLES )
-        for face in self.data:
-            for (pos, norm, color) in face:
-                glColor4f(*color)
-                glNormal3f(norm.x(), norm.y(), norm.z())
-                glVertex3f(pos.x(), pos.y(), pos.z())
-        glEnd()
-        glEndList()
-        
         
-        #l = glGenLists(1)
-        #self.meshList = l
-        #glNewList(l, GL_COMPILE)
-        #glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        #glEnable( GL_BLEND )
-        #glEnable( GL_ALPHA_TEST )
-        ##glAlphaFunc( GL_ALWAYS,0.5 )
-        #glEnable( GL_POINT_SMOOTH )
-        #glEnable( GL_DEPTH_TEST )
-        #glColor4f(1, 1, 1, .3)
-        #glBegin( GL_LINES )
-        #for f in self.faces:
-            #for i in [0,1,2]:
-                #j = (i+1) % 3
-                #glVertex3f(*f[i])
-                #glVertex3f(*f[j])
-        #glEnd()
-        #glEndList()
-
-                
-    def paint(self):
         shaders.glUseProgram(self.shader)
-        glCallList(self.triList)
-        shaders.glUseProgram(0)
-        #glCallList(self.meshList)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        try:
+            glVertexPointerf(self.vertexes)
+            glNormalPointerf(self.normals)
+            if self.colors is None:
+                glColor4f(*self.data.meshColor())
+            else:
+                glEnableClientState(GL_COLOR_ARRAY)
+                glColorPointerf(self.colors)
+            
+            if self.faces is None:
+                glDrawArrays(GL_TRIANGLES, 0, len(self.vertexes))
+            else:
+                glDrawElements(GL_TRIANGLES, self.faces.size, GL_UNSIGNED_INT, self.faces)
+        finally:
+            glDisableClientState(GL_VERTEX_ARRAY)
+            glDisableClientState(GL_NORMAL_ARRAY)
+            glDisableClientState(GL_COLOR_ARRAY)
+            shaders.glUseProgram(0)
+        
+        
\ No newline at end of file
@@ -1,6 +1,8 @@
 from OpenGL.GL import *
 from .. GLGraphicsItem import GLGraphicsItem
+from .. import shaders
 from pyqtgraph import QtGui
+import pyqtgraph.functions as fn
 import numpy as np
 
 __all__ = ['GLScatterPlotItem']
@@ -8,29 +10,81 @@ __all__ = ['GLScatterPlotItem']
 class GLScatterPlotItem(GLGraphicsItem):
     """Draws points at a list of 3D positions."""
     
-    def __init__(self, data=None):
+    def __init__(self, data=None, **kwds):
         GLGraphicsItem.__init__(self)
-        self.data = []
-        if data is not None:
-            self.setData(data)
+        self.pos = np.empty((0,3), dtype=np.float32)   ## arrays passed to GL; reused when possible
+        self.color = np.empty((0,4), dtype=np.float32)
+        self.size = np.empty(0, dtype=np.float32)
+        self.sizeBuffer = np.empty((0,3), dtype=np.float32)  ## pixel sizes, stored in x of the normal array
+        self.setData(data, **kwds)
     
-    def setData(self, data):
+    def setData(self, data=None, pos=None, color=None, size=None):
         """
-        Data may be either a list of dicts (one dict per point) or a numpy record array.
+        Set the points to display. Arguments are:
         
         ====================  ==================================================
-        Allowed fields are:
-        ------------------------------------------------------------------------
-        pos                   (x,y,z) tuple of coordinate values or QVector3D
-        color                 (r,g,b,a) tuple of floats (0.0-1.0) or QColor
-        size                  (float) diameter of spot in pixels
+        pos                   (N,3) array of point coordinates
+        color                 (N,4) array of (r,g,b,a) floats (0.0-1.0), or a 
+                              single (r,g,b,a) tuple or QColor for all points.
+                              Default is white.
+        size                  (N,) array of spot diameters, or a single value 
+                              for all points. Default is 10.
         ====================  ==================================================
-        """
         
+        For compatibility, data may also be given as a list of dicts (one dict per 
+        point) or a numpy record array with the fields 'pos', 'color' and 'size'.
+        Passing arrays with the same shapes as the previous call reuses the 
+        existing arrays.
+        """
+        if data is not None:
+            pos, color, size = self.parseRecords(data)
+        if pos is None:
+            pos = np.empty((0,3))
+        n = len(pos)
+        if color is None:
+            color = (1,1,1,1)
+        if isinstance(color, QtGui.QColor):
+            color = fn.glColor(color)
+        if size is None:
+            size = 10
         
-        self.data = data
+        self.pos = self.fillArray(self.pos, pos, (n, 3))
+        self.color = self.fillArray(self.color, color, (n, 4))
+        self.size = self.fillArray(self.size, size, (n,))
+        if self.sizeBuffer.shape != (n, 3):
+            self.sizeBuffer = np.zeros((n, 3), dtype=np.float32)
         self.update()
 
+    @staticmethod
+    def fillArray(arr, data, shape):
+        ## copy data (broadcast to shape) into arr, reallocating only if the shape has changed
+        if arr.shape != shape:
+            arr = np.empty(shape, dtype=np.float32)
+        arr[:] = data
+        return arr
+        
+    @staticmethod
+    def parseRecords(data):
+        ## convert a record array or list of dicts into arrays of pos, color, size
+        if isinstance(data, np.ndarray) and data.dtype.names is not None:
+            fields = data.dtype.names
+            pos = data['pos']
+            color = data['color'] if 'color' in fields else None
+            size = data['size'] if 'size' in fields else None
+            return pos, color, size
+        
+        data = list(data)
+        pos = [pt['pos'] for pt in data]
+        pos = [(p.x(), p.y(), p.z()) if isinstance(p, QtGui.QVector3D) else p for p in pos]
+        colors = []
+        sizes = []
+        for pt in data:
+            color = pt.get('color', (1,1,1,1))
+            if isinstance(color, QtGui.QColor):
+                color = fn.glColor(color)
+            colors.append(color)
+            sizes.append(pt.get('size', 10))
+        return np.array(pos, dtype=float).reshape(-1, 3), colors, sizes
         
     def initializeGL(self):
         w = 64
@@ -49,7 +103,11 @@ class GLScatterPlotItem(GLGraphicsItem):
         glBindTexture(GL_TEXTURE_2D, self.pointTexture)
         glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, pData.shape[0], pData.shape[1], 0, GL_RGBA, GL_UNSIGNED_BYTE, pData)
         
+        self.shader = shaders.getShader('pointSprite')
+        
     def paint(self):
+        if len(self.pos) == 0:
+            return
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         glEnable( GL_BLEND )
         glEnable( GL_ALPHA_TEST )
@@ -73,30 +131,26 @@ class GLScatterPlotItem(GLGraphicsItem):
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
         
-        for pt in self.data:
-            pos = pt['pos']
-            try:
-                color = pt['color']
-            except KeyError:
-                color = (1,1,1,1)
-            try:
-                size = pt['size']
-            except KeyError:
-                size = 10
-                
-            if isinstance(color, QtGui.QColor):
-                color = fn.glColor(color)
+        ## The size of each point in pixels depends on its distance from the camera.
+        ## Sizes are handed to the pointSprite shader through the x component of 
+        ## the normal array so that all points are drawn in a single call.
+        self.sizeBuffer[:,0] = self.size / self.view().pixelSize(self.pos)
                 
-            pxSize = self.view().pixelSize(QtGui.QVector3D(*pos))
-            
-            glPointSize(size / pxSize)
-            glBegin( GL_POINTS )
-            glColor4f(*color)  # x is blue
-            #glNormal3f(size, 0, 0)
-            glVertex3f(*pos)
-            glEnd()
+        glEnable(GL_VERTEX_PROGRAM_POINT_SIZE)
+        shaders.glUseProgram(self.shader)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        try:
+            glVertexPointerf(self.pos)
+            glColorPointerf(self.color)
+            glNormalPointerf(self.sizeBuffer)
+            glDrawArrays(GL_POINTS, 0, len(self.pos))
+        finally:
+            glDisableClientState(GL_NORMAL_ARRAY)
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+            shaders.glUseProgram(0)
+            glDisable(GL_VERTEX_PROGRAM_POINT_SIZE)
 
-        
-        
-        
         
\ No newline at end of file
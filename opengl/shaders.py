@@ -26,6 +26,17 @@ Shaders = {
         }
         """
     ),
+    'pointSprite': (   ## sets the size of each point from the x component of its normal
+        """
+        void main() {
+            gl_FrontColor = gl_Color;
+            gl_PointSize = gl_Normal.x;
+            gl_Position = ftransform();
+            gl_TexCoord[0] = gl_MultiTexCoord0;
+        }
+        """,
+        None   ## fixed-function fragment processing (point sprite texture modulates the color)
+    ),
 }
 CompiledShaders = {}
     
@@ -35,7 +46,11 @@ def getShader(name):
     if name not in CompiledShaders:
         vshader, fshader = Shaders[name]
         vcomp = shaders.compileShader(vshader, GL_VERTEX_SHADER)
-        fcomp = shaders.compileShader(fshader, GL_FRAGMENT_SHADER)
-        prog = shaders.compileProgram(vcomp, fcomp)
+        if fshader is None:
+            fcomp = None
+            prog = shaders.compileProgram(vcomp)
+        else:
+            fcomp = shaders.compileShader(fshader, GL_FRAGMENT_SHADER)
+            prog = shaders.compileProgram(vcomp, fcomp)
         CompiledShaders[name] = prog, vcomp, fcomp
     return CompiledShaders[name][0]